@@ -1,6 +1,7 @@
 import sqlite3
 import numpy as np
 import networkx as nx
+import shapely
 import shapely.geometry as geom
 from scipy.spatial import cKDTree
 
@@ -40,7 +41,11 @@ class HydroPrimitive:
         self.elevation = elevation
         self.priority = priority
         self.parent = parent
+        # the watersheds and flow are computed after the rivers stage, which
+        # is saved as a checkpoint before then
+        self.localWatershed = 0
         self.inheritedWatershed = 0
+        self.flow = 0
         self.rivers = [ ]
     def x(self) -> float:
         """Gets the x location of this node
@@ -136,6 +141,44 @@ class HydrologyNetwork:
                 self.graph.add_edge(parentID, id)
 
         self.graphkd = cKDTree(allpoints_list)
+    def loadFromArrays(self, parents: np.ndarray, positions: np.ndarray, elevations: np.ndarray, priorities: np.ndarray, contourIndices: np.ndarray) -> None:
+        """Replaces the network with nodes described by parallel arrays
+
+        The index of each node in the arrays is its ID. A node's parent must
+        come before it.
+
+        :param parents: The ID of each node's parent, or -1 for a mouth node
+        :type parents: numpy.ndarray(n)
+        :param positions: The location of each node
+        :type positions: numpy.ndarray(n,2)
+        :param elevations: The elevation of each node
+        :type elevations: numpy.ndarray(n)
+        :param priorities: The priority of each node
+        :type priorities: numpy.ndarray(n)
+        :param contourIndices: The contour index of each mouth node, or -1 for other nodes
+        :type contourIndices: numpy.ndarray(n)
+        """
+        self.graph = nx.DiGraph()
+        self.mouthNodes = [ ]
+
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+
+        for id in range(len(positions)):
+            parentID = int(parents[id])
+            parent = self.graph.nodes[parentID]['primitive'] if parentID >= 0 else None
+
+            node = HydroPrimitive(id, (float(positions[id][0]), float(positions[id][1])), float(elevations[id]), int(priorities[id]), parent)
+
+            self.graph.add_node(id, primitive=node)
+
+            if parent is None:
+                node.contourIndex = int(contourIndices[id])
+                self.mouthNodes.append(id)
+            else:
+                self.graph.add_edge(parentID, id)
+
+        self.nodeCounter = len(positions)
+        self.graphkd = cKDTree(positions)
     def saveToDB(self, db: sqlite3.Connection) -> None:
         """Writes the hydrology network to a database
 
@@ -147,18 +190,15 @@ class HydrologyNetwork:
             # write river nodes
             db.executemany("INSERT INTO RiverNodes (id, parent, elevation, localwatershed, inheritedwatershed, flow, loc) VALUES (?, ?, ?, ?, ?, ?, MakePoint(?, ?, 347895))", [(node.id, node.parent.id if node.parent is not None else None, node.elevation, node.localWatershed, node.inheritedWatershed, node.flow, float(node.x()), float(node.y())) for node in self.allNodes()])
 
-            # write river paths
-            for node in self.allNodes():
-                for river in node.rivers:
-                    geom = "LINESTRINGZ(" + ", ".join([f'{p[0]} {p[1]} {p[2]}' for p in river.coords]) + ")"
-                    try:
-                        db.execute("INSERT INTO RiverPaths (rivernode, path) VALUES (?, GeomFromText(?, 347895))", (node.id, geom))
-                    except:
-                        print('printing geom')
-                        print(geom)
-                        raise
-                    #TODO: refactor rivers
-                    #TODO: this can also be simplified by only storing rivers of leaf nodes
+            # write river paths. They are passed as (ISO) WKB, which is
+            # much cheaper to produce and to parse than WKT
+            db.execute('DELETE FROM RiverPaths')
+            riverNodes = [ node.id for node in self.allNodes() for river in node.rivers ]
+            rivers = [ river for node in self.allNodes() for river in node.rivers ]
+            paths = shapely.to_wkb(rivers, output_dimension=3, flavor='iso') if len(rivers) > 0 else [ ]
+            db.executemany("INSERT INTO RiverPaths (rivernode, path) VALUES (?, GeomFromWKB(?, 347895))", zip(riverNodes, paths))
+            #TODO: refactor rivers
+            #TODO: this can also be simplified by only storing rivers of leaf nodes
     def addNode(self, loc: Tuple[float,float], elevation: float, priority: int, contourIndex: int=None, parent: HydroPrimitive=None) -> HydroPrimitive:
         """Creates and adds a HydrologyPrimitive to the network
 
@@ -4,10 +4,232 @@ import cv2 as cv
 import numpy as np
 from scipy.spatial import cKDTree
 
-from typing import List
+from typing import List, Tuple
 
 from TerrainHydrology.Utilities.Math import Point
 
+class ShoreSegmentIndex:
+    """A uniform grid of the segments of a shoreline
+
+    Segment ``i`` runs from point ``i`` of the shoreline to point ``i+1``
+    (or to point 0, for the last point). Each segment is listed in every
+    grid cell that its bounding box touches. To find the segments that a
+    line segment may cross, only the cells along the line segment are
+    visited, so the cost depends on the length of the line segment, not on
+    the length of the shoreline.
+
+    The cells are about as large as the shoreline's area divided by the
+    number of segments, but no smaller than a typical segment.
+
+    :param contour: The points of the shoreline
+    :type contour: numpy.ndarray(n,2)
+    """
+    def __init__(self, contour: np.ndarray) -> None:
+        self.starts = np.asarray(contour, dtype=np.float64).reshape(-1, 2)
+        self.ends = np.roll(self.starts, -1, axis=0)
+
+        lower = np.minimum(self.starts, self.ends)
+        upper = np.maximum(self.starts, self.ends)
+        self.origin = lower.min(axis=0) if len(lower) > 0 else np.zeros(2)
+        extent = np.maximum(upper.max(axis=0) - self.origin if len(upper) > 0 else np.zeros(2), 1e-9)
+
+        numSegments = max(len(self.starts), 1)
+        lengths = np.linalg.norm(self.ends - self.starts, axis=1)
+        self.cellSize = max(np.sqrt(extent[0] * extent[1] / numSegments), float(np.median(lengths)) if len(lengths) > 0 else 0.0, float(extent.max()) / 4096)
+        self.shape = np.maximum(np.ceil(extent / self.cellSize).astype(np.int64), 1)
+
+        # pad the boxes a little, so that a segment that touches the edge of
+        # a cell is listed in the cells on both sides
+        pad = self.cellSize * 1e-6
+        self.lower = lower - pad
+        self.upper = upper + pad
+        cellLower = self.cellOf(self.lower)
+        cellUpper = self.cellOf(self.upper)
+
+        # list each segment in every cell of its bounding box
+        widths = cellUpper[:,0] - cellLower[:,0] + 1
+        counts = widths * (cellUpper[:,1] - cellLower[:,1] + 1)
+        segments = np.repeat(np.arange(len(counts)), counts)
+        local = np.arange(len(segments)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (cellLower[segments,1] + local // widths[segments]) * self.shape[0] + cellLower[segments,0] + local % widths[segments]
+
+        # the segments in cell c are cellSegments[offsets[c]:offsets[c+1]]
+        order = np.argsort(cells, kind='stable')
+        self.cellSegments = segments[order]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=int(self.shape[0] * self.shape[1]))))).astype(np.int64)
+    def cellOf(self, points: np.ndarray) -> np.ndarray:
+        """Gets the grid cells that points fall in
+
+        Points outside the grid are put in the nearest cell.
+
+        :param points: The points
+        :type points: numpy.ndarray(n,2)
+        :return: The column and row of the cell of each point
+        :rtype: numpy.ndarray(n,2)
+        """
+        cells = np.floor((np.asarray(points, dtype=np.float64) - self.origin) / self.cellSize)
+        return np.clip(cells, 0, self.shape - 1).astype(np.int64)
+    def cellsAlong(self, p0: Point, p1: Point) -> np.ndarray:
+        """Gets the grid cells that a line segment passes through
+
+        :param p0: The first point of the line segment
+        :type p0: `Math.Point`
+        :param p1: The second point of the line segment
+        :type p1: `Math.Point`
+        :return: The IDs of the cells, or an empty array if the line segment misses the grid
+        :rtype: numpy.ndarray
+        """
+        p0 = np.asarray(p0, dtype=np.float64)
+        direction = np.asarray(p1, dtype=np.float64) - p0
+        gridLower = self.origin - self.cellSize
+        gridUpper = self.origin + (self.shape + 1) * self.cellSize
+
+        # clip the line segment to the grid (with a margin of one cell)
+        t0, t1 = 0.0, 1.0
+        for axis in range(2):
+            if direction[axis] == 0:
+                if p0[axis] < gridLower[axis] or p0[axis] > gridUpper[axis]:
+                    return np.zeros(0, dtype=np.int64)
+                continue
+            ta = (gridLower[axis] - p0[axis]) / direction[axis]
+            tb = (gridUpper[axis] - p0[axis]) / direction[axis]
+            t0, t1 = max(t0, min(ta, tb)), min(t1, max(ta, tb))
+        if t0 > t1:
+            return np.zeros(0, dtype=np.int64)
+
+        # the line segment changes cells where it crosses a grid line. The
+        # cell between each crossing is the cell at the midpoint
+        ts = [ np.array([t0, t1]) ]
+        for axis in range(2):
+            if direction[axis] == 0:
+                continue
+            a, b = sorted(((p0[axis] + t * direction[axis] - self.origin[axis]) / self.cellSize for t in (t0, t1)))
+            lines = np.arange(np.ceil(a), np.floor(b) + 1)
+            ts.append((self.origin[axis] + lines * self.cellSize - p0[axis]) / direction[axis])
+        ts = np.unique(np.clip(np.concatenate(ts), t0, t1))
+        ts = np.concatenate((ts, (ts[:-1] + ts[1:]) / 2))
+
+        cells = self.cellOf(p0 + ts[:,np.newaxis] * direction)
+        return np.unique(cells[:,1] * self.shape[0] + cells[:,0])
+    def candidates(self, p0: Point, p1: Point) -> np.ndarray:
+        """Gets the segments that may intersect a line segment
+
+        Every segment that intersects the line segment is included, but some
+        that do not may be included as well. The segments are ordered by the
+        distance between their first point and ``p0``, closest first.
+
+        :param p0: The first point of the line segment
+        :type p0: `Math.Point`
+        :param p1: The second point of the line segment
+        :type p1: `Math.Point`
+        :return: The indices of the segments (that is, of their first points)
+        :rtype: numpy.ndarray
+        """
+        cells = self.cellsAlong(p0, p1)
+        if len(cells) == 0:
+            return np.zeros(0, dtype=np.int64)
+        segments = np.unique(np.concatenate([ self.cellSegments[self.offsets[cell]:self.offsets[cell+1]] for cell in cells ]))
+
+        # discard the segments whose bounding boxes miss the line segment's
+        lower = np.minimum(p0, p1)
+        upper = np.maximum(p0, p1)
+        segments = segments[np.all((self.lower[segments] <= upper) & (self.upper[segments] >= lower), axis=1)]
+
+        distances = np.sum((self.starts[segments] - np.asarray(p0, dtype=np.float64))**2, axis=1)
+        return segments[np.lexsort((segments, distances))]
+    def candidatePairs(self, p0s: np.ndarray, p1s: np.ndarray, maxCells: int=64) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Gets the segments that may intersect each of many line segments
+
+        This is :py:meth:`candidates` for all of the line segments at once.
+        Instead of the cells along each line segment, the segments are
+        gathered from every cell of its bounding box, the same way that
+        the segments themselves are listed. That is cheap for short line
+        segments. Line segments whose bounding boxes cover more than
+        ``maxCells`` cells are left out, and should be passed to
+        :py:meth:`candidates` instead.
+
+        :param p0s: The first point of each line segment
+        :type p0s: numpy.ndarray(n,2)
+        :param p1s: The second point of each line segment
+        :type p1s: numpy.ndarray(n,2)
+        :param maxCells: The largest number of cells to gather from for one line segment
+        :type maxCells: int
+        :return: The line segment and the segment of each candidate pair, ordered by line segment, and then as :py:meth:`candidates` orders them; and whether each line segment was left out
+        :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        p0s = np.asarray(p0s, dtype=np.float64).reshape(-1, 2)
+        p1s = np.asarray(p1s, dtype=np.float64).reshape(-1, 2)
+        lower = np.minimum(p0s, p1s)
+        upper = np.maximum(p0s, p1s)
+        cellLower = self.cellOf(lower)
+        cellUpper = self.cellOf(upper)
+
+        widths = cellUpper[:,0] - cellLower[:,0] + 1
+        counts = widths * (cellUpper[:,1] - cellLower[:,1] + 1)
+        skipped = counts > maxCells
+        counts[skipped] = 0
+
+        # list every cell of each line segment's bounding box
+        lines = np.repeat(np.arange(len(counts)), counts)
+        local = np.arange(len(lines)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (cellLower[lines,1] + local // widths[lines]) * self.shape[0] + cellLower[lines,0] + local % widths[lines]
+
+        # then every segment in those cells. A segment may be in several
+        # of them, so the pairs are made unique
+        cellCounts = self.offsets[cells+1] - self.offsets[cells]
+        lines = np.repeat(lines, cellCounts)
+        local = np.arange(len(lines)) - np.repeat(np.cumsum(cellCounts) - cellCounts, cellCounts)
+        segments = self.cellSegments[np.repeat(self.offsets[cells], cellCounts) + local]
+        pairs = np.unique(lines * len(self.starts) + segments)
+        lines, segments = pairs // len(self.starts), pairs % len(self.starts)
+
+        # discard the segments whose bounding boxes miss the line segments'
+        keep = np.all((self.lower[segments] <= upper[lines]) & (self.upper[segments] >= lower[lines]), axis=1)
+        lines, segments = lines[keep], segments[keep]
+
+        distances = np.sum((self.starts[segments] - p0s[lines])**2, axis=1)
+        order = np.lexsort((segments, distances, lines))
+        return lines[order], segments[order], skipped
+    def pointsInside(self, points: np.ndarray) -> np.ndarray:
+        """Determines which of many points are within the shoreline
+
+        This is the crossing-number rule of :py:func:`Math.pointsInPolygon`,
+        with the same arithmetic, but each point is only tested against the
+        segments that its ray in the +x direction may cross: those in the
+        cells of its row, from its own cell rightward.
+
+        :param points: The points to test
+        :type points: numpy.ndarray(n,2)
+        :return: True for each point that is within the shoreline
+        :rtype: numpy.ndarray(n)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(self.starts) < 3:
+            return np.zeros(len(points), dtype=bool)
+
+        # the cells of a row are numbered consecutively, so the segments
+        # from a point's cell to the end of its row are a single slice
+        cells = self.cellOf(points)
+        first = self.offsets[cells[:,1] * self.shape[0] + cells[:,0]]
+        counts = self.offsets[(cells[:,1] + 1) * self.shape[0]] - first
+        pointIDs = np.repeat(np.arange(len(points)), counts)
+        local = np.arange(len(pointIDs)) - np.repeat(np.cumsum(counts) - counts, counts)
+        segments = self.cellSegments[np.repeat(first, counts) + local]
+
+        # a segment may be in several of the cells
+        pairs = np.unique(pointIDs * len(self.starts) + segments)
+        pointIDs, segments = pairs // len(self.starts), pairs % len(self.starts)
+
+        x0, y0 = self.starts[segments,0], self.starts[segments,1]
+        x1, y1 = self.ends[segments,0], self.ends[segments,1]
+        px, py = points[pointIDs,0], points[pointIDs,1]
+        straddles = (y0 > py) != (y1 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossingX = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+
+        crossings = np.bincount(pointIDs[straddles & (px < crossingX)], minlength=len(points))
+        return crossings % 2 == 1
+
 class ShoreModel:
     """This class represents the shoreline of the land area.
 
@@ -47,6 +269,7 @@ class ShoreModel:
 
         self.realShape = (max([p[0] for p in self.contour])-min([p[0] for p in self.contour]),max([p[1] for p in self.contour])-min([p[1] for p in self.contour]))
         self.pointTree = cKDTree(self.contour)
+        self.segmentIndex = ShoreSegmentIndex(self.contour)
     def closestNPoints(self, loc: Point, n: int) -> List[int]:
         """Gets the closest N shoreline points to a given point
 
@@ -61,6 +284,21 @@ class ShoreModel:
         n = n if n > 1 else [n]
         distances, indices = self.pointTree.query(loc, k=n)
         return indices
+    def segmentCandidates(self, p0: Point, p1: Point) -> np.ndarray:
+        """Gets the shore segments that may intersect a line segment
+
+        Segment ``i`` runs from point ``i`` to point ``i+1`` (see
+        :class:`ShoreSegmentIndex`). Every segment that intersects the line
+        segment is included, closest to ``p0`` first.
+
+        :param p0: The first point of the line segment
+        :type p0: `Math.Point`
+        :param p1: The second point of the line segment
+        :type p1: `Math.Point`
+        :return: The indices of the segments
+        :rtype: numpy.ndarray
+        """
+        return self.segmentIndex.candidates(p0, p1)
     def distanceToShore(self, loc: Point) -> float:
         """Gets the distance between a point and the shore
 
@@ -82,6 +320,18 @@ class ShoreModel:
         :rtype: bool
         """
         return self.distanceToShore(loc) >= 0
+    def areOnLand(self, locs: np.ndarray) -> np.ndarray:
+        """Determines whether or not each of many points is on land
+
+        This agrees with :py:meth:`isOnLand`, except for points that are
+        exactly on the shoreline (see :py:meth:`ShoreSegmentIndex.pointsInside`).
+
+        :param locs: The locations to test
+        :type locs: numpy.ndarray(n,2)
+        :return: True for each point that is on land
+        :rtype: numpy.ndarray(n)
+        """
+        return self.segmentIndex.pointsInside(locs)
     def __getitem__(self, index: int):
         """Gets a point on the shore by index
 
@@ -118,10 +368,17 @@ class ShoreModel:
         """
         db.row_factory = sqlite3.Row
         cursor = db.execute('SELECT X(loc) AS locX, Y(loc) AS locY FROM Shoreline ORDER BY id')
-        self.contour = [(row['locX'], row['locY']) for row in cursor]
-        self.contour = np.array(self.contour, dtype=np.float32)
+        self.loadFromArray(np.array([(row['locX'], row['locY']) for row in cursor], dtype=np.float32))
+    def loadFromArray(self, contour: np.ndarray) -> None:
+        """Sets the shoreline from an array of points
+
+        :param contour: The points of the shoreline, in counterclockwise order
+        :type contour: numpy.ndarray(n,2)
+        """
+        self.contour = np.asarray(contour, dtype=np.float32)
 
         self.pointTree = cKDTree(self.contour)
+        self.segmentIndex = ShoreSegmentIndex(self.contour)
 
         # This will be a problem if the original object was a ShoreModelImage, but we're going to axe that class anyway
         self.realShape = (max([p[0] for p in self.contour])-min([p[0] for p in self.contour]),max([p[1] for p in self.contour])-min([p[1] for p in self.contour]))
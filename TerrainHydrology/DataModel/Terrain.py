@@ -10,6 +10,10 @@ class T:
     Terrain primitives are created with a ``position`` and ``cell``
     attribute. The elevation is computed separately.
 
+    A :class:`Terrain` does not store its primitives as instances of this
+    class. This class is for primitives that stand on their own. See
+    :class:`TView`.
+
     :cvar position: The position of the primitive
     :vartype position: tuple[float,float]
     :cvar cell: The ID of the cell in which this primitive is situated
@@ -17,77 +21,191 @@ class T:
     :cvar elevation: The elevation of the primitive
     :vartype elevation: float
     """
+    __slots__ = ('position', 'cell', 'elevation')
+
     def __init__(self, position, cell):
         self.position = position
         self.cell = cell
         self.elevation = None
 
-class Terrain:
-    """Holds and organizes the terrain primitives (:class:`T`)
+class TView:
+    """A terrain primitive that is stored in a :class:`Terrain`
 
-    :param cells: The TerrainHoneycomb of the land
-    :type cells: TerrainHoneycomb
-    :param num_points: (Roughly) the number of points in each cell
-    :type num_points: int
+    This has the same attributes as :class:`T`, but they are read from (and
+    the elevation is written to) the columns of the Terrain, so views are
+    cheap to create and discard.
+
+    :param terrain: The terrain that holds the primitive
+    :type terrain: Terrain
+    :param index: The index of the primitive in the terrain
+    :type index: int
     """
+    __slots__ = ('terrain', 'index')
+
+    def __init__(self, terrain: 'Terrain', index: int):
+        self.terrain = terrain
+        self.index = index
+    @property
+    def position(self) -> Tuple[float,float]:
+        return (float(self.terrain.positions[self.index,0]), float(self.terrain.positions[self.index,1]))
+    @property
+    def cell(self) -> int:
+        return int(self.terrain.cells[self.index])
+    @property
+    def elevation(self) -> float:
+        elevation = self.terrain.elevations[self.index]
+        return None if np.isnan(elevation) else float(elevation)
+    @elevation.setter
+    def elevation(self, elevation: float) -> None:
+        self.terrain.elevations[self.index] = np.nan if elevation is None else elevation
+
+class Terrain:
+    """Holds and organizes the terrain primitives
+
+    The primitives are stored as columns: :py:attr:`positions`,
+    :py:attr:`cells`, and :py:attr:`elevations`. They are sorted by cell,
+    so the primitives of any cell are a contiguous slice of the columns
+    (see :py:meth:`cellSlice`). The elevation of a primitive whose
+    elevation has not been computed is NaN.
+
+    Methods that return individual primitives return :class:`TView`
+    objects.
+
+    The primitives are created by
+    :py:func:`TerrainPrimitiveFunctions.initializeTerrain`, or loaded with
+    :py:meth:`loadFromDB`.
+
+    :ivar positions: The position of each primitive
+    :vartype positions: numpy.ndarray(n,2)
+    :ivar cells: The cell of each primitive
+    :vartype cells: numpy.ndarray(n)
+    :ivar elevations: The elevation of each primitive
+    :vartype elevations: numpy.ndarray(n)
+    """
+    def __init__(self):
+        self.setPrimitives(np.zeros((0,2)), np.zeros(0, dtype=np.int64))
+    def setPrimitives(self, positions: np.ndarray, cells: np.ndarray, elevations: np.ndarray=None, presorted: bool=False) -> None:
+        """Replaces the terrain primitives
+
+        The primitives need not be sorted by cell. They are sorted here (in
+        a stable way), so their indices may change.
+
+        :param positions: The position of each primitive
+        :type positions: numpy.ndarray(n,2)
+        :param cells: The cell of each primitive
+        :type cells: numpy.ndarray(n)
+        :param elevations: The elevation of each primitive. If this is None, the elevations are NaN
+        :type elevations: numpy.ndarray(n)
+        :param presorted: If this is True, the primitives must already be sorted by cell. The arrays are then used as they are, without being copied (so a memory-mapped array stays memory-mapped)
+        :type presorted: bool
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        cells = np.asarray(cells, dtype=np.int64)
+        if elevations is None:
+            elevations = np.full(len(cells), np.nan)
+        elevations = np.asarray(elevations, dtype=np.float64)
+
+        if presorted:
+            self.positions = positions
+            self.cells = cells
+            self.elevations = elevations
+        else:
+            order = np.argsort(cells, kind='stable')
+            self.positions = np.ascontiguousarray(positions[order])
+            self.cells = np.ascontiguousarray(cells[order])
+            self.elevations = elevations[order]
+
+        # the primitives of self.cellIDs[i] are offsets[i]:offsets[i+1]
+        starts = np.flatnonzero(np.diff(self.cells, prepend=-1))
+        self.cellIDs = np.asarray(self.cells[starts])
+        self.offsets = np.append(starts, len(self.cells)).astype(np.int64)
+
+        self.apkd = cKDTree(self.positions, copy_data=False)
     def loadFromDB(self, db: sqlite3.Connection):
         """Loads the terrain primitives from a database
 
         :param db: The database connection
         :type db: sqlite3.Connection
         """
-        db.row_factory = sqlite3.Row
-
-        self.cellTsDict = { }
-        self.tList = [ ]
-
-        # get all the primitives
-        for row in db.execute("SELECT rivercell, elevation, X(loc) AS locX, Y(loc) AS locY FROM Ts"):
-            t = T((row["locX"], row["locY"]), row["rivercell"])
-            t.elevation = row["elevation"]
-            if row["rivercell"] not in self.cellTsDict:
-                self.cellTsDict[row["rivercell"]] = [ ]
-            self.cellTsDict[row["rivercell"]].append(t)
-            self.tList.append(t)
-
-        allpoints_list = [[t.position[0],t.position[1]] for t in self.allTs()]
-        allpoints_nd = np.array(allpoints_list)
-        self.apkd = cKDTree(allpoints_nd)
+        # a NULL elevation becomes NaN. The rows are read in the order of
+        # their IDs, so saveElevationsToDB() can find them again
+        rows = np.array(
+            db.execute("SELECT rivercell, elevation, X(loc), Y(loc) FROM Ts ORDER BY id").fetchall(),
+            dtype=np.float64
+        ).reshape(-1, 4)
+
+        self.setPrimitives(rows[:,2:4], rows[:,0].astype(np.int64), rows[:,1])
     def saveToDB(self, db: sqlite3.Connection):
         """Saves the terrain primitives to a database
 
         :param db: The database connection
         :type db: sqlite3.Connection
         """
+        elevations = [ None if np.isnan(elevation) else elevation for elevation in self.elevations.tolist() ]
         with db:
             db.execute("DELETE FROM Ts")
-            db.executemany("INSERT INTO Ts (id, rivercell, elevation, loc) VALUES (?, ?, ?, MakePoint(?, ?, 347895))", [(idx, t.cell, t.elevation, t.position[0], t.position[1]) for idx, t in enumerate(self.tList)])
-    def allTs(self) -> List[T]:
+            db.executemany("INSERT INTO Ts (id, rivercell, elevation, loc) VALUES (?, ?, ?, MakePoint(?, ?, 347895))", zip(range(len(self)), self.cells.tolist(), elevations, self.positions[:,0].tolist(), self.positions[:,1].tolist()))
+    def saveElevationsToDB(self, db: sqlite3.Connection):
+        """Updates only the elevations of terrain primitives that are already saved
+
+        The primitives must have been written by :py:meth:`saveToDB`, and
+        their positions and cells must not have changed since.
+
+        :param db: The database connection
+        :type db: sqlite3.Connection
+        """
+        elevations = [ None if np.isnan(elevation) else elevation for elevation in self.elevations.tolist() ]
+        with db:
+            db.executemany("UPDATE Ts SET elevation = ? WHERE id = ?", zip(elevations, range(len(self))))
+    def allTs(self) -> List[TView]:
         """Simply returns all the terrain primitives
 
+        This creates a view for every primitive. Where possible, use the
+        columns directly.
+
         :return: A list of all the terrain primitives
-        :rtype: list[T]
+        :rtype: list[TView]
+        """
+        return [ TView(self, idx) for idx in range(len(self)) ]
+    @property
+    def tList(self) -> List[TView]:
+        """All the terrain primitives (see :py:meth:`allTs`)
+
+        :rtype: list[TView]
+        """
+        return self.allTs()
+    def cellSlice(self, cell: int) -> slice:
+        """Gets the range of indices of the terrain primitives within a given cell
+
+        :param cell: The ID of the cell you wish to query
+        :type cell: int
+        :return: The slice of the columns that holds the cell's primitives. It is empty if the cell has no primitives
+        :rtype: slice
         """
-        return self.tList.copy()
-    def cellTsDict(self, cell: int) -> List[T]:
+        idx = np.searchsorted(self.cellIDs, cell)
+        if idx >= len(self.cellIDs) or self.cellIDs[idx] != cell:
+            return slice(0, 0)
+        return slice(int(self.offsets[idx]), int(self.offsets[idx+1]))
+    def cellTs(self, cell: int) -> List[TView]:
         """Gets the terrain primitives within a given cell
 
         :param cell: The ID of the cell you wish to query
         :type cell: int
         :return: A list of the terrain primitives in the cell
-        :rtype: list[T]
+        :rtype: list[TView]
         """
-        return self.Ts[cell].copy()
-    def getT(self, tid: int) -> T:
+        cellSlice = self.cellSlice(cell)
+        return [ TView(self, idx) for idx in range(cellSlice.start, cellSlice.stop) ]
+    def getT(self, tid: int) -> TView:
         """Gets a terrain primitive identified by its index in the list of all primitives
 
         :param tid: The index of the primitive you wish to retrieve
         :type tid: int
         :return: The terrain primitive
-        :rtype: T
+        :rtype: TView
         """
-        return self.tList[tid]
-    def query_ball_point(self, loc: Tuple[float,float], radius: float) -> List[T]:
+        return TView(self, tid)
+    def query_ball_point(self, loc: Tuple[float,float], radius: float) -> List[TView]:
         """Gets all terrain primitives within a given radius of a given location
 
         :param loc: The location you wish to test
@@ -95,13 +213,13 @@ class Terrain:
         :param radius: The search radius
         :type radius: float
         :return: A list of the primitives within that area
-        :rtype: list[T]
+        :rtype: list[TView]
         """
-        return [self.tList[i] for i in self.apkd.query_ball_point(loc,radius)]
+        return [TView(self, i) for i in self.apkd.query_ball_point(loc,radius)]
     def __len__(self) -> int:
         """Returns the number of nodes in the forest
 
         :return: The number of primitives on the map
         :rtype: int
         """
-        return len(self.tList)
\ No newline at end of file
+        return len(self.cells)
@@ -1,8 +1,9 @@
 import sqlite3
+import numpy as np
 
 from typing import Tuple, List, Dict
 
-from TerrainHydrology.Utilities.Math import Point, polygonArea, pointInPolygon
+from TerrainHydrology.Utilities.Math import Point, polygonArea, polygonAreas, pointInPolygon, pointsInPolygon
 
 class Q:
     """Represents a ridge point
@@ -79,6 +80,9 @@ class TerrainHoneycomb:
     def loadFromDB(self, db: sqlite3.Connection):
         """Loads the terrain honeycomb from a database
 
+        The edges of each cell are put back in the order that they had when
+        they were saved, so the cells have the same shapes as before.
+
         :param db: The database connection
         :type db: sqlite3.Connection
         """
@@ -103,6 +107,7 @@ class TerrainHoneycomb:
         self.qs = list(qs.values())
         
         edges = { }
+        edgeQs = { } # edge ID -> the IDs of its Qs
         for edgeRow in db.execute('SELECT id, Q0, Q1, hasRiver, isShore, shore0, shore1 FROM Edges'):
             id = edgeRow['id']
             Q0 = qs[edgeRow['Q0']]
@@ -114,28 +119,45 @@ class TerrainHoneycomb:
 
             edge = Edge(Q0, Q1, hasRiver, isShore, (shore0, shore1))
             edges[id] = edge
+            edgeQs[id] = (edgeRow['Q0'], edgeRow['Q1'])
 
-        self.cellsEdges: Dict[int, List[Edge]] = { } # cellID -> list of edges
+        cellsEdgeIDs: Dict[int, List[int]] = { } # cellID -> list of edge IDs
         # get all the edges that border each cell
         for row in db.execute('SELECT edge, node0, node1 FROM EdgeCells'):
             node0 = row['node0']
             node1 = row['node1']
             edgeID = row['edge']
 
-            if node0 not in self.cellsEdges:
-                self.cellsEdges[node0] = [ ]
-            self.cellsEdges[node0].append(edges[edgeID])
-            if node1 not in self.cellsEdges:
-                self.cellsEdges[node1] = [ ]
-            self.cellsEdges[node1].append(edges[edgeID])
+            if node0 not in cellsEdgeIDs:
+                cellsEdgeIDs[node0] = [ ]
+            cellsEdgeIDs[node0].append(edgeID)
+            if node1 not in cellsEdgeIDs:
+                cellsEdgeIDs[node1] = [ ]
+            cellsEdgeIDs[node1].append(edgeID)
         # since EdgeCells excludes shore segments, we need to add them in
         for row in db.execute('SELECT Edges.id, q1s.rivernode FROM Edges JOIN Cells AS q0s ON q0s.q = Edges.q0 JOIN Cells AS q1s ON q1s.q = Edges.q1 AND q1s.rivernode = q0s.rivernode WHERE isShore = 1'):
             edgeID = row['id']
             nodeID = row['rivernode']
 
-            if nodeID not in self.cellsEdges:
-                self.cellsEdges[nodeID] = [ ]
-            self.cellsEdges[nodeID].append(edges[edgeID])
+            if nodeID not in cellsEdgeIDs:
+                cellsEdgeIDs[nodeID] = [ ]
+            cellsEdgeIDs[nodeID].append(edgeID)
+
+        # the queries above return the edges in no particular order, but the
+        # shape of a cell depends on the order of its edges. saveToDB() wrote
+        # the Qs of each cell in order, and edge i of a cell runs between Q i
+        # and Q i+1, so that order can be restored
+        polygons: Dict[int, List[int]] = { } # cellID -> the IDs of its Qs, in order
+        for row in db.execute('SELECT rivernode, q FROM Cells ORDER BY rivernode, polygonOrder'):
+            nodeID = row['rivernode']
+
+            if nodeID not in polygons:
+                polygons[nodeID] = [ ]
+            polygons[nodeID].append(row['q'])
+
+        self.cellsEdges: Dict[int, List[Edge]] = { } # cellID -> list of edges
+        for nodeID in sorted(cellsEdgeIDs):
+            self.cellsEdges[nodeID] = [ edges[edgeID] for edgeID in orderCellEdges(cellsEdgeIDs[nodeID], polygons.get(nodeID, [ ]), edgeQs) ]
 
         self.cellsDownstreamRidges: Dict[int, Edge] = { }
         # get all the pairs of children and their parents, and get the edges between them
@@ -166,6 +188,7 @@ class TerrainHoneycomb:
             db.executemany("INSERT INTO Qs (id, elevation, loc) VALUES (?, ?, MakePoint(?, ?, 347895))", [(id(q), q.elevation, float(q.position[0]), float(q.position[1])) for q in self.qs])
 
             # write cells using the edges, that way we can save the order of the Qs for a good polygon
+            cellRows = [ ]
             for cellID, edges in self.cellsEdges.items():
                 # we have to put the Qs in order, so we can make a good polygon
                 # the edges are in order, and they are all chained together, so we can just use the order of the edges
@@ -180,7 +203,8 @@ class TerrainHoneycomb:
                         qs.append(edge.Q1)
 
                 # now we have the Qs in order, so we can make a polygon
-                db.executemany("INSERT INTO Cells (rivernode, polygonOrder, q) VALUES (?, ?, ?)", [(cellID, idx, id(q)) for idx, q in enumerate(qs)])
+                cellRows.extend((cellID, idx, id(q)) for idx, q in enumerate(qs))
+            db.executemany("INSERT INTO Cells (rivernode, polygonOrder, q) VALUES (?, ?, ?)", cellRows)
 
             # write edges
             db.executemany("INSERT INTO Edges (id, q0, q1, hasRiver, isShore, shore0, shore1) VALUES (?, ?, ?, ?, ?, ?, ?)", [(saveID, id(edge.Q0), id(edge.Q1), edge.hasRiver, edge.isShore, edge.shoreSegment[0] if edge.isShore else None, edge.shoreSegment[1] if edge.isShore else None) for saveID, edge in createdEdges.items()])
@@ -230,6 +254,26 @@ class TerrainHoneycomb:
         return polygonArea(
             self.cellVertices(cellID)
         )
+    def cellAreas(self, cellIDs: List[int]) -> np.ndarray:
+        """Calculates the areas of many cells at once
+
+        The shapes of all the cells are packed into a single array, and the
+        areas are computed together. The result for each cell is the same as
+        :py:meth:`cellArea`.
+
+        :param cellIDs: The IDs of the cells that you wish to query
+        :type cellIDs: list[int]
+        :return: The area of each cell, in the same order as ``cellIDs``
+        :rtype: numpy.ndarray
+        """
+        allVertices = [ self.cellVertices(cellID) for cellID in cellIDs ]
+
+        offsets = np.zeros(len(allVertices) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(vertices) for vertices in allVertices])
+
+        packed = np.array([vertex for vertices in allVertices for vertex in vertices], dtype=np.float64).reshape(-1, 2)
+
+        return polygonAreas(packed, offsets)
     def cellQs(self, node: int) -> List[Q]:
         """Returns all the Qs binding the cell that corresponds to the given node
 
@@ -279,6 +323,20 @@ class TerrainHoneycomb:
         :rtype: bool
         """
         return pointInPolygon(p, self.cellVertices(n))
+    def areInCell(self, points: np.ndarray, n: int) -> np.ndarray:
+        """Determines which of many points are within a given cell
+
+        The cell's shape is only looked up once, and the points are tested
+        together. See :py:func:`Math.pointsInPolygon`.
+
+        :param points: The points you wish to test
+        :type points: numpy.ndarray(m,2)
+        :param n: The ID of the cell you wish to test
+        :type n: int
+        :return: True for each point that is in the cell that corresponds to ``n``
+        :rtype: numpy.ndarray(m)
+        """
+        return pointsInPolygon(points, self.cellVertices(n))
     def cellRidges(self, n: int) -> List[Edge]:
         """Returns cell edges that are not transected by a river, and are not part of the shoreline
 
@@ -310,4 +368,30 @@ class TerrainHoneycomb:
         :return: The IDs of the vertices that define the outflow ridge, unless this cell is the mouth of a river
         :rtype: Edge | None
         """
-        return self.cellsDownstreamRidges[n] if n in self.cellsDownstreamRidges else None
\ No newline at end of file
+        return self.cellsDownstreamRidges[n] if n in self.cellsDownstreamRidges else None
+
+def orderCellEdges(edgeIDs: List[int], polygon: List[int], edgeQs: Dict[int, Tuple[int, int]]) -> List[int]:
+    """Puts the edges of a cell in the order of the cell's Qs
+
+    Edge ``i`` of the result runs between ``polygon[i]`` and
+    ``polygon[i+1]`` (the last edge closes the polygon). If the edges do not
+    form a closed polygon through the given Qs, they are returned as they
+    are.
+
+    :param edgeIDs: The IDs of the cell's edges, in any order
+    :type edgeIDs: list[int]
+    :param polygon: The IDs of the cell's Qs, in order
+    :type polygon: list[int]
+    :param edgeQs: The IDs of the Qs of each edge
+    :type edgeQs: dict[int, tuple[int, int]]
+    :return: The IDs of the edges, in order
+    :rtype: list[int]
+    """
+    if len(polygon) != len(edgeIDs):
+        return edgeIDs
+
+    byQs = { frozenset(edgeQs[edgeID]): edgeID for edgeID in edgeIDs }
+    ordered = [ byQs.get(frozenset((polygon[idx], polygon[(idx+1) % len(polygon)]))) for idx in range(len(polygon)) ]
+    if None in ordered or len(set(ordered)) != len(ordered):
+        return edgeIDs
+    return ordered
@@ -32,13 +32,106 @@ def getRidgeElevation(q: Q, hydrology: HydrologyNetwork, terrainSlope: RasterDat
     slope = terrainSlopeRate * terrainSlope[q.position[0],q.position[1]] / 255
     return maxElevation + d * slope
 
-def initializeTerrainHoneycomb(shore: ShoreModel, hydrology: HydrologyNetwork) -> TerrainHoneycomb:
+def computeRidgeElevations(qPositions: np.ndarray, qNodes: np.ndarray, nodePositions: np.ndarray, nodeElevations: np.ndarray, terrainSlope: RasterData, terrainSlopeRate: float) -> np.ndarray:
+    """Computes the elevations of many ridges/crests at once
+
+    This gives the same results as :func:`getRidgeElevation`, but it works
+    on arrays so that all the ridge elevations can be computed together.
+
+    Each row of ``qNodes`` lists the IDs of the nodes that a Q borders, in
+    the same order as :py:obj:`Q.nodes`. Rows are padded with ``-1`` for Qs
+    that border fewer nodes than the widest row.
+
+    :param qPositions: The location of each Q
+    :type qPositions: numpy.ndarray(m,2)
+    :param qNodes: The IDs of the nodes that each Q borders, padded with -1
+    :type qNodes: numpy.ndarray(m,k)
+    :param nodePositions: The location of each node in the hydrology network, indexed by ID
+    :type nodePositions: numpy.ndarray(n,2)
+    :param nodeElevations: The elevation of each node in the hydrology network, indexed by ID
+    :type nodeElevations: numpy.ndarray(n)
+    :param terrainSlope: A raster that indicates how steep the terrain should climb in different areas
+    :type terrainSlope: RasterData
+    :param terrainSlopeRate: This is documented in hydrology.py under "Terrain Parameters"
+    :type terrainSlopeRate: float
+    :return: The elevation of each ridge
+    :rtype: numpy.ndarray(m)
+    """
+    qPositions = np.asarray(qPositions, dtype=np.float64).reshape(-1, 2)
+    qNodes = np.asarray(qNodes, dtype=np.int64).reshape(len(qPositions), -1)
+    nodePositions = np.asarray(nodePositions, dtype=np.float64).reshape(-1, 2)
+    nodeElevations = np.asarray(nodeElevations, dtype=np.float64)
+
+    elevations = np.zeros(len(qPositions))
+
+    # if a Q only borders 1 node, then it's directly on the shore, and should be 0
+    isRidge = (qNodes >= 0).sum(axis=1) >= 2
+    if not isRidge.any():
+        return elevations
+
+    qPositions = qPositions[isRidge]
+    qNodes = qNodes[isRidge]
+
+    borderElevations = np.where(qNodes >= 0, nodeElevations[qNodes], -np.inf)
+    maxElevation = borderElevations.max(axis=1)
+    d = np.linalg.norm(qPositions - nodePositions[qNodes[:,0]], axis=1)
+    slope = terrainSlopeRate * terrainSlope.sample(qPositions) / 255
+
+    elevations[isRidge] = maxElevation + d * slope
+
+    return elevations
+
+def setRidgeElevations(cells: TerrainHoneycomb, hydrology: HydrologyNetwork, terrainSlope: RasterData, terrainSlopeRate: float) -> None:
+    """Computes and sets the elevation of every Q in the terrain honeycomb
+
+    The Qs and the hydrology network are packed into arrays and handed to
+    :func:`computeRidgeElevations`.
+
+    :param cells: The terrain honeycomb whose Qs should be given elevations
+    :type cells: TerrainHoneycomb
+    :param hydrology: The hydrology network for the terrain
+    :type hydrology: HydrologyNetwork
+    :param terrainSlope: A raster that indicates how steep the terrain should climb in different areas
+    :type terrainSlope: RasterData
+    :param terrainSlopeRate: This is documented in hydrology.py under "Terrain Parameters"
+    :type terrainSlopeRate: float
+    """
+    qs = [q for q in cells.allQs() if q is not None]
+    if len(qs) < 1:
+        return
+
+    nodes = hydrology.allNodes()
+    nodePositions = np.zeros((len(nodes), 2))
+    nodeElevations = np.zeros(len(nodes))
+    for node in nodes:
+        nodePositions[node.id] = node.position
+        nodeElevations[node.id] = node.elevation
+
+    qPositions = np.array([q.position for q in qs], dtype=np.float64)
+    qNodes = np.full((len(qs), max([len(q.nodes) for q in qs] + [1])), -1, dtype=np.int64)
+    for idx, q in enumerate(qs):
+        qNodes[idx,:len(q.nodes)] = q.nodes
+
+    elevations = computeRidgeElevations(qPositions, qNodes, nodePositions, nodeElevations, terrainSlope, terrainSlopeRate)
+
+    for q, elevation in zip(qs, elevations):
+        q.elevation = float(elevation)
+
+def initializeTerrainHoneycomb(shore: ShoreModel, hydrology: HydrologyNetwork, batchShoreTests: bool=True) -> TerrainHoneycomb:
     """Based on a hydrology network and a shoreline, determines the correct TerrainHoneycomb
+
+    If ``batchShoreTests`` is set, the Voronoi vertices and ridges are
+    tested against the shoreline all at once, beforehand (see
+    :py:func:`precomputeShoreTests`). Otherwise, each one is tested when
+    the cells reach it. Either way, the cells are assembled one at a time,
+    in the same order, so the result is the same.
     
     :param shore: The shoreline
     :type shore: DataModel.ShoreModel
     :param hydrology: The hydrology network
     :type hydrology: DataModel.HydrologyNetwork
+    :param batchShoreTests: Whether to test the vertices and ridges against the shoreline beforehand
+    :type batchShoreTests: bool
     :return: A correctly-configured Terrain Honeycomb
     :rtype: DataModel.TerrainHoneycomb
     """
@@ -53,6 +146,8 @@ def initializeTerrainHoneycomb(shore: ShoreModel, hydrology: HydrologyNetwork) -
     points.append((shore.realShape[0],-shore.realShape[1]))
 
     vor = Voronoi(points,qhull_options='Qbb Qc Qz Qx')
+    if batchShoreTests:
+        precomputeShoreTests(vor, shore)
     vor.vertices = [(vertex[0],vertex[1]) for vertex in vor.vertices] # convert to list for easy comprehension
 
     # This is for reverse lookup of ridge_points. Given a point (node ID),
@@ -103,6 +198,78 @@ def initializeTerrainHoneycomb(shore: ShoreModel, hydrology: HydrologyNetwork) -
 
     return cells
 
+def precomputeShoreTests(vor: Voronoi, shore: ShoreModel) -> None:
+    """Tests all of the Voronoi vertices and ridges against the shoreline at once
+
+    The vertices are tested with :py:meth:`ShoreModel.areOnLand`. Then, for
+    the ridges that cross the shore (those with one vertex on land), the
+    shore segment that each one crosses is found, searching from its vertex
+    on land.
+
+    The results are kept on the Voronoi object as ``vertexOnLand`` and
+    ``ridgeShoreSegments``, and are used by :py:func:`isVertexOnLand` and
+    :py:func:`ridgeShoreSegment`.
+
+    :param vor: The Voronoi partition for the hydrology network. Its vertices must still be an array
+    :type vor: Scipy.Voronoi
+    :param shore: The shoreline
+    :type shore: DataModel.ShoreModel
+    """
+    vertices = np.asarray(vor.vertices)
+    vertexOnLand = shore.areOnLand(vertices)
+
+    # ridges that extend to infinity (-1) only border the corners
+    ridgeVertices = np.asarray(vor.ridge_vertices)
+    finite = np.all(ridgeVertices >= 0, axis=1)
+    crossing = np.flatnonzero(finite & (vertexOnLand[ridgeVertices[:,0]] != vertexOnLand[ridgeVertices[:,1]]))
+    # the vertex on land comes first
+    landFirst = np.where(vertexOnLand[ridgeVertices[crossing,0]], ridgeVertices[crossing].T, ridgeVertices[crossing,::-1].T).T
+
+    segments = findIntersectingShoreSegments(vertices[landFirst[:,0]], vertices[landFirst[:,1]], shore)
+    ridgeShoreSegments = { }
+    for ridgeID, landVertexID, segment in zip(crossing, landFirst[:,0], segments):
+        ridgeShoreSegments[int(ridgeID)] = (int(landVertexID), segment)
+
+    vor.vertexOnLand = vertexOnLand
+    vor.ridgeShoreSegments = ridgeShoreSegments
+
+def isVertexOnLand(vertexID: int, vor: Voronoi, shore: ShoreModel) -> bool:
+    """Determines whether a Voronoi vertex is on land
+
+    :param vertexID: The ID of the vertex
+    :type vertexID: int
+    :param vor: The Voronoi partition for the hydrology network
+    :type vor: Scipy.Voronoi
+    :param shore: The shoreline
+    :type shore: DataModel.ShoreModel
+    :return: True if the vertex is on land
+    :rtype: bool
+    """
+    vertexOnLand = getattr(vor, 'vertexOnLand', None)
+    if isinstance(vertexOnLand, np.ndarray):
+        return bool(vertexOnLand[vertexID])
+    return shore.isOnLand(vor.vertices[vertexID])
+
+def ridgeShoreSegment(ridgeID: int, vor: Voronoi, shore: ShoreModel) -> typing.Tuple[int, int]:
+    """Finds the shore segment that a ridge crosses, searching from the ridge's first vertex
+
+    :param ridgeID: The (Voronoi) ID of the ridge
+    :type ridgeID: int
+    :param vor: The Voronoi partition for the hydrology network
+    :type vor: Scipy.Voronoi
+    :param shore: The shoreline
+    :type shore: DataModel.ShoreModel
+    :return: The shore segment, or None
+    :rtype: tuple[int, int] | None
+    """
+    ridgeShoreSegments = getattr(vor, 'ridgeShoreSegments', None)
+    if isinstance(ridgeShoreSegments, dict) and ridgeID in ridgeShoreSegments:
+        landVertexID, segment = ridgeShoreSegments[ridgeID]
+        # the segment was found by searching from the vertex on land
+        if landVertexID == getVertexID0(ridgeID, vor):
+            return segment
+    return findIntersectingShoreSegment(getVertex0(ridgeID, vor), getVertex1(ridgeID, vor), shore)
+
 # This is for reverse lookup of ridge_points. Given a point (node ID),
 # it retrieves the ridges that border it
 def ridgesToPoints(vor: Voronoi) -> typing.Dict[int, typing.List[int]]:
@@ -157,7 +324,7 @@ def processRidge(edgesLeft: typing.List[int], cellEdges: typing.List[Edge], crea
         return cellEdges
 
     ridgeID: int = edgesLeft[0]
-    if shore.isOnLand(getVertex1(ridgeID, vor)):
+    if isVertexOnLand(getVertexID1(ridgeID, vor), vor, shore):
         newRidge: Edge = None
         # both land Edges and the Qs that they are made of are shared between cells. So we have to
         # check both kinds of objects to see if they have already been created before creating them
@@ -242,7 +409,7 @@ def terminateRidgeAndStartShore(edgesLeft: typing.List[int], cellEdges: typing.L
         # cannot have been, either.
         Q1: Q = None
 
-        shoreSegment: typing.Tuple[int, int] = findIntersectingShoreSegment(getVertex0(edgesLeft[0], vor), getVertex1(edgesLeft[0], vor), shore)
+        shoreSegment: typing.Tuple[int, int] = ridgeShoreSegment(edgesLeft[0], vor, shore)
         intersection: Point = edgeIntersection(getVertex0(edgesLeft[0], vor), getVertex1(edgesLeft[0], vor), shore[shoreSegment[0]], shore[shoreSegment[1]])
 
         Q1: Q = Q(intersection)
@@ -368,6 +535,12 @@ def hasRiver(ridgeID: int, vor: Voronoi, hydrology: HydrologyNetwork) -> bool:
 
 def findIntersectingShoreSegment(p0: Point, p1: Point, shore: ShoreModel) -> typing.Tuple[int, int]:
     """Tries to find a shore segment that intersects with a line segment
+
+    If more than one does, the one whose first point is closest to ``p0`` is
+    found. A :class:`ShoreModel` only tests the segments that its segment
+    index lists near the line segment (see
+    :py:meth:`ShoreModel.segmentCandidates`). Other shorelines are searched
+    outward from ``p0``.
     
     :param p0: The first point of the input line segment
     :type p0: Math.Point
@@ -376,6 +549,13 @@ def findIntersectingShoreSegment(p0: Point, p1: Point, shore: ShoreModel) -> typ
     :return: A shore segment if there is one that intersects with the input line segment, or None
     :rtype: tuple[int, int] | None
     """
+    if isinstance(shore, ShoreModel):
+        for index in shore.segmentCandidates(p0, p1).tolist():
+            otherIndex = index+1 if index+1 < len(shore) else 0
+            if edgeIntersection(shore[index], shore[otherIndex], p0, p1) is not None:
+                return (index, otherIndex)
+        return None
+
     power: int = 1
     while True:
         indexes: typing.List[int] = shore.closestNPoints(p0, 4**power)
@@ -387,6 +567,63 @@ def findIntersectingShoreSegment(p0: Point, p1: Point, shore: ShoreModel) -> typ
                 return (index, otherIndex)
         power = power + 1
 
+def findIntersectingShoreSegments(p0s: np.ndarray, p1s: np.ndarray, shore: ShoreModel) -> typing.List[typing.Tuple[int, int]]:
+    """Finds the shore segments that many line segments intersect
+
+    The result is the same as :py:func:`findIntersectingShoreSegment` for
+    each line segment. For a :class:`ShoreModel`, the candidate segments of
+    all the line segments are gathered at once (see
+    :py:meth:`ShoreSegmentIndex.candidatePairs`), and are tested with the
+    arithmetic of :py:func:`Math.edgeIntersection`, in NumPy. The closest
+    segment that each line segment intersects is then checked with
+    :py:func:`Math.edgeIntersection` itself. Long line segments, and other
+    shorelines, are searched one at a time.
+
+    :param p0s: The first point of each line segment
+    :type p0s: numpy.ndarray(n,2)
+    :param p1s: The second point of each line segment
+    :type p1s: numpy.ndarray(n,2)
+    :param shore: The shoreline
+    :type shore: DataModel.ShoreModel
+    :return: The shore segment that each line segment intersects, or None where there is none
+    :rtype: list[tuple[int, int] | None]
+    """
+    p0s = np.asarray(p0s, dtype=np.float64).reshape(-1, 2)
+    p1s = np.asarray(p1s, dtype=np.float64).reshape(-1, 2)
+    if not isinstance(shore, ShoreModel):
+        return [ findIntersectingShoreSegment((p0[0], p0[1]), (p1[0], p1[1]), shore) for p0, p1 in zip(p0s, p1s) ]
+
+    lines, segments, skipped = shore.segmentIndex.candidatePairs(p0s, p1s)
+
+    # edgeIntersection() with the shore segment first. The shore's points
+    # keep their own precision, so the results are the same
+    x0, y0 = shore.contour[segments,0], shore.contour[segments,1]
+    x1, y1 = shore.contour[(segments+1) % len(shore),0], shore.contour[(segments+1) % len(shore),1]
+    x2, y2 = p0s[lines,0], p0s[lines,1]
+    x3, y3 = p1s[lines,0], p1s[lines,1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = (y3-y2)*(x1-x0) - (x3-x2)*(y1-y0)
+        ua = ((x3-x2)*(y0-y2) - (y3-y2)*(x0-x2)) / denom
+        ub = ((x1-x0)*(y0-y2) - (y1-y0)*(x0-x2)) / denom
+    intersects = (denom != 0) & (ua >= 0) & (ua <= 1) & (ub >= 0) & (ub <= 1)
+
+    # the pairs are ordered as findIntersectingShoreSegment() searches them,
+    # so the first one of each line segment is its result
+    lines, segments = lines[intersects], segments[intersects]
+    hitLines, firsts = np.unique(lines, return_index=True)
+
+    found: typing.List[typing.Tuple[int, int]] = [ None ] * len(p0s)
+    for line, index in zip(hitLines.tolist(), segments[firsts].tolist()):
+        otherIndex = index+1 if index+1 < len(shore) else 0
+        if edgeIntersection(shore[index], shore[otherIndex], (p0s[line,0], p0s[line,1]), (p1s[line,0], p1s[line,1])) is not None:
+            found[line] = (index, otherIndex)
+        else:
+            found[line] = findIntersectingShoreSegment((p0s[line,0], p0s[line,1]), (p1s[line,0], p1s[line,1]), shore)
+    for line in np.flatnonzero(skipped).tolist():
+        found[line] = findIntersectingShoreSegment((p0s[line,0], p0s[line,1]), (p1s[line,0], p1s[line,1]), shore)
+
+    return found
+
 def orderEdges(edgesLeft: typing.List[int], nodeLoc: typing.Tuple[float,float], vor: Voronoi, shore: ShoreModel) -> typing.List[int]:
     """Orders edges of a cell in clockwise order, and so that the first edge is on land.
     
@@ -433,7 +670,7 @@ def orderEdges(edgesLeft: typing.List[int], nodeLoc: typing.Tuple[float,float],
     # shift the edges so that the list starts with an edge whose
     # counterclockwise-most vertex is on land
     for idx, ridgeID in enumerate(orderedEdges):
-        if shore.isOnLand(getVertex0(ridgeID, vor)):
+        if isVertexOnLand(getVertexID0(ridgeID, vor), vor, shore):
             orderedEdges = orderedEdges[idx:] + orderedEdges[:idx]
             break
     return orderedEdges
@@ -3,8 +3,9 @@ import math
 from scipy.spatial import cKDTree
 import numpy as np
 from tqdm import trange
+from typing import Dict
 
-from .poisson import PoissonGenerator
+from .poisson import PoissonGenerator, bridson_sample
 
 from TerrainHydrology.DataModel.ShoreModel import ShoreModel
 from TerrainHydrology.DataModel.HydrologyNetwork import HydrologyNetwork
@@ -12,21 +13,59 @@ from TerrainHydrology.DataModel.TerrainHoneycomb import TerrainHoneycomb
 from TerrainHydrology.DataModel.Terrain import Terrain, T
 from TerrainHydrology.Utilities.Math import point_segment_distance_is_endpoint, distance
 
-def initializeTerrain(hydrology: HydrologyNetwork, cells: TerrainHoneycomb, num_points: int) -> Terrain:
+def initializeTerrain(hydrology: HydrologyNetwork, cells: TerrainHoneycomb, num_points: int, seed: int=None, patternCache: str=None, distribution: str='tiled') -> Terrain:
     """Generates the terrain primitives for the terrain and initializes the Terrain object
 
+    Two distributions are available:
+
+    * ``'tiled'`` stretches one best-candidate Poisson pattern over the
+      bounding box of each cell, and discards the points that fall outside
+      the cell.
+    * ``'bridson'`` samples the whole land once with
+      :py:func:`poisson.bridson_sample`, and assigns each point to the cell
+      of the nearest river node. The density is uniform, even across the
+      borders between cells, and the sampling takes time proportional to the
+      number of points.
+
     :param hydrology: The hydrology network for the terrain
     :type hydrology: HydrologyNetwork
     :param cells: The terrain honeycomb for the terrain
     :type cells: TerrainHoneycomb
-    :param num_points: The approximate number of points to put in each cell. The actual number will almost always be lower than this because points outside a cell are cropped.
+    :param num_points: The approximate number of points to put in each cell. With the tiled distribution, the actual number will almost always be lower than this because points outside a cell are cropped. With the Bridson distribution, this is the average number of points per cell.
     :type num_points: int
+    :param seed: The seed for the Poisson pattern. If this is None, a different pattern is generated every time
+    :type seed: int
+    :param patternCache: A directory in which to cache Poisson patterns. The same pattern is reused for the same number of points and seed. This only applies to the tiled distribution
+    :type patternCache: str
+    :param distribution: Either ``'tiled'`` or ``'bridson'``
+    :type distribution: str
     """
+    if distribution not in ('tiled', 'bridson'):
+        raise ValueError(f'Unknown primitive distribution: {distribution}')
+
     terrain = Terrain()
 
-    terrain.cellTsDict = { }
-    terrain.tList = [ ]
-    
+    if distribution == 'tiled':
+        cellPoints = _tiledPoints(hydrology, cells, num_points, seed, patternCache)
+    else:
+        cellPoints = _bridsonPoints(hydrology, cells, num_points, seed)
+
+    # the points are already grouped by cell
+    if len(cellPoints) > 0:
+        positions = np.concatenate([ points.reshape(-1, 2) for points in cellPoints.values() ])
+        cellColumn = np.repeat(list(cellPoints.keys()), [ len(points) for points in cellPoints.values() ])
+        terrain.setPrimitives(positions, cellColumn)
+
+    return terrain
+
+def _tiledPoints(hydrology: HydrologyNetwork, cells: TerrainHoneycomb, num_points: int, seed: int, patternCache: str) -> Dict[int, np.ndarray]:
+    """Places points in each cell by tiling a best-candidate Poisson pattern
+
+    See :py:func:`initializeTerrain`.
+
+    :return: The points in each cell, by cell ID
+    :rtype: dict[int, numpy.ndarray]
+    """
     disk = False                # this parameter defines if we look for Poisson-like distribution on a disk/sphere (center at 0, radius 1) or in a square/box (0-1 on x and y)
     repeatPattern = True        # this parameter defines if we look for "repeating" pattern so if we should maximize distances also with pattern repetitions
     num_iterations = 4          # number of iterations in which we take average minimum squared distances between points and try to maximize them
@@ -36,26 +75,59 @@ def initializeTerrain(hydrology: HydrologyNetwork, cells: TerrainHoneycomb, num_
     num_dim = 2                 # 1, 2, 3 dimensional version
     num_rotations = 1           # number of rotations of pattern to check against
     
-    poisson_generator = PoissonGenerator( repeatPattern, first_point_zero)
-    points = poisson_generator.find_point_set(num_points, num_iterations, iterations_per_point, num_rotations)
+    poisson_generator = PoissonGenerator( repeatPattern, first_point_zero, seed)
+    points = poisson_generator.find_point_set(num_points, num_iterations, iterations_per_point, num_rotations, cache_dir=patternCache)
+    cellPoints = { }
     for n in trange(len(hydrology)):
         xllim, xulim, yllim, yulim = cells.boundingBox(n)
         if xllim is None:
             # Ignore cells that are too small
             continue
         
-        # I think this applies a mask to the poisson points, and adds those points as Tees for the cell
-        points_projected = [ [p[0]*(xulim-xllim)+xllim,p[1]*(yulim-yllim)+yllim] for p in points ]
-        points_filtered = [ (p[0],p[1]) for p in points_projected if cells.isInCell(p,n) ]
-        cellTs = [T(p,n) for p in points_filtered]
-        terrain.cellTsDict[n] = cellTs
-        terrain.tList += cellTs
+        # stretch the pattern over the bounding box, and keep the points that are in the cell
+        points_projected = points * [xulim-xllim, yulim-yllim] + [xllim, yllim]
+        cellPoints[n] = points_projected[cells.areInCell(points_projected, n)]
 
-    allpoints_list = [[t.position[0],t.position[1]] for t in terrain.allTs()]
-    allpoints_nd = np.array(allpoints_list)
-    terrain.apkd = cKDTree(allpoints_nd)
+    return cellPoints
 
-    return terrain
+def _bridsonPoints(hydrology: HydrologyNetwork, cells: TerrainHoneycomb, num_points: int, seed: int) -> Dict[int, np.ndarray]:
+    """Places points over the whole land with Bridson's algorithm
+
+    See :py:func:`initializeTerrain`.
+
+    :return: The points in each cell, by cell ID
+    :rtype: dict[int, numpy.ndarray]
+    """
+    cellIDs = [ n for n in range(len(hydrology)) if cells.boundingBox(n)[0] is not None ]
+    if len(cellIDs) < 1:
+        return { }
+
+    # a maximal Poisson-disk sampling with minimum distance r has about
+    # 0.62/r^2 points per unit area, so r is chosen to give num_points
+    # points per cell on average
+    landArea = float(np.sum(cells.cellAreas(cellIDs)))
+    radius = math.sqrt(0.62 * landArea / (num_points * len(cellIDs)))
+
+    vertices = np.array([ q.position for q in cells.allQs() ])
+    lower = vertices.min(axis=0)
+    upper = vertices.max(axis=0)
+
+    points = bridson_sample(upper[0] - lower[0], upper[1] - lower[1], radius, seed=seed) + lower
+
+    # the cells are the Voronoi regions of the river nodes (clipped to the
+    # shore), so each point belongs to the cell of the nearest node
+    nodeLocs = np.array([ hydrology.node(n).position for n in range(len(hydrology)) ])
+    _, nearest = cKDTree(nodeLocs).query(points)
+
+    # group the points by cell, and discard the points that are beyond the shore
+    order = np.argsort(nearest, kind='stable')
+    bounds = np.searchsorted(nearest[order], [ (n, n+1) for n in cellIDs ])
+    cellPoints = { }
+    for n, (begin, end) in zip(cellIDs, bounds):
+        candidates = points[order[begin:end]]
+        cellPoints[n] = candidates[cells.areInCell(candidates, n)]
+
+    return cellPoints
 
 def computePrimitiveElevation(t: T, shore: ShoreModel, hydrology: HydrologyNetwork, cells: TerrainHoneycomb) -> float:
     """Computes the elevation of a terrain primitive
@@ -1,8 +1,9 @@
 from __future__ import division
 import numpy as np
 import math
+import os.path
+import hashlib
 import scipy.spatial.distance
-from mpl_toolkits.mplot3d import Axes3D
 
 def random_point_line(num_points = 1):
     x = np.random.random(num_points)
@@ -19,17 +20,32 @@ def min_dist_squared(points, point):
     diff = points - np.array([point])
     return np.min(np.einsum('ij,ij->i',diff,diff))
 
+# the minimum squared distance from each candidate to any of the points
+def min_dists_squared(points, candidates):
+    diff = candidates[:,np.newaxis,:] - points[np.newaxis,:,:]
+    return np.min(np.einsum('ijk,ijk->ij',diff,diff), axis = 1)
+
 class PoissonGenerator:
-    def __init__(self, repeatPattern, first_point_zero):
+    def __init__(self, repeatPattern, first_point_zero, seed = None):
         self.first_point_zero = first_point_zero
         self.repeatPattern = repeatPattern
         self.num_perms = (3 ** 2) if self.repeatPattern else 1
+        self.seed = seed
 
 
         self.zero_point = [0,0]
         
         
-        self.random_point = random_point_square
+        # the generator has its own random state, so that a seed
+        # always produces the same pattern
+        self.rng = np.random.default_rng(seed)
+        self.random_point = lambda num_points = 1: self.rng.random((num_points, 2))
+
+        # the offsets of the point's copies in the neighboring tiles (the
+        # point itself comes first)
+        self.perm_offsets = np.array([[0,0]] + [
+            [x,y] for y in range(-1,2) for x in range(-1,2) if y != 0 or x != 0
+        ]) if self.repeatPattern else np.zeros((1,2))
 
 
     def first_point(self):
@@ -38,44 +54,47 @@ class PoissonGenerator:
         return self.random_point(1)[0]
 
     def find_next_point(self, current_points, iterations_per_point):
-        best_dist = 0
-        best_point = []
+        # all of the candidates are evaluated at once
         random_points = self.random_point(iterations_per_point)
-        for new_point in random_points:
-            dist = min_dist_squared(current_points, new_point)
-            if dist > best_dist:
-                best_dist = dist
-                best_point = new_point
-        return best_point
+        dists = min_dists_squared(current_points, random_points)
+        return random_points[np.argmax(dists)]
 
     def permute_point(self, point):
-        out_array = np.array(point,ndmin = 2)
-        if not self.repeatPattern:
-            return out_array
-
-        else :            
-            for y in range(-1,2):
-                for x in range(-1,2):
-                    if y != 0 or x != 0:
-                        perm_point = point+[x,y]
-                        out_array = np.append(out_array, np.array(perm_point,ndmin = 2), axis = 0 )
-
+        return np.asarray(point) + self.perm_offsets
+
+    def cache_path(self, cache_dir, num_points, num_iter, iterations_per_point, rotations):
+        key = repr((
+            num_points, self.seed, num_iter, iterations_per_point, rotations,
+            self.repeatPattern, self.first_point_zero
+        ))
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(cache_dir, f'poisson-{digest}.npy')
+
+    def find_point_set(self, num_points, num_iter, iterations_per_point, rotations, progress_notification = None, cache_dir = None):
+        # if a cache directory is given, a pattern with the same parameters
+        # (and seed) is only generated once
+        if cache_dir is not None:
+            path = self.cache_path(cache_dir, num_points, num_iter, iterations_per_point, rotations)
+            if os.path.exists(path):
+                return np.load(path)
 
-        return out_array
-
-    def find_point_set(self, num_points, num_iter, iterations_per_point, rotations, progress_notification = None):
         best_point_set = []
         best_dist_avg = 0
         self.rotations = 1
 
+        # the points (and their copies) are written into this buffer,
+        # rather than being appended to an array that grows
+        points_buffer = np.empty((num_points * self.num_perms, 2))
+
         for i in range(num_iter):
             if progress_notification != None:
                 progress_notification(i / num_iter)
-            points = self.permute_point(self.first_point())
+            points_buffer[:self.num_perms] = self.permute_point(self.first_point())
 
-            for i in range(num_points-1):
-                next_point = self.find_next_point(points, iterations_per_point)
-                points = np.append(points, self.permute_point(next_point), axis = 0)
+            for i in range(1, num_points):
+                next_point = self.find_next_point(points_buffer[:i * self.num_perms], iterations_per_point)
+                points_buffer[i * self.num_perms:(i+1) * self.num_perms] = self.permute_point(next_point)
+            points = points_buffer.copy()
 
             current_set_dist = 0
 
@@ -93,7 +112,76 @@ class PoissonGenerator:
             if current_set_dist > best_dist_avg:
                 best_dist_avg = current_set_dist
                 best_point_set = points
-        return best_point_set[::self.num_perms,:]
-
-
-    
\ No newline at end of file
+        best_point_set = best_point_set[::self.num_perms,:]
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok = True)
+            np.save(path, best_point_set)
+
+        return best_point_set
+
+
+# Bridson's algorithm ("Fast Poisson Disk Sampling in Arbitrary
+# Dimensions", 2007). Unlike the best-candidate pattern above, this takes
+# time proportional to the number of points: a background grid with cells
+# of size radius/sqrt(2) holds at most one point per cell, so each candidate
+# only has to be checked against the points in the 5x5 cells around it.
+def bridson_sample(width, height, radius, k = 30, seed = None):
+    rng = np.random.default_rng(seed)
+
+    cell_size = radius / math.sqrt(2)
+    grid_width = int(math.ceil(width / cell_size))
+    grid_height = int(math.ceil(height / cell_size))
+
+    # the grid is padded by 2 cells on each side, so that the neighborhood
+    # of any cell can be sliced without checking the bounds
+    grid = -np.ones((grid_height + 4, grid_width + 4), dtype = np.int64)
+    neighborhood = np.arange(-2, 3)
+
+    # each grid cell holds at most one point
+    points = np.zeros((grid_width * grid_height, 2))
+    num_points = 0
+
+    def insert(point):
+        nonlocal num_points
+        points[num_points] = point
+        grid[int(point[1] / cell_size) + 2, int(point[0] / cell_size) + 2] = num_points
+        num_points += 1
+
+    insert(rng.random(2) * [width, height])
+    active = [0]
+
+    while len(active) > 0:
+        i = rng.integers(len(active))
+        center = points[active[i]]
+
+        # all k candidates are generated (uniformly by area) in the annulus
+        # between radius and 2*radius, and checked at once
+        angles = rng.random(k) * 2 * math.pi
+        dists = radius * np.sqrt(1 + 3 * rng.random(k))
+        candidates = center + np.stack((np.cos(angles), np.sin(angles)), axis = 1) * dists[:,np.newaxis]
+        candidates = candidates[
+            (candidates[:,0] >= 0) & (candidates[:,0] < width) &
+            (candidates[:,1] >= 0) & (candidates[:,1] < height)
+        ]
+
+        cols = (candidates[:,0] / cell_size).astype(np.int64) + 2
+        rows = (candidates[:,1] / cell_size).astype(np.int64) + 2
+        neighbors = grid[
+            rows[:,np.newaxis,np.newaxis] + neighborhood[np.newaxis,:,np.newaxis],
+            cols[:,np.newaxis,np.newaxis] + neighborhood[np.newaxis,np.newaxis,:]
+        ].reshape(len(candidates), -1)
+
+        diff = points[neighbors] - candidates[:,np.newaxis,:]
+        too_close = (np.einsum('ijk,ijk->ij', diff, diff) < radius * radius) & (neighbors >= 0)
+        accepted = np.flatnonzero(~np.any(too_close, axis = 1))
+
+        if len(accepted) > 0:
+            insert(candidates[accepted[0]])
+            active.append(num_points - 1)
+        else:
+            # no room is left around this point
+            active[i] = active[-1]
+            active.pop()
+
+    return points[:num_points].copy()
@@ -1,37 +1,29 @@
 #!/usr/bin/env python
 
 import datetime
-from os import read
 import random
 import traceback
-import matplotlib.pyplot as plt
-import cv2 as cv
-import numpy as np
-from scipy.spatial import voronoi_plot_2d
-import networkx as nx
-from scipy import interpolate
-import shapely.geometry as geom
-import numpy as np
 from multiprocessing import Process, Pipe, Queue
-from tqdm import trange
-import math
-import rasterio
-from rasterio.transform import Affine
+from tqdm import trange, tqdm
 import subprocess
 import os.path
-import struct
-import traceback
+import sys
+import typing
+import itertools
+import json
+import multiprocessing.connection
 
 # from lib import RasterData, ShoreModel, HydrologyNetwork, HydrologyFunctions, SaveFile, TerrainPrimitiveFunctions, RiverInterpolationFunctions, Terrain, TerrainHoneycombFunctions
 from TerrainHydrology.DataModel import ShoreModel, HydrologyNetwork, TerrainPrimitiveFunctions, RiverInterpolationFunctions, Terrain, TerrainHoneycomb, TerrainHoneycombFunctions
-from TerrainHydrology.ModelIO import RasterData, SaveFile
+from TerrainHydrology.ModelIO import RasterData, SaveFile, NativeProtocol, NativeLibrary, ColumnarCache, StageCache
 from TerrainHydrology.GeneratorClassic import HydrologyFunctions
+from TerrainHydrology.Utilities import Instrumentation, Profiling
 # from tst import testcodegenerator
 
-def generateClassic(inputDomain: str, inputTerrain: str, inputRiverSlope: str, resolution: float, numRivers: int, numProcs: int, numPoints: int, outputFile: str, lat: float, lon: float, accelerate: bool) -> None:
-    buildRiversExe = 'native-module/bin/buildRivers'
-    computePrimitivesExe = 'native-module/bin/terrainPrimitives'
+buildRiversExe = 'native-module/bin/buildRivers'
+computePrimitivesExe = 'native-module/bin/terrainPrimitives'
 
+def generateClassic(inputDomain: str, inputTerrain: str, inputRiverSlope: str, resolution: float, numRivers: int, numProcs: int, numPoints: int, outputFile: str, lat: float, lon: float, accelerate: bool, patternCache: str=None, primitiveDistribution: str='tiled', columnarCache: bool=False, resume: bool=False, terrainSlopeRate: float=1.0, stageCache: str=None, liveMetrics: bool=False, profile: str=None, rasterCache: str=None, interpolateRasters: bool=False) -> None:
     ## Global Variables
 
     # Inputs
@@ -66,7 +58,7 @@ def generateClassic(inputDomain: str, inputTerrain: str, inputRiverSlope: str, r
     sigma = .75 # sigma * edgeLength is the minimum distance between two nodes
 
     ## Terrain Parameters
-    terrainSlopeRate = 1.0 # Maximum rate at which ridges climb in vertical meters per horizontal meter
+    terrainSlopeRate = float(terrainSlopeRate) # Maximum rate at which ridges climb in vertical meters per horizontal meter
     num_points = int(numPoints) # The (rough) number of terrain primitives for each cell
     numProcs = int(numProcs) # The number of processes to use in calculating terrain primitives
 
@@ -75,258 +67,430 @@ def generateClassic(inputDomain: str, inputTerrain: str, inputRiverSlope: str, r
 
 
     # Check for the native module if the --accelerate flag is specified
+    # The shared library is preferred, since it runs in-process
+    nativeLibrary = None
     if accelerate:
-        if not os.path.exists(buildRiversExe) or not os.path.exists(computePrimitivesExe):
+        if NativeLibrary.isAvailable():
+            nativeLibrary = NativeLibrary.loadLibrary()
+        elif not os.path.exists(buildRiversExe) or not os.path.exists(computePrimitivesExe):
             print('One or both of the executables does not exist. Run "make" in the src/ directory to build them.')
             exit()
 
-    # Load input images
-
-    if inputDomain[-4:] == '.shp':
-        shore = ShoreModel.ShoreModel(inputDomain)
-    else:
-        # if the input is not a shapefile, complain and exit
-        print('Input domain must be a shapefile. Use img-to-shp.py to convert an image to a shapefile.')
-        exit()
-
-    terrainSlope = RasterData.RasterData(inputTerrain, resolution)
-    riverSlope = RasterData.RasterData(inputRiverSlope, resolution)
-
-    # Initialize the save file
-    db = SaveFile.createDB(outputFile, resolution, edgeLength, lon, lat)
-
-    # Save the shore dimensions
-    SaveFile.setShoreBoundaries(db, shore)
-
-    ## Generate river mouths
-
+    # Each stage is measured, and the measurements are written next to the
+    # output file
+    report = Instrumentation.StageReport(
+        'generate',
+        {
+            'resolution': resolution, 'numRivers': N_majorRivers, 'numPoints': num_points, 'numProcs': numProcs,
+            'terrainSlopeRate': terrainSlopeRate, 'primitiveDistribution': primitiveDistribution,
+            'accelerate': bool(accelerate), 'nativeLibrary': nativeLibrary is not None, 'seed': globalseed
+        },
+        sys.stderr if liveMetrics else None,
+        profile
+    )
+
+    # The report is written even if a stage fails, so that the failure
+    # can be diagnosed
     try:
+        # Load input images
+        report.startStage('inputs')
 
-        hydrology = HydrologyNetwork.HydrologyNetwork()
-
-        # generate first node
-        firstIdx = random.randint(0,len(shore)-1)
-        point = shore[firstIdx]
-        hydrology.addNode(point, 0, random.randint(1,N_majorRivers), contourIndex=firstIdx)
-
-        dist = len(shore)/N_majorRivers
-        for i in range(1,N_majorRivers):
-            idx = int((firstIdx+i*dist+random.gauss(0, dist/6))%len(shore))
-            point = shore[idx]
-            hydrology.addNode(point, 0, 1, contourIndex=idx)
-
-
-        ## Generate river nodes
-
-        print('Generating rivers...')
+        if inputDomain[-4:] == '.shp':
+            shore = ShoreModel.ShoreModel(inputDomain)
+        else:
+            # if the input is not a shapefile, complain and exit
+            print('Input domain must be a shapefile. Use img-to-shp.py to convert an image to a shapefile.')
+            exit()
 
-        candidates = hydrology.allMouthNodes() # All mouth nodes are candidates
-        params = HydrologyFunctions.HydrologyParameters(
-            # These parameters will be needed to generate the hydrology network
-            shore, hydrology, Pa, Pc, maxTries, riverAngleDev, edgeLength,
-            sigma, eta, zeta, riverSlope, slopeRate, candidates
+        # Decoded rasters can be cached, so that later runs memory-map them
+        # instead of decoding the images again
+        if rasterCache is not None:
+            os.makedirs(rasterCache, exist_ok=True)
+        terrainSlope = RasterData.RasterData(inputTerrain, resolution, RasterData.cachePath(rasterCache, inputTerrain) if rasterCache is not None else None, interpolateRasters)
+        riverSlope = RasterData.RasterData(inputRiverSlope, resolution, RasterData.cachePath(rasterCache, inputRiverSlope) if rasterCache is not None else None, interpolateRasters)
+
+        # Fingerprint the inputs of each stage, so that stages whose inputs have
+        # not changed can be taken from the stage cache
+        shapefileParts = [ inputDomain[:-4] + extension for extension in ('.shp', '.shx', '.dbf') if os.path.exists(inputDomain[:-4] + extension) ]
+        fingerprints = { }
+        fingerprints['rivers'] = StageCache.fingerprint(
+            None,
+            {
+                'resolution': resolution, 'numRivers': N_majorRivers, 'seed': globalseed,
+                'Ps': Ps, 'Pa': Pa, 'Pc': Pc, 'zeta': zeta, 'riverAngleDev': riverAngleDev, 'maxTries': maxTries,
+                'slopeRate': slopeRate, 'edgeLength': edgeLength, 'eta': eta, 'sigma': sigma,
+                'lat': float(lat), 'lon': float(lon), 'accelerate': bool(accelerate), 'interpolateRasters': bool(interpolateRasters)
+            },
+            shapefileParts + [ inputRiverSlope ]
         )
-
-        start, end = None, None
-
-        if not accelerate: # Generate the hydrology in Python
-            cyclesRun = 0
-            start = datetime.datetime.now()
-            while len(candidates)!=0:
-                selectedCandidate = HydrologyFunctions.selectNode(candidates,zeta)
-                HydrologyFunctions.alpha(selectedCandidate, candidates, params)
-                print(f'\tCycles: {len(hydrology)}\t{cyclesRun/(datetime.datetime.now()-start).total_seconds()} cycles/sec\r', end='')
-                cyclesRun = cyclesRun + 1
-            end = datetime.datetime.now()
-            print()
-        else: # Generate the hydrology using the native module
-            SaveFile.dumpMouthNodes(db, hydrology)
-            SaveFile.createRiverSlopeRaster(db, riverSlope)
-            shore.saveToDB(db)
-            proc = subprocess.Popen( # start the native module
-                [buildRiversExe, outputFile, str(Pa), str(Pc), str(sigma), str(eta), str(zeta), str(slopeRate), str(maxTries), str(riverAngleDev)],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE
-            )
-            print('\tData sent to native module...')
-
-            # print(f'Process called: ./{buildRiversExe} {outputFile} {Pa} {Pc} {sigma} {eta} {zeta} {slopeRate} {maxTries} {riverAngleDev}')
-            # exit()
-
-            # Display updates as native module builds the network
-            cyclesRun = 0
-            start = datetime.datetime.now()
-            readByte = proc.stdout.read(1)
-            cyclesRun = cyclesRun + 1
-            while struct.unpack('B', readByte)[0] == 0x2e:
-                print(f'\tCycles: {cyclesRun}\t{cyclesRun/(datetime.datetime.now()-start).total_seconds()} cycles/sec\r', end='')
-                readByte = proc.stdout.read(1)
-                cyclesRun = cyclesRun + 1
-            end = datetime.datetime.now()
-            print()
-
-            # Recreate hydrology with data from the native module
-            print('\tReading data...')
+        # the terrain slope image is only used for the ridge elevations, so a
+        # sweep over terrain images can still reuse the rivers
+        fingerprints['honeycomb'] = StageCache.fingerprint(fingerprints['rivers'], { 'terrainSlopeRate': terrainSlopeRate }, [ inputTerrain ])
+        fingerprints['primitives'] = StageCache.fingerprint(fingerprints['honeycomb'], { 'numPoints': num_points, 'seed': globalseed, 'primitiveDistribution': primitiveDistribution })
+        fingerprints['elevations'] = StageCache.fingerprint(fingerprints['primitives'], { })
+
+        # Unless there is a run to resume, start from the latest stage that is
+        # in the cache
+        cache = StageCache.StageCache(stageCache) if stageCache is not None else None
+        if cache is not None and not (resume and os.path.exists(outputFile)):
+            for stage in [ 'elevations', 'primitives', 'honeycomb', 'rivers' ]:
+                if cache.restore(fingerprints[stage], outputFile):
+                    print(f'Reusing the {stage} stage from the stage cache')
+                    resume = True
+                    break
+
+        # Initialize the save file, or reopen it to resume
+        db = None
+        completedStages = [ ]
+        if resume and os.path.exists(outputFile):
+            db = SaveFile.openDB(outputFile)
+            completedStages = SaveFile.completedStages(db)
+            if len(completedStages) > 0:
+                print(f'Resuming. Completed stages: {", ".join(completedStages)}')
+            else:
+                # nothing can be reused, and the stage that failed may have
+                # left tables half-written, so start over
+                print('No stages were completed. Starting over')
+                db.close()
+                db = None
+                os.remove(outputFile)
+        if db is None:
+            db = SaveFile.createDB(outputFile, resolution, edgeLength, lon, lat)
+
+            # Save the shore dimensions
+            SaveFile.setShoreBoundaries(db, shore)
+        # The file must survive a crash, so that the run can be resumed
+        SaveFile.configureForCheckpoints(db)
+        saveState = SaveFile.SaveState(db)
+
+        def completeStage(stage: str) -> None:
+            SaveFile.markStageComplete(db, stage)
+            if cache is not None:
+                cache.store(fingerprints[stage], db)
+
+        report.endStage(len(shore), 'shore points')
+
+        report.startStage('rivers')
+        if 'rivers' in completedStages:
+            print('Loading the hydrology network...')
             hydrology = HydrologyNetwork.HydrologyNetwork(db)
+            saveState.markClean(shore, hydrology)
+        else:
+            ## Generate river mouths
+
+            try:
+
+                hydrology = HydrologyNetwork.HydrologyNetwork()
+
+                # generate first node
+                firstIdx = random.randint(0,len(shore)-1)
+                point = shore[firstIdx]
+                hydrology.addNode(point, 0, random.randint(1,N_majorRivers), contourIndex=firstIdx)
+
+                dist = len(shore)/N_majorRivers
+                for i in range(1,N_majorRivers):
+                    idx = int((firstIdx+i*dist+random.gauss(0, dist/6))%len(shore))
+                    point = shore[idx]
+                    hydrology.addNode(point, 0, 1, contourIndex=idx)
+
+
+                ## Generate river nodes
+
+                print('Generating rivers...')
+
+                candidates = hydrology.allMouthNodes() # All mouth nodes are candidates
+                params = HydrologyFunctions.HydrologyParameters(
+                    # These parameters will be needed to generate the hydrology network
+                    shore, hydrology, Pa, Pc, maxTries, riverAngleDev, edgeLength,
+                    sigma, eta, zeta, riverSlope, slopeRate, candidates
+                )
+
+                start, end = None, None
+
+                if not accelerate: # Generate the hydrology in Python
+                    cyclesRun = 0
+                    start = datetime.datetime.now()
+                    while len(candidates)!=0:
+                        selectedCandidate = HydrologyFunctions.selectNode(candidates,zeta)
+                        HydrologyFunctions.alpha(selectedCandidate, candidates, params)
+                        print(f'\tCycles: {len(hydrology)}\t{cyclesRun/(datetime.datetime.now()-start).total_seconds()} cycles/sec\r', end='')
+                        cyclesRun = cyclesRun + 1
+                    end = datetime.datetime.now()
+                    print()
+                elif nativeLibrary is not None: # Generate the hydrology in-process using the native library
+                    start = datetime.datetime.now()
+                    hydrology = NativeLibrary.buildRivers(
+                        nativeLibrary, shore, hydrology, riverSlope, edgeLength,
+                        Pa, Pc, sigma, eta, zeta, slopeRate, maxTries, riverAngleDev,
+                        onProgress=lambda cyclesRun: print(f'\tCycles: {cyclesRun}\t{cyclesRun/(datetime.datetime.now()-start).total_seconds()} cycles/sec\r', end='')
+                    )
+                    end = datetime.datetime.now()
+                    print()
+                else: # Generate the hydrology using the native module
+                    SaveFile.dumpMouthNodes(db, hydrology)
+                    SaveFile.createRiverSlopeRaster(db, riverSlope)
+                    saveState.save(shore)
+                    proc = subprocess.Popen( # start the native module
+                        [buildRiversExe, outputFile, str(Pa), str(Pc), str(sigma), str(eta), str(zeta), str(slopeRate), str(maxTries), str(riverAngleDev)],
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE
+                    )
+                    print('\tData sent to native module...')
+
+                    # print(f'Process called: ./{buildRiversExe} {outputFile} {Pa} {Pc} {sigma} {eta} {zeta} {slopeRate} {maxTries} {riverAngleDev}')
+                    # exit()
+
+                    # Display updates as native module builds the network
+                    start = datetime.datetime.now()
+                    NativeProtocol.readProgress(
+                        proc.stdout,
+                        lambda cyclesRun: print(f'\tCycles: {cyclesRun}\t{cyclesRun/(datetime.datetime.now()-start).total_seconds()} cycles/sec\r', end='')
+                    )
+                    end = datetime.datetime.now()
+                    print()
+
+                    # Recreate hydrology with data from the native module
+                    print('\tReading data...')
+                    hydrology = NativeProtocol.readHydrology(proc.stdout)
+                    proc.wait()
+
+                print(f'\tGenerated {len(hydrology)} nodes in {(end-start).total_seconds()} seconds')
+                print(f'\tRate: {len(hydrology)/(end-start).total_seconds()} node/sec')
+
+            except Exception as e:
+                print('Problem encountered in generating the hydrology. Saving shore model to export file.')
+                print(e)
+
+                print('Saving...')
+                saveState.save(shore)
+                saveState.save(hydrology)
+
+                SaveFile.dropRiverSlopeRaster(db)
+
+                db.close()
+
+                exit()
+
+            saveState.save(shore, hydrology)
+            completeStage('rivers')
+
+        report.endStage(len(hydrology), 'nodes', reused='rivers' in completedStages)
+
+        report.startStage('honeycomb')
+        if 'honeycomb' in completedStages:
+            print('Loading the terrain honeycomb...')
+            cells = TerrainHoneycomb.TerrainHoneycomb()
+            cells.loadFromDB(db)
+            saveState.markClean(cells)
+            report.endStage(len(hydrology), 'cells', reused=True)
+            report.startStage('watersheds')
+        else:
+            try:
 
-        print(f'\tGenerated {len(hydrology)} nodes in {(end-start).total_seconds()} seconds')
-        print(f'\tRate: {len(hydrology)/(end-start).total_seconds()} node/sec')
-
-    except Exception as e:
-        print('Problem encountered in generating the hydrology. Saving shore model to export file.')
-        print(e)
-
-        print('Saving...')
-        shore.saveToDB(db)
-        hydrology.saveToDB(db)
-
-        SaveFile.dropRiverSlopeRaster(db)
-
-        db.close()
-
-        exit()
-
-    try:
-
-        ## Create terrain partition (voronoi cells)
-        print('Generating terrain ridges...')
-        cells = TerrainHoneycombFunctions.initializeTerrainHoneycomb(shore, hydrology)
-
-        ## Calculate watershed areas
-        print('Calculating watershed areas...')
-
-        # calculate inherited watershed areas and flow
-        for node in hydrology.dfsPostorderNodes():  # search nodes in a depth-first post-ordering manner
-            node.localWatershed = HydrologyFunctions.getLocalWatershed(node, cells)
-            node.inheritedWatershed = HydrologyFunctions.getInheritedWatershed(node, hydrology)
-            node.flow = HydrologyFunctions.getFlow(node.inheritedWatershed)
-
-
-        ## Classify river nodes
-        print('Classifying river nodes...')
-        for n in range(len(hydrology)):
-            HydrologyFunctions.classify(hydrology.node(n), hydrology, edgeLength)
-
-
-        ## Calculate ridge elevations
-        print('Calculating ridge elevations...')
-
-        for q in cells.allQs():
-            if q is None:
-                continue
-            q.elevation = TerrainHoneycombFunctions.getRidgeElevation(q, hydrology, terrainSlope, terrainSlopeRate)
-
-    except Exception as e:
-        print('Problem encountered in partitioning the terrain cells. Saving the shore model and hydrology network to file.')
-        print(e)
+                ## Create terrain partition (voronoi cells)
+                print('Generating terrain ridges...')
+                cells = TerrainHoneycombFunctions.initializeTerrainHoneycomb(shore, hydrology)
+                report.endStage(len(hydrology), 'cells', reused=False)
+                report.startStage('watersheds')
 
-        print('Saving...')
-        shore.saveToDB(db)
-        hydrology.saveToDB(db)
-        cells.saveToDB(db)
+                ## Calculate watershed areas
+                print('Calculating watershed areas...')
 
-        SaveFile.dropRiverSlopeRaster(db)
+                # calculate inherited watershed areas and flow
+                HydrologyFunctions.computeWatersheds(hydrology, cells)
 
-        db.close()
 
-        exit()
+                ## Classify river nodes
+                print('Classifying river nodes...')
+                for n in range(len(hydrology)):
+                    HydrologyFunctions.classify(hydrology.node(n), hydrology, edgeLength)
 
-    try:
 
-        ## Terrain pattern
-        print('Generating terrain primitives...')
-        Ts = TerrainPrimitiveFunctions.initializeTerrain(hydrology, cells, num_points)
+                ## Calculate ridge elevations
+                print('Calculating ridge elevations...')
 
+                TerrainHoneycombFunctions.setRidgeElevations(cells, hydrology, terrainSlope, terrainSlopeRate)
+                saveState.markDirty(hydrology)
 
-        ## Generate river paths
-        print('Interpolating river paths...')
-        for node in hydrology.allMouthNodes():
-            RiverInterpolationFunctions.computeRivers(node, hydrology, cells)
+            except Exception as e:
+                print('Problem encountered in partitioning the terrain cells. Saving the shore model and hydrology network to file.')
+                print(e)
 
-    except Exception as ex:
-        print('Problem encountered in generating the terrain primitives. Saving shore model, hydrology network, and terrain cells to export file.')
-        print(ex.with_traceback())
+                print('Saving...')
+                saveState.save(shore)
+                saveState.save(hydrology)
+                saveState.save(cells)
 
-        print('Saving...')
-        shore.saveToDB(db)
-        hydrology.saveToDB(db)
-        cells.saveToDB(db)
+                SaveFile.dropRiverSlopeRaster(db)
 
-        SaveFile.dropRiverSlopeRaster(db)
+                db.close()
 
-        db.close()
+                exit()
 
-        exit()
+            saveState.save(hydrology, cells)
+            completeStage('honeycomb')
 
-    ## Calculate elevations of terrain primitives
-    print('Calculating terrain primitive elevations...')
+        report.endStage(len(hydrology), 'nodes', reused='honeycomb' in completedStages)
 
-    try:
-
-        # The terrain primitives will be calculated in parallel
-        if not accelerate: # Calculate the elevations in Python
-            dataQueue = Queue()
-            pipes = []
-            processes = []
-            for p in range(numProcs):
-                pipes.append(Pipe())
-                processes.append(Process(target=subroutine, args=(pipes[p][1],dataQueue, numProcs, Ts, shore, hydrology, cells)))
-                processes[p].start()
-                pipes[p][0].send(p)
-            for ti in trange(len(Ts)):
-                t = dataQueue.get()
-                if t is not None:
-                    Ts.tList[ti] = t
-                else:
-                    raise Exception
-            for p in range(numProcs):
-                processes[p].join()
-                pipes[p][0].close()
-        else:
-            # Save necessary information to the database
-            hydrology.saveToDB(db)
-            cells.saveToDB(db)
-            Ts.saveToDB(db)
-
-            # Run the native module
-            primitivesProc = subprocess.Popen( # start the native module
-                [computePrimitivesExe, outputFile],
-                stdout=subprocess.PIPE
-            )
-
-            # Display updates as native module calculates the elevations
-            for tid in trange(len(Ts)):
-                readByte = primitivesProc.stdout.read(1)
-            readByte = primitivesProc.stdout.read(1)
-            assert struct.unpack('B',readByte)[0] == 0x21
-
-            # Recreate the terrain primitives with data from the native module
+        report.startStage('primitives')
+        if 'primitives' in completedStages:
+            print('Loading the terrain primitives...')
             Ts = Terrain.Terrain()
             Ts.loadFromDB(db)
-
-    except Exception as e:
-        print('Problem encountered in generating the terrain primitives. Saving shore model, hydrology network, and terrain cells to export file.')
-        print(e)
-
-        print('Saving...')
-        shore.saveToDB(db)
-        hydrology.saveToDB(db)
-        cells.saveToDB(db)
-
+            saveState.markClean(Ts)
+            report.endStage(len(Ts), 'primitives', reused=True)
+            report.startStage('riverPaths')
+        else:
+            # if a previous run failed partway through this stage, some rivers
+            # may already have been saved
+            for node in hydrology.allNodes():
+                node.rivers = [ ]
+
+            try:
+
+                ## Terrain pattern
+                print('Generating terrain primitives...')
+                Ts = TerrainPrimitiveFunctions.initializeTerrain(hydrology, cells, num_points, globalseed, patternCache, primitiveDistribution)
+                report.endStage(len(Ts), 'primitives', reused=False)
+                report.startStage('riverPaths')
+
+                ## Generate river paths
+                print('Interpolating river paths...')
+                for node in hydrology.allMouthNodes():
+                    RiverInterpolationFunctions.computeRivers(node, hydrology, cells)
+                saveState.markDirty(hydrology)
+
+            except Exception as ex:
+                print('Problem encountered in generating the terrain primitives. Saving shore model, hydrology network, and terrain cells to export file.')
+                print(ex.with_traceback())
+
+                print('Saving...')
+                saveState.save(shore)
+                saveState.save(hydrology)
+                saveState.save(cells)
+
+                SaveFile.dropRiverSlopeRaster(db)
+
+                db.close()
+
+                exit()
+
+            saveState.save(hydrology, Ts)
+            completeStage('primitives')
+
+        report.endStage(len(hydrology), 'nodes', reused='primitives' in completedStages)
+
+        report.startStage('elevations')
+        if 'elevations' not in completedStages:
+            ## Calculate elevations of terrain primitives
+            print('Calculating terrain primitive elevations...')
+
+            try:
+
+                # The terrain primitives will be calculated in parallel
+                if not accelerate: # Calculate the elevations in Python
+                    dataQueue = Queue()
+                    pipes = []
+                    processes = []
+                    for p in range(numProcs):
+                        pipes.append(Pipe())
+                        processes.append(Process(target=Profiling.profiledTarget(subroutine, profile, f'elevations-worker-{p}'), args=(pipes[p][1],dataQueue, numProcs, Ts, shore, hydrology, cells)))
+                        processes[p].start()
+                        pipes[p][0].send(p)
+                    for _ in trange(len(Ts)):
+                        result = dataQueue.get()
+                        if result is not None:
+                            ti, elevation = result
+                            Ts.elevations[ti] = elevation
+                        else:
+                            raise Exception
+                    for p in range(numProcs):
+                        processes[p].join()
+                        pipes[p][0].close()
+                elif nativeLibrary is not None:
+                    # Save necessary information to the database
+                    saveState.save(hydrology)
+                    saveState.save(cells)
+                    saveState.save(shore)
+
+                    # Compute the elevations in-process using the native library
+                    with tqdm(total=len(Ts)) as progressBar:
+                        elevations = NativeLibrary.computePrimitiveElevations(
+                            nativeLibrary, outputFile, Ts,
+                            onProgress=lambda computed: progressBar.update(computed - progressBar.n)
+                        )
+                    Ts.elevations[:] = elevations
+                else:
+                    # Save necessary information to the database
+                    saveState.save(hydrology)
+                    saveState.save(cells)
+
+                    # Run the native module
+                    primitivesProc = subprocess.Popen( # start the native module
+                        [computePrimitivesExe, outputFile],
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE
+                    )
+
+                    # The primitives themselves are streamed to the native module
+                    NativeProtocol.writeTs(primitivesProc.stdin, Ts)
+                    primitivesProc.stdin.close()
+
+                    # Display updates as native module calculates the elevations
+                    with tqdm(total=len(Ts)) as progressBar:
+                        NativeProtocol.readProgress(
+                            primitivesProc.stdout,
+                            lambda computed: progressBar.update(computed - progressBar.n)
+                        )
+
+                    # Receive the elevations from the native module
+                    elevations = NativeProtocol.readTElevations(primitivesProc.stdout, len(Ts))
+                    Ts.elevations[:] = elevations
+                    primitivesProc.wait()
+
+                # only the elevations of the primitives have changed
+                saveState.markDirty(Ts, 'elevation')
+
+            except Exception as e:
+                print('Problem encountered in generating the terrain primitives. Saving shore model, hydrology network, and terrain cells to export file.')
+                print(e)
+
+                print('Saving...')
+                saveState.save(shore)
+                saveState.save(hydrology)
+                saveState.save(cells)
+
+                SaveFile.dropRiverSlopeRaster(db)
+
+                db.close()
+
+                exit()
+
+            saveState.save(Ts)
+            completeStage('elevations')
+
+        report.endStage(len(Ts), 'primitives', reused='elevations' in completedStages)
+
+        ## Save the data
+        report.startStage('save')
+        print('Writing data model...')
+        saveState.save(shore)
+        saveState.save(hydrology)
+        saveState.save(cells)
+        saveState.save(Ts)
         SaveFile.dropRiverSlopeRaster(db)
-
-        db.close()
-
-        exit()
-
-    ## Save the data
-    print('Writing data model...')
-    shore.saveToDB(db)
-    hydrology.saveToDB(db)
-    cells.saveToDB(db)
-    Ts.saveToDB(db)
-    SaveFile.dropRiverSlopeRaster(db)
-    db.close() # TODO This should be implemented as a context manager
+        SaveFile.createSpatialIndexes(db)
+        SaveFile.finishCheckpoints(db)
+        db.close() # TODO This should be implemented as a context manager
+        if columnarCache:
+            print('Writing columnar cache...')
+            ColumnarCache.writeCache(outputFile, shore, hydrology, Ts)
+        report.endStage()
+    finally:
+        report.write(outputFile + '.metrics.json')
+        if profile is not None:
+            Profiling.mergeProfiles(profile)
+            print(f'Profiles written to {profile}')
     print('Complete')
 
     # DEBUG
@@ -337,15 +501,88 @@ def generateClassic(inputDomain: str, inputTerrain: str, inputRiverSlope: str, r
 
     # print(code)
 
+#: The parameters of generateClassic() that a sweep can vary, and their types
+sweepParameters = { 'numRivers': int, 'numPoints': int, 'terrainSlopeRate': float, 'primitiveDistribution': str }
+
+def sweepVariants(grid: typing.Dict[str, typing.List[typing.Any]]) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Lists every combination of the values in a parameter grid
+
+    :param grid: The values of each parameter. The keys must be in :py:data:`sweepParameters`
+    :type grid: dict[str, list]
+    :return: One dictionary of parameters for each variant
+    :rtype: list[dict[str, Any]]
+    """
+    for name in grid:
+        if name not in sweepParameters:
+            raise ValueError(f'{name} cannot be varied. Use one of: {", ".join(sweepParameters)}')
+    names = list(grid)
+    return [ dict(zip(names, values)) for values in itertools.product(*[ grid[name] for name in names ]) ]
+
+def sweep(arguments: typing.Dict[str, typing.Any], grid: typing.Dict[str, typing.List[typing.Any]], outputDirectory: str, numParallel: int, stageCache: str=None) -> typing.List[str]:
+    """Generates a model for every combination of the values in a parameter grid
+
+    Each variant is written to its own file in ``outputDirectory``, and the
+    parameters of each file are listed in ``sweep.json``. The variants
+    share a stage cache, so stages whose inputs are the same in every
+    variant (for example, the hydrology network when only terrain
+    parameters are varied) are computed once. To make sure of this, the
+    first variant runs on its own, and the rest run in parallel after it.
+
+    :param arguments: The arguments to :py:func:`generateClassic` that are the same in every variant (except ``outputFile``, ``resume``, and ``stageCache``)
+    :type arguments: dict[str, Any]
+    :param grid: The values of each parameter to vary
+    :type grid: dict[str, list]
+    :param outputDirectory: The directory to write the variants to
+    :type outputDirectory: str
+    :param numParallel: The number of variants to generate at once
+    :type numParallel: int
+    :param stageCache: The directory of the stage cache. By default, it is ``stage-cache`` in the output directory
+    :type stageCache: str
+    :return: The paths to the save files, in the same order as :py:func:`sweepVariants`
+    :rtype: list[str]
+    """
+    variants = sweepVariants(grid)
+    os.makedirs(outputDirectory, exist_ok=True)
+    if stageCache is None:
+        stageCache = os.path.join(outputDirectory, 'stage-cache')
+
+    outputFiles = [ os.path.join(outputDirectory, '_'.join(f'{name}={value}' for name, value in variant.items()) + '.db') for variant in variants ]
+    with open(os.path.join(outputDirectory, 'sweep.json'), 'w') as manifest:
+        json.dump([ { 'file': os.path.basename(outputFile), 'parameters': variant } for outputFile, variant in zip(outputFiles, variants) ], manifest, indent=2)
+
+    def start(idx: int) -> Process:
+        print(f'Generating {outputFiles[idx]}...')
+        variantArguments = { **arguments, **variants[idx], 'outputFile': outputFiles[idx], 'resume': False, 'stageCache': stageCache }
+        if arguments.get('profile') is not None:
+            # each variant is profiled separately
+            variantArguments['profile'] = os.path.join(arguments['profile'], os.path.basename(outputFiles[idx])[:-3])
+        process = Process(target=generateClassic, kwargs=variantArguments)
+        process.start()
+        return process
+
+    # the first variant fills the stage cache for the others
+    first = start(0)
+    first.join()
+
+    pending = list(range(1, len(variants)))
+    running = [ ]
+    while len(pending) > 0 or len(running) > 0:
+        while len(pending) > 0 and len(running) < numParallel:
+            running.append(start(pending.pop(0)))
+        multiprocessing.connection.wait([ process.sentinel for process in running ])
+        for process in [ process for process in running if not process.is_alive() ]:
+            process.join()
+            running.remove(process)
+
+    return outputFiles
+
 def subroutine(conn: Pipe, q: Queue, numProcs: int, Ts: Terrain, shore: ShoreModel, hydrology: HydrologyNetwork, cells: TerrainHoneycomb):
     try:
         threadID = conn.recv()
         for ti in range(threadID, len(Ts), numProcs):
             t = Ts.getT(ti)
-            
-            t.elevation = TerrainPrimitiveFunctions.computePrimitiveElevation(t, shore, hydrology, cells)
 
-            q.put(t)
+            q.put((ti, TerrainPrimitiveFunctions.computePrimitiveElevation(t, shore, hydrology, cells)))
 
     except:
         traceback.print_exc()
@@ -1,6 +1,7 @@
 import random
 import math
 import struct
+import numpy as np
 
 from TerrainHydrology.Utilities.Math import point_segment_distance
 
@@ -189,7 +190,11 @@ def beta(node: HydroPrimitive, priority: int, candidates: typing.List[HydroPrimi
     """
     point = picknewnodepos(node, params)
     if point is not None:
-        slope = params.slopeRate * params.riverSlope[node.x() , node.y()]/255
+        # sample() is much slower for a single point, so it is only used to interpolate
+        if params.riverSlope.bilinear:
+            slope = params.slopeRate * params.riverSlope.sample([ (node.x(), node.y()) ])[0]/255
+        else:
+            slope = params.slopeRate * params.riverSlope[node.x(), node.y()]/255
         newZ = node.elevation + slope * params.edgeLength
         candidates.append(params.hydrology.addNode(point, priority=priority, elevation=newZ, parent=node))
     else:
@@ -368,4 +373,59 @@ def getFlow(inheritedWatershed: float) -> float:
     :return: The approximate flow in cubic meters per second
     :rtype: float
     """
-    return 0.42 * inheritedWatershed**0.69
\ No newline at end of file
+    return 0.42 * inheritedWatershed**0.69
+
+def computeWatersheds(hydrology: HydrologyNetwork, cells: TerrainHoneycomb) -> None:
+    """Computes the local watershed, inherited watershed, and flow of every node at once
+
+    This gives the same results as calling :func:`getLocalWatershed`,
+    :func:`getInheritedWatershed`, and :func:`getFlow` on each node in a
+    depth-first post-ordering, but it does the work with NumPy arrays.
+
+    The areas of all the cells are computed together (see
+    :py:meth:`TerrainHoneycomb.cellAreas`). Then each node's depth in its
+    tree is found, and the watershed areas are accumulated toward the mouth
+    nodes one level at a time, starting with the deepest nodes.
+
+    :param hydrology: The hydrology network for the terrain
+    :type hydrology: HydrologyNetwork
+    :param cells: The terrain honeycomb for the terrain
+    :type cells: TerrainHoneycomb
+    """
+    numNodes = len(hydrology)
+    if numNodes < 1:
+        return
+
+    nodes = hydrology.allNodes()
+    nodes.sort(key = lambda n : n.id)
+
+    parents = np.array([-1 if node.parent is None else node.parent.id for node in nodes], dtype=np.int64)
+
+    localWatersheds = cells.cellAreas([node.id for node in nodes])
+
+    # find the depth of each node by pointer jumping
+    depths = (parents >= 0).astype(np.int64)
+    ancestors = parents.copy()
+    hasAncestor = ancestors >= 0
+    while hasAncestor.any():
+        jumpFrom = ancestors[hasAncestor]
+        newDepths = depths.copy()
+        newDepths[hasAncestor] += depths[jumpFrom]
+        ancestors[hasAncestor] = ancestors[jumpFrom]
+        depths = newDepths
+        hasAncestor = ancestors >= 0
+
+    # accumulate the watersheds from the deepest level to the shallowest
+    inheritedWatersheds = localWatersheds.copy()
+    order = np.argsort(depths, kind='stable')
+    levelStarts = np.searchsorted(depths[order], np.arange(depths.max() + 2))
+    for level in range(depths.max(), 0, -1):
+        levelNodes = order[levelStarts[level]:levelStarts[level+1]]
+        np.add.at(inheritedWatersheds, parents[levelNodes], inheritedWatersheds[levelNodes])
+
+    flows = getFlow(inheritedWatersheds)
+
+    for idx, node in enumerate(nodes):
+        node.localWatershed = float(localWatersheds[idx])
+        node.inheritedWatershed = float(inheritedWatersheds[idx])
+        node.flow = float(flows[idx])
@@ -0,0 +1,238 @@
+"""A memory-mapped, columnar copy of a save file
+
+Loading a large save file is slow, because every row has to be parsed (and
+every geometry converted) one at a time. At generation time, the shore, the
+hydrology network, and the terrain primitives can also be written as plain
+NumPy arrays to a directory next to the save file (``<save file>.columns``).
+Loaders memory-map these arrays instead of querying the save file, so
+processes that render the same model share the pages rather than each
+holding a copy.
+
+The save file remains the source of truth. The cache records a hash of the
+save file's contents, and it is ignored if the save file has changed since
+the cache was written.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import os.path
+import sqlite3
+
+import numpy as np
+import shapely
+
+from TerrainHydrology.DataModel.HydrologyNetwork import HydrologyNetwork
+from TerrainHydrology.DataModel.ShoreModel import ShoreModel
+from TerrainHydrology.DataModel.Terrain import Terrain
+
+cacheVersion = 1
+
+def cachePath(dbPath: str) -> str:
+    """The directory in which the cache of a save file is kept
+
+    :param dbPath: The path to the save file
+    :type dbPath: str
+    :return: The path to the cache directory
+    :rtype: str
+    """
+    return dbPath + '.columns'
+
+def contentHash(dbPath: str) -> str:
+    """Computes a hash of the contents of a save file
+
+    The hash is remembered for as long as the file's size and modification
+    time stay the same, so loading several layers only reads the file once.
+
+    :param dbPath: The path to the save file
+    :type dbPath: str
+    :return: The SHA-1 hash of the file, as a hexadecimal string
+    :rtype: str
+    """
+    stat = os.stat(dbPath)
+    return _contentHash(os.path.realpath(dbPath), stat.st_size, stat.st_mtime_ns)
+
+@functools.lru_cache(maxsize=8)
+def _contentHash(dbPath: str, size: int, mtime: int) -> str:
+    digest = hashlib.sha1()
+    with open(dbPath, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def writeCache(dbPath: str, shore: ShoreModel=None, hydrology: HydrologyNetwork=None, Ts: Terrain=None) -> None:
+    """Writes the cache for a save file
+
+    This must be called after the save file has been written and closed,
+    because the cache is tied to the file's contents. Layers that are None
+    are not cached.
+
+    :param dbPath: The path to the save file
+    :type dbPath: str
+    :param shore: The shoreline
+    :type shore: ShoreModel
+    :param hydrology: The hydrology network. Its node IDs must be ``0`` to ``n-1``
+    :type hydrology: HydrologyNetwork
+    :param Ts: The terrain primitives
+    :type Ts: Terrain
+    """
+    directory = cachePath(dbPath)
+    os.makedirs(directory, exist_ok=True)
+
+    # an old manifest is removed first, so the cache is never valid while
+    # it is only partially written
+    manifestPath = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifestPath):
+        os.remove(manifestPath)
+
+    layers = [ ]
+
+    if shore is not None:
+        np.save(os.path.join(directory, 'shore-contour.npy'), np.asarray(shore.contour, dtype=np.float32))
+        layers.append('shore')
+
+    if hydrology is not None:
+        nodes = sorted(hydrology.allNodes(), key=lambda node: node.id)
+        if [ node.id for node in nodes ] != list(range(len(nodes))):
+            raise ValueError('The IDs of the hydrology nodes must be 0 to n-1')
+
+        columns = {
+            'parents': np.array([ node.parent.id if node.parent is not None else -1 for node in nodes ], dtype=np.int64),
+            'positions': np.array([ node.position for node in nodes ], dtype=np.float64).reshape(-1, 2),
+            'elevations': np.array([ node.elevation for node in nodes ], dtype=np.float64),
+            'priorities': np.array([ node.priority for node in nodes ], dtype=np.int64),
+            'contourIndices': np.array([ -1 if getattr(node, 'contourIndex', None) is None else node.contourIndex for node in nodes ], dtype=np.int64),
+            'localWatersheds': np.array([ getattr(node, 'localWatershed', np.nan) for node in nodes ], dtype=np.float64),
+            'inheritedWatersheds': np.array([ node.inheritedWatershed for node in nodes ], dtype=np.float64),
+            'flows': np.array([ getattr(node, 'flow', np.nan) for node in nodes ], dtype=np.float64),
+        }
+
+        # the rivers are packed end-to-end. River i belongs to node
+        # riverNodes[i], and its points are riverCoords[riverOffsets[i]:riverOffsets[i+1]]
+        rivers = [ (node.id, np.asarray(river.coords, dtype=np.float64).reshape(-1, 3)) for node in nodes for river in node.rivers ]
+        columns['riverNodes'] = np.array([ nodeID for nodeID, _ in rivers ], dtype=np.int64)
+        columns['riverOffsets'] = np.append(0, np.cumsum([ len(coords) for _, coords in rivers ])).astype(np.int64)
+        columns['riverCoords'] = np.concatenate([ coords for _, coords in rivers ]) if len(rivers) > 0 else np.zeros((0,3))
+
+        for name, column in columns.items():
+            np.save(os.path.join(directory, f'hydrology-{name}.npy'), column)
+        layers.append('hydrology')
+
+    if Ts is not None:
+        np.save(os.path.join(directory, 'terrain-positions.npy'), np.asarray(Ts.positions, dtype=np.float64))
+        np.save(os.path.join(directory, 'terrain-cells.npy'), np.asarray(Ts.cells, dtype=np.int64))
+        np.save(os.path.join(directory, 'terrain-elevations.npy'), np.asarray(Ts.elevations, dtype=np.float64))
+        layers.append('terrain')
+
+    with open(manifestPath, 'w') as manifest:
+        json.dump({ 'version': cacheVersion, 'hash': contentHash(dbPath), 'layers': layers }, manifest)
+
+def isValid(dbPath: str, layer: str) -> bool:
+    """Determines whether a layer of a save file's cache can be used
+
+    :param dbPath: The path to the save file
+    :type dbPath: str
+    :param layer: ``'shore'``, ``'hydrology'``, or ``'terrain'``
+    :type layer: str
+    :return: True if the layer is cached, and the save file has not changed since
+    :rtype: bool
+    """
+    manifestPath = os.path.join(cachePath(dbPath), 'manifest.json')
+    if not os.path.exists(manifestPath):
+        return False
+
+    try:
+        with open(manifestPath, 'r') as manifestFile:
+            manifest = json.load(manifestFile)
+    except (OSError, ValueError):
+        return False
+
+    return (
+        manifest.get('version') == cacheVersion and
+        layer in manifest.get('layers', [ ]) and
+        manifest.get('hash') == contentHash(dbPath)
+    )
+
+def _column(dbPath: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(cachePath(dbPath), f'{name}.npy'), mmap_mode='r')
+
+def loadShore(dbPath: str, db: sqlite3.Connection) -> ShoreModel:
+    """Loads the shoreline from the cache, or from the save file if the cache is not valid
+
+    :param dbPath: The path to the save file
+    :type dbPath: str
+    :param db: A connection to the save file
+    :type db: sqlite3.Connection
+    :return: The shoreline
+    :rtype: ShoreModel
+    """
+    shore = ShoreModel()
+    if isValid(dbPath, 'shore'):
+        shore.loadFromArray(_column(dbPath, 'shore-contour'))
+    else:
+        shore.loadFromDB(db)
+    return shore
+
+def loadHydrology(dbPath: str, db: sqlite3.Connection) -> HydrologyNetwork:
+    """Loads the hydrology network from the cache, or from the save file if the cache is not valid
+
+    The nodes themselves are still Python objects, but they are built from
+    arrays rather than from individual rows, and the rivers do not have to
+    be parsed from text.
+
+    :param dbPath: The path to the save file
+    :type dbPath: str
+    :param db: A connection to the save file
+    :type db: sqlite3.Connection
+    :return: The hydrology network
+    :rtype: HydrologyNetwork
+    """
+    if not isValid(dbPath, 'hydrology'):
+        return HydrologyNetwork(db)
+
+    column = lambda name: _column(dbPath, f'hydrology-{name}')
+
+    hydrology = HydrologyNetwork()
+    hydrology.loadFromArrays(column('parents'), column('positions'), column('elevations'), column('priorities'), column('contourIndices'))
+
+    nodes = hydrology.allNodes()
+    for node, localWatershed, inheritedWatershed, flow in zip(nodes, column('localWatersheds').tolist(), column('inheritedWatersheds').tolist(), column('flows').tolist()):
+        node.localWatershed = localWatershed
+        node.inheritedWatershed = inheritedWatershed
+        node.flow = flow
+
+    riverOffsets = column('riverOffsets')
+    rivers = shapely.linestrings(
+        np.asarray(column('riverCoords')),
+        indices=np.repeat(np.arange(len(riverOffsets) - 1), np.diff(riverOffsets))
+    ) if len(riverOffsets) > 1 else [ ]
+    for nodeID, river in zip(column('riverNodes').tolist(), rivers):
+        hydrology.node(nodeID).rivers.append(river)
+
+    return hydrology
+
+def loadTerrain(dbPath: str, db: sqlite3.Connection) -> Terrain:
+    """Loads the terrain primitives from the cache, or from the save file if the cache is not valid
+
+    The columns of a Terrain that is loaded from the cache are read-only
+    memory maps.
+
+    :param dbPath: The path to the save file
+    :type dbPath: str
+    :param db: A connection to the save file
+    :type db: sqlite3.Connection
+    :return: The terrain primitives
+    :rtype: Terrain
+    """
+    Ts = Terrain()
+    if isValid(dbPath, 'terrain'):
+        Ts.setPrimitives(
+            _column(dbPath, 'terrain-positions'),
+            _column(dbPath, 'terrain-cells'),
+            _column(dbPath, 'terrain-elevations'),
+            presorted=True
+        )
+    else:
+        Ts.loadFromDB(db)
+    return Ts
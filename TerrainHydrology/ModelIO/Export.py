@@ -6,6 +6,7 @@ import sys
 from TerrainHydrology.DataModel import ShoreModel, HydrologyNetwork, TerrainHoneycomb, Terrain
 
 import TerrainHydrology.ModelIO.SaveFile as SaveFile
+import TerrainHydrology.ModelIO.ColumnarCache as ColumnarCache
 
 def writePrjFile(lat: float, lon: float, outputFile: str) -> None:
     ## Create the .prj file to be read by GIS software
@@ -21,13 +22,11 @@ def writeNodeShapefile(inputFile: str, lat: float, lon: float, outputFile: str,
 
     # Read the data model
     db = SaveFile.openDB(inputFile)
-    shore: ShoreModel.ShoreModel = ShoreModel.ShoreModel()
-    shore.loadFromDB(db)
-    hydrology: HydrologyNetwork.HydrologyNetwork = HydrologyNetwork.HydrologyNetwork(db)
+    shore: ShoreModel.ShoreModel = ColumnarCache.loadShore(inputFile, db)
+    hydrology: HydrologyNetwork.HydrologyNetwork = ColumnarCache.loadHydrology(inputFile, db)
     cells: TerrainHoneycomb.TerrainHoneycomb = TerrainHoneycomb.TerrainHoneycomb()
     cells.loadFromDB(db)
-    Ts: Terrain.Terrain = Terrain.Terrain()
-    Ts.loadFromDB(db)
+    Ts: Terrain.Terrain = ColumnarCache.loadTerrain(inputFile, db)
 
     realShape = shore.realShape
 
@@ -72,13 +71,11 @@ def writeTerrainPrimitiveShapefile(inputFile: str, lat: float, lon: float, outpu
 
     # Read the data model
     db = SaveFile.openDB(inputFile)
-    shore: ShoreModel.ShoreModel = ShoreModel.ShoreModel()
-    shore.loadFromDB(db)
-    hydrology: HydrologyNetwork.HydrologyNetwork = HydrologyNetwork.HydrologyNetwork(db)
+    shore: ShoreModel.ShoreModel = ColumnarCache.loadShore(inputFile, db)
+    hydrology: HydrologyNetwork.HydrologyNetwork = ColumnarCache.loadHydrology(inputFile, db)
     cells: TerrainHoneycomb.TerrainHoneycomb = TerrainHoneycomb.TerrainHoneycomb()
     cells.loadFromDB(db)
-    Ts: Terrain.Terrain = Terrain.Terrain()
-    Ts.loadFromDB(db)
+    Ts: Terrain.Terrain = ColumnarCache.loadTerrain(inputFile, db)
 
     with shapefile.Writer(outputFile, shapeType=1) as w:
         # Relevant fields for nodes
@@ -86,7 +83,7 @@ def writeTerrainPrimitiveShapefile(inputFile: str, lat: float, lon: float, outpu
         w.field('elevation', 'F')
 
         # add every primitive
-        for tidx in trange(len(Ts.allTs()), file=progressOut):
+        for tidx in trange(len(Ts), file=progressOut):
             t = Ts.getT(tidx)
 
             w.record(t.cell, t.elevation)
@@ -105,13 +102,11 @@ def writeEdgeShapefile(inputFile: str, lat: float, lon: float, outputFile: str,
 
     # Read the data model
     db = SaveFile.openDB(inputFile)
-    shore: ShoreModel.ShoreModel = ShoreModel.ShoreModel()
-    shore.loadFromDB(db)
-    hydrology: HydrologyNetwork.HydrologyNetwork = HydrologyNetwork.HydrologyNetwork(db)
+    shore: ShoreModel.ShoreModel = ColumnarCache.loadShore(inputFile, db)
+    hydrology: HydrologyNetwork.HydrologyNetwork = ColumnarCache.loadHydrology(inputFile, db)
     cells: TerrainHoneycomb.TerrainHoneycomb = TerrainHoneycomb.TerrainHoneycomb()
     cells.loadFromDB(db)
-    Ts: Terrain.Terrain = Terrain.Terrain()
-    Ts.loadFromDB(db)
+    Ts: Terrain.Terrain = ColumnarCache.loadTerrain(inputFile, db)
 
     with shapefile.Writer(outputFile, shapeType=3) as w:
         w.field('id', 'L')
@@ -140,13 +135,11 @@ def writeDownstreamEdgeShapefile(inputFile: str, lat: float, lon: float, outputF
 
     # Read the data model
     db = SaveFile.openDB(inputFile)
-    shore: ShoreModel.ShoreModel = ShoreModel.ShoreModel()
-    shore.loadFromDB(db)
-    hydrology: HydrologyNetwork.HydrologyNetwork = HydrologyNetwork.HydrologyNetwork(db)
+    shore: ShoreModel.ShoreModel = ColumnarCache.loadShore(inputFile, db)
+    hydrology: HydrologyNetwork.HydrologyNetwork = ColumnarCache.loadHydrology(inputFile, db)
     cells: TerrainHoneycomb.TerrainHoneycomb = TerrainHoneycomb.TerrainHoneycomb()
     cells.loadFromDB(db)
-    Ts: Terrain.Terrain = Terrain.Terrain()
-    Ts.loadFromDB(db)
+    Ts: Terrain.Terrain = ColumnarCache.loadTerrain(inputFile, db)
 
     realShape = shore.realShape
 
@@ -173,13 +166,11 @@ def writeRiverShapefile(inputFile: str, lat: float, lon: float, outputFile: str,
 
     # Read the data model
     db = SaveFile.openDB(inputFile)
-    shore: ShoreModel.ShoreModel = ShoreModel.ShoreModel()
-    shore.loadFromDB(db)
-    hydrology: HydrologyNetwork.HydrologyNetwork = HydrologyNetwork.HydrologyNetwork(db)
+    shore: ShoreModel.ShoreModel = ColumnarCache.loadShore(inputFile, db)
+    hydrology: HydrologyNetwork.HydrologyNetwork = ColumnarCache.loadHydrology(inputFile, db)
     cells: TerrainHoneycomb.TerrainHoneycomb = TerrainHoneycomb.TerrainHoneycomb()
     cells.loadFromDB(db)
-    Ts: Terrain.Terrain = Terrain.Terrain()
-    Ts.loadFromDB(db)
+    Ts: Terrain.Terrain = ColumnarCache.loadTerrain(inputFile, db)
     realShape = shore.realShape
 
     with shapefile.Writer(outputFile, shapeType=3) as w:
@@ -223,13 +214,11 @@ def writeRidgePrimitiveShapefile(inputFile: str, lat: float, lon: float, outputF
 
     # Read the data model
     db = SaveFile.openDB(inputFile)
-    shore: ShoreModel.ShoreModel = ShoreModel.ShoreModel()
-    shore.loadFromDB(db)
-    hydrology: HydrologyNetwork.HydrologyNetwork = HydrologyNetwork.HydrologyNetwork(db)
+    shore: ShoreModel.ShoreModel = ColumnarCache.loadShore(inputFile, db)
+    hydrology: HydrologyNetwork.HydrologyNetwork = ColumnarCache.loadHydrology(inputFile, db)
     cells: TerrainHoneycomb.TerrainHoneycomb = TerrainHoneycomb.TerrainHoneycomb()
     cells.loadFromDB(db)
-    Ts: Terrain.Terrain = Terrain.Terrain()
-    Ts.loadFromDB(db)
+    Ts: Terrain.Terrain = ColumnarCache.loadTerrain(inputFile, db)
     realShape = shore.realShape
 
     with shapefile.Writer(outputFile, shapeType=1) as w:
@@ -0,0 +1,198 @@
+"""In-process access to the native module
+
+The native module can be built as a shared library
+(``native-module/bin/libterrainhydrology.so``) as well as a pair of
+executables. When the library is available, the generator calls it through
+:py:mod:`ctypes` instead of spawning subprocesses, so the inputs and outputs
+are passed as NumPy arrays rather than through the save file and pipes.
+
+:py:mod:`ctypes` releases the GIL while the native code runs. Each
+computation is run on a separate thread, and the calling thread polls a
+progress counter that the native code increments.
+"""
+
+import ctypes
+import os.path
+import threading
+import typing
+import numpy as np
+
+from TerrainHydrology.DataModel.HydrologyNetwork import HydrologyNetwork
+from TerrainHydrology.DataModel.ShoreModel import ShoreModel
+from TerrainHydrology.DataModel.Terrain import Terrain
+from TerrainHydrology.ModelIO.RasterData import RasterData
+
+libraryPath = 'native-module/bin/libterrainhydrology.so'
+
+_float_p = np.ctypeslib.ndpointer(dtype=np.float32, flags='C_CONTIGUOUS')
+_uint32_p = np.ctypeslib.ndpointer(dtype=np.uint32, flags='C_CONTIGUOUS')
+_uint64_p = np.ctypeslib.ndpointer(dtype=np.uint64, flags='C_CONTIGUOUS')
+_int64_p = np.ctypeslib.ndpointer(dtype=np.int64, flags='C_CONTIGUOUS')
+
+def isAvailable(path: str=libraryPath) -> bool:
+    """Determines whether the native library has been built
+
+    :param path: The path to the shared library
+    :type path: str
+    :return: True if the library exists
+    :rtype: bool
+    """
+    return os.path.exists(path)
+
+def loadLibrary(path: str=libraryPath) -> ctypes.CDLL:
+    """Loads the native library and declares the signatures of its functions
+
+    :param path: The path to the shared library
+    :type path: str
+    :return: The library
+    :rtype: ctypes.CDLL
+    """
+    library = ctypes.CDLL(os.path.abspath(path))
+
+    library.th_buildRivers.restype = ctypes.c_void_p
+    library.th_buildRivers.argtypes = [
+        ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float,
+        _float_p, ctypes.c_uint64,
+        _float_p, _uint32_p, _uint64_p, ctypes.c_uint64,
+        _float_p, ctypes.c_uint64, ctypes.c_uint64,
+        ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_float, ctypes.c_uint32, ctypes.c_float,
+        ctypes.POINTER(ctypes.c_uint64)
+    ]
+
+    library.th_numNodes.restype = ctypes.c_uint64
+    library.th_numNodes.argtypes = [ ctypes.c_void_p ]
+
+    library.th_getNodes.restype = None
+    library.th_getNodes.argtypes = [ ctypes.c_void_p, _int64_p, _float_p, _float_p, _uint32_p, _int64_p ]
+
+    library.th_freeRivers.restype = None
+    library.th_freeRivers.argtypes = [ ctypes.c_void_p ]
+
+    library.th_computePrimitiveElevations.restype = ctypes.c_int
+    library.th_computePrimitiveElevations.argtypes = [
+        ctypes.c_char_p, _float_p, _uint64_p, ctypes.c_uint64, _float_p, ctypes.POINTER(ctypes.c_uint64)
+    ]
+
+    return library
+
+def runWithProgress(function: typing.Callable, progress: ctypes.c_uint64, onProgress: typing.Callable[[int], None]=None, interval: float=0.1) -> typing.Any:
+    """Runs a native function on another thread, reporting its progress
+
+    :param function: The function to run. It takes no arguments
+    :type function: typing.Callable
+    :param progress: The counter that the native function increments
+    :type progress: ctypes.c_uint64
+    :param onProgress: Called with the value of the counter every ``interval`` seconds, and once more when the function returns
+    :type onProgress: typing.Callable[[int], None]
+    :param interval: The number of seconds between polls
+    :type interval: float
+    :return: Whatever the function returns
+    :raises Exception: Whatever the function raises, once the thread has finished
+    """
+    result = { }
+    def target():
+        try:
+            result['value'] = function()
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    while thread.is_alive():
+        thread.join(interval)
+        if onProgress is not None:
+            onProgress(progress.value)
+
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+def buildRivers(library: ctypes.CDLL, shore: ShoreModel, hydrology: HydrologyNetwork, riverSlope: RasterData, edgeLength: float, Pa: float, Pc: float, sigma: float, eta: float, zeta: float, slopeRate: float, maxTries: int, riverAngleDev: float, onProgress: typing.Callable[[int], None]=None) -> HydrologyNetwork:
+    """Grows a river network from its mouth nodes with the native library
+
+    :param library: The library, from :py:func:`loadLibrary`
+    :type library: ctypes.CDLL
+    :param shore: The shoreline
+    :type shore: ShoreModel
+    :param hydrology: A network containing only the mouth nodes
+    :type hydrology: HydrologyNetwork
+    :param riverSlope: The river slope raster
+    :type riverSlope: RasterData
+    :param onProgress: Called periodically with the number of candidates that have been expanded so far
+    :type onProgress: typing.Callable[[int], None]
+    :return: The complete hydrology network
+    :rtype: HydrologyNetwork
+
+    The remaining parameters are the same as those of :py:class:`HydrologyParameters`.
+    """
+    contour = np.ascontiguousarray(shore.contour, dtype=np.float32).reshape(-1)
+
+    mouthNodes = hydrology.allMouthNodes()
+    mouthLocs = np.array([node.position for node in mouthNodes], dtype=np.float32).reshape(-1)
+    mouthPriorities = np.array([node.priority for node in mouthNodes], dtype=np.uint32)
+    mouthContourIndices = np.array([node.contourIndex for node in mouthNodes], dtype=np.uint64)
+
+    slope = np.ascontiguousarray(riverSlope.array, dtype=np.float32)
+
+    # these are the same bounds that SaveFile.setShoreBoundaries() records
+    minX, minY = 0, 0
+    maxX, maxY = float(shore.realShape[0]), float(shore.realShape[1])
+
+    progress = ctypes.c_uint64(0)
+    rivers = runWithProgress(
+        lambda: library.th_buildRivers(
+            minX, minY, maxX, maxY, edgeLength, riverSlope.resolution,
+            contour, len(shore),
+            mouthLocs, mouthPriorities, mouthContourIndices, len(mouthNodes),
+            slope, riverSlope.xSize, riverSlope.ySize,
+            Pa, Pc, sigma, eta, zeta, slopeRate, maxTries, riverAngleDev,
+            ctypes.byref(progress)
+        ),
+        progress, onProgress
+    )
+
+    try:
+        numNodes = library.th_numNodes(rivers)
+        parents = np.zeros(numNodes, dtype=np.int64)
+        locs = np.zeros(numNodes * 2, dtype=np.float32)
+        elevations = np.zeros(numNodes, dtype=np.float32)
+        priorities = np.zeros(numNodes, dtype=np.uint32)
+        contourIndices = np.zeros(numNodes, dtype=np.int64)
+        library.th_getNodes(rivers, parents, locs, elevations, priorities, contourIndices)
+    finally:
+        library.th_freeRivers(rivers)
+
+    result = HydrologyNetwork()
+    result.loadFromArrays(parents, locs.reshape(-1, 2).astype(np.float64), elevations.astype(np.float64), priorities, contourIndices)
+    return result
+
+def computePrimitiveElevations(library: ctypes.CDLL, dbPath: str, Ts: Terrain, onProgress: typing.Callable[[int], None]=None) -> np.ndarray:
+    """Computes the elevations of the terrain primitives with the native library
+
+    The hydrology network, terrain honeycomb, and shore must already be
+    saved to the save file.
+
+    :param library: The library, from :py:func:`loadLibrary`
+    :type library: ctypes.CDLL
+    :param dbPath: The path to the save file
+    :type dbPath: str
+    :param Ts: The terrain primitives
+    :type Ts: Terrain
+    :param onProgress: Called periodically with the number of primitives that have been computed so far
+    :type onProgress: typing.Callable[[int], None]
+    :return: The elevation of each primitive
+    :rtype: numpy.ndarray
+    """
+    locs = np.ascontiguousarray(Ts.positions, dtype=np.float32).reshape(-1)
+    cells = np.ascontiguousarray(Ts.cells, dtype=np.uint64)
+    elevations = np.zeros(len(Ts), dtype=np.float32)
+
+    progress = ctypes.c_uint64(0)
+    status = runWithProgress(
+        lambda: library.th_computePrimitiveElevations(dbPath.encode(), locs, cells, len(Ts), elevations, ctypes.byref(progress)),
+        progress, onProgress
+    )
+    if status != 0:
+        raise IOError(f'The native module could not open {dbPath}')
+
+    return elevations.astype(np.float64)
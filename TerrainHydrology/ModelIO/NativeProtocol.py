@@ -0,0 +1,142 @@
+"""The binary protocol used to exchange data with the native module
+
+The native executables read their context (the shore, the parameters, and
+so on) from the save file, but the bulk data is streamed over their
+standard input and output. This avoids writing records to the database only
+for the other side to parse them back out again.
+
+All values are in network (big-endian) order, like
+:py:meth:`HydrologyParameters.toBinary`.
+
+While they work, both executables periodically write progress messages to
+their standard output. Each message is the byte ``0x2e`` followed by the
+number of items completed so far, as an unsigned 64-bit integer. When the
+work is done, they write the byte ``0x21``. See :py:func:`readProgress`.
+
+``terrainPrimitives`` reads the number of terrain primitives as an unsigned
+64-bit integer from its standard input, followed by one :py:data:`T_RECORD`
+for each primitive. After its progress messages, it writes the elevation of
+each primitive as a 32-bit float, in the order they were received.
+
+``buildRivers`` reports the number of candidates it has expanded. After its
+progress messages, it writes the number of nodes as an unsigned 64-bit
+integer, followed by one :py:data:`NODE_RECORD` for each node, in order of
+ID.
+"""
+
+import typing
+import numpy as np
+
+from TerrainHydrology.DataModel.HydrologyNetwork import HydrologyNetwork
+from TerrainHydrology.DataModel.Terrain import Terrain
+
+#: The layout of a terrain primitive sent to ``terrainPrimitives``
+T_RECORD = np.dtype([('x', '>f4'), ('y', '>f4'), ('cell', '>u8')])
+
+#: The layout of a river node received from ``buildRivers``
+NODE_RECORD = np.dtype([
+    ('id', '>u8'), ('parent', '>i8'), ('x', '>f4'), ('y', '>f4'),
+    ('elevation', '>f4'), ('priority', '>u4'), ('contourIndex', '>i8')
+])
+
+COUNT = np.dtype('>u8')
+ELEVATION = np.dtype('>f4')
+
+def readExactly(stream: typing.BinaryIO, size: int) -> bytes:
+    """Reads a certain number of bytes from a stream
+
+    :param stream: The stream to read from
+    :type stream: typing.BinaryIO
+    :param size: The number of bytes to read
+    :type size: int
+    :return: Exactly ``size`` bytes
+    :rtype: bytes
+    :raises EOFError: If the stream ends before that many bytes are read
+    """
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = stream.read(size - len(buffer))
+        if not chunk:
+            raise EOFError(f'Expected {size} bytes from the native module, but only received {len(buffer)}')
+        buffer += chunk
+    return bytes(buffer)
+
+PROGRESS = 0x2e
+ALL_DONE = 0x21
+
+def readProgress(stream: typing.BinaryIO, onProgress: typing.Callable[[int], None]=None) -> int:
+    """Reads progress messages until the native module signals that it is done
+
+    :param stream: The stream to read from (the native module's standard output)
+    :type stream: typing.BinaryIO
+    :param onProgress: Called with the number of items completed so far, each time a message is received
+    :type onProgress: typing.Callable[[int], None]
+    :return: The number of items completed
+    :rtype: int
+    :raises ValueError: If the stream contains something other than a progress message
+    """
+    completed = 0
+    while True:
+        tag = readExactly(stream, 1)[0]
+        if tag == ALL_DONE:
+            return completed
+        if tag != PROGRESS:
+            raise ValueError(f'Unexpected byte {tag:#x} from the native module')
+
+        completed = int(np.frombuffer(readExactly(stream, COUNT.itemsize), dtype=COUNT)[0])
+        if onProgress is not None:
+            onProgress(completed)
+
+def writeTs(stream: typing.BinaryIO, Ts: Terrain) -> None:
+    """Sends the locations and cells of the terrain primitives
+
+    :param stream: The stream to write to (the native module's standard input)
+    :type stream: typing.BinaryIO
+    :param Ts: The terrain primitives
+    :type Ts: Terrain
+    """
+    records = np.zeros(len(Ts), dtype=T_RECORD)
+    records['x'] = Ts.positions[:,0]
+    records['y'] = Ts.positions[:,1]
+    records['cell'] = Ts.cells
+
+    stream.write(np.array(len(Ts), dtype=COUNT).tobytes())
+    stream.write(records.tobytes())
+    stream.flush()
+
+def readTElevations(stream: typing.BinaryIO, numTs: int) -> np.ndarray:
+    """Receives the elevations of the terrain primitives
+
+    :param stream: The stream to read from (the native module's standard output)
+    :type stream: typing.BinaryIO
+    :param numTs: The number of terrain primitives that were sent
+    :type numTs: int
+    :return: The elevation of each primitive, in the order they were sent
+    :rtype: numpy.ndarray
+    """
+    buffer = readExactly(stream, numTs * ELEVATION.itemsize)
+    return np.frombuffer(buffer, dtype=ELEVATION).astype(np.float64)
+
+def readHydrology(stream: typing.BinaryIO) -> HydrologyNetwork:
+    """Receives a hydrology network
+
+    :param stream: The stream to read from (the native module's standard output)
+    :type stream: typing.BinaryIO
+    :return: The hydrology network
+    :rtype: HydrologyNetwork
+    """
+    numNodes = int(np.frombuffer(readExactly(stream, COUNT.itemsize), dtype=COUNT)[0])
+    records = np.frombuffer(readExactly(stream, numNodes * NODE_RECORD.itemsize), dtype=NODE_RECORD)
+
+    # the nodes should already be in order, but don't depend on it
+    records = records[np.argsort(records['id'], kind='stable')]
+
+    hydrology = HydrologyNetwork()
+    hydrology.loadFromArrays(
+        records['parent'],
+        np.column_stack((records['x'], records['y'])).astype(np.float64),
+        records['elevation'].astype(np.float64),
+        records['priority'],
+        records['contourIndex']
+    )
+    return hydrology
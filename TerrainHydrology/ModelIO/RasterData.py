@@ -1,5 +1,7 @@
+import hashlib
+import os
 from PIL import Image
-import struct
+import numpy as np
 
 from typing import Tuple
 
@@ -13,6 +15,10 @@ class RasterData:
     :type inputFileName: str
     :param resolution: The resolution of the input image in meters per pixel
     :type resolution: float
+    :param cacheFileName: If specified, the decoded raster is cached in this ``.npy`` file and memory-mapped on later runs
+    :type cacheFileName: str
+    :param bilinear: If True, :py:meth:`sample` interpolates between pixels by default
+    :type bilinear: bool
     
     The image should be
     readable by PIL. The image should represent raster data that covers
@@ -20,14 +26,26 @@ class RasterData:
     are represented by the grayscale value of each pixel. The image's
     actual color model does not model, as it will be converted to
     grayscale in the constructor.
+
+    Internally, the data is held in a NumPy array indexed by row, then
+    column. If a cache file is specified and it is newer than the image and
+    has the same dimensions, the image is not decoded at all. Instead, the
+    cached array is memory-mapped.
     """
-    def __init__(self, inputFileName: str, resolution: float):
-        self.raster = Image.open(inputFileName)
-        self.xSize = self.raster.size[0]
-        self.ySize = self.raster.size[1]
-        self.raster = self.raster.convert('L')
-        self.raster = self.raster.load()
+    def __init__(self, inputFileName: str, resolution: float, cacheFileName: str=None, bilinear: bool=False):
+        image = Image.open(inputFileName) # this only reads the header
+        self.xSize = image.size[0]
+        self.ySize = image.size[1]
         self.resolution = resolution
+        self.bilinear = bilinear
+
+        self.array = None
+        if cacheFileName is not None:
+            self.array = _loadCache(cacheFileName, inputFileName, (self.ySize, self.xSize))
+        if self.array is None:
+            self.array = np.asarray(image.convert('L'))
+            if cacheFileName is not None:
+                np.save(cacheFileName, self.array)
     def __getitem__(self, loc: Tuple[float,float]) -> float:
         """Gets the value for a particular location
 
@@ -38,22 +56,112 @@ class RasterData:
         """
         loc = toImageCoordinates(loc, (self.xSize,self.ySize), self.resolution)
 
-        return self.raster[int(loc[0]), int(loc[1])]
-    def toBinary(self):
-        binary = None
-        for y in range(self.ySize):
-            # print(f'Working on row {y}')
-            row = None
-            for x in range(self.xSize):
-                if row is not None:
-                    row = row + struct.pack('!f', self.raster[x,y])
-                else:
-                    row = struct.pack('!f', self.raster[x,y])
-            if binary is not None:
-                binary = binary + row
-            else:
-                binary = row
-        return binary
+        x, y = int(loc[0]), int(loc[1])
+        if x < 0 or x >= self.xSize or y < 0 or y >= self.ySize:
+            raise IndexError('image index out of range')
+
+        return int(self.array[y, x])
+    def sample(self, points: np.ndarray, bilinear: bool=None) -> np.ndarray:
+        """Gets the values for many locations at once
+
+        Without interpolation, this gives the same values as
+        :py:meth:`__getitem__`, but it does the lookup for all the points
+        with array indexing.
+
+        With bilinear interpolation, each pixel's value is taken to be at the
+        center of the pixel, and values near the edges of the raster are
+        clamped to the outermost pixel centers.
+
+        :param points: The locations to interrogate, in meters
+        :type points: numpy.ndarray(n,2)
+        :param bilinear: Whether to interpolate between pixels. If not specified, the ``bilinear`` argument of the constructor is used
+        :type bilinear: bool
+        :return: The value of the data at each location
+        :rtype: numpy.ndarray(n)
+        :raises IndexError: If any of the locations fall outside the raster
+        """
+        if bilinear is None:
+            bilinear = self.bilinear
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x, y = toImageCoordinates((points[:,0].copy(), points[:,1].copy()), (self.xSize,self.ySize), self.resolution)
+
+        # like __getitem__, truncate toward zero, so that coordinates in
+        # (-1, 0) fall in the first pixel
+        xPixel = np.trunc(x).astype(np.int64)
+        yPixel = np.trunc(y).astype(np.int64)
+        if ((xPixel < 0) | (xPixel >= self.xSize) | (yPixel < 0) | (yPixel >= self.ySize)).any():
+            raise IndexError('image index out of range')
+
+        if not bilinear:
+            return self.array[yPixel, xPixel].astype(np.float64)
+
+        # pixel centers are at half-integer image coordinates
+        x = np.clip(x - 0.5, 0, self.xSize - 1)
+        y = np.clip(y - 0.5, 0, self.ySize - 1)
+        x0 = np.minimum(np.floor(x).astype(np.int64), self.xSize - 2 if self.xSize > 1 else 0)
+        y0 = np.minimum(np.floor(y).astype(np.int64), self.ySize - 2 if self.ySize > 1 else 0)
+        x1 = np.minimum(x0 + 1, self.xSize - 1)
+        y1 = np.minimum(y0 + 1, self.ySize - 1)
+        fx = x - x0
+        fy = y - y0
+
+        top    = self.array[y0, x0] * (1 - fx) + self.array[y0, x1] * fx
+        bottom = self.array[y1, x0] * (1 - fx) + self.array[y1, x1] * fx
+        return top * (1 - fy) + bottom * fy
+    def toBinary(self) -> bytes:
+        """Serializes the raster as big-endian 32-bit floats, row by row
+
+        :return: The raster data
+        :rtype: bytes
+        """
+        return self.array.astype('>f4').tobytes()
+
+def cachePath(cacheDirectory: str, inputFileName: str) -> str:
+    """Gets the path at which to cache a raster in a directory
+
+    The name of the cache is derived from the absolute path of the image,
+    so that images with the same name in different directories do not
+    share a cache.
+
+    :param cacheDirectory: The directory that holds the caches
+    :type cacheDirectory: str
+    :param inputFileName: The path to the image
+    :type inputFileName: str
+    :return: The path to the ``.npy`` cache
+    :rtype: str
+    """
+    name = hashlib.sha1(os.path.abspath(inputFileName).encode('utf-8')).hexdigest()
+    return os.path.join(cacheDirectory, f'{os.path.splitext(os.path.basename(inputFileName))[0]}-{name[:12]}.npy')
+
+def _loadCache(cacheFileName: str, inputFileName: str, shape: Tuple[int,int]) -> np.ndarray:
+    """Memory-maps a cached raster, if the cache is still valid
+
+    The cache is valid if it exists, has the expected shape, and (if the
+    image is a file on disk) was written after the image was last modified.
+
+    :param cacheFileName: The path to the ``.npy`` cache
+    :type cacheFileName: str
+    :param inputFileName: The path to the image that the cache was made from
+    :type inputFileName: str
+    :param shape: The number of rows and columns in the image
+    :type shape: tuple[int,int]
+    :return: The cached array, or None if the cache is missing or stale
+    :rtype: numpy.ndarray | None
+    """
+    if not os.path.isfile(cacheFileName):
+        return None
+    if isinstance(inputFileName, (str, os.PathLike)) and os.path.getmtime(cacheFileName) < os.path.getmtime(inputFileName):
+        return None
+
+    try:
+        array = np.load(cacheFileName, mmap_mode='r')
+    except (ValueError, OSError, EOFError):
+        return None
+    if array.shape != shape or array.dtype != np.uint8:
+        return None
+
+    return array
 
 def toImageCoordinates(loc: Tuple[float,float], imgSize: Tuple[float,float], resolution: float) -> Tuple[float,float]:
     x = loc[0]
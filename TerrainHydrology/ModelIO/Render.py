@@ -7,131 +7,158 @@ import rasterio
 from rasterio import Affine
 import time
 import math
+import os.path
 
 from TerrainHydrology.DataModel import ShoreModel, HydrologyNetwork, TerrainHoneycomb, Terrain, TerrainHydrology
-from TerrainHydrology.ModelIO import SaveFile
-from TerrainHydrology.Utilities import Math
+from TerrainHydrology.ModelIO import SaveFile, ColumnarCache
+from TerrainHydrology.Utilities import Math, Instrumentation, Profiling
 
 import sys
 import typing
 
-def renderDEM(inputFile: str, lat: float, lon: float, outputResolution: int, numProcs: int, outputDir: str, extremeMemory: bool,  progressOut: typing.IO=sys.stderr) -> None:
+def renderDEM(inputFile: str, lat: float, lon: float, outputResolution: int, numProcs: int, outputDir: str, extremeMemory: bool,  progressOut: typing.IO=sys.stderr, liveMetrics: bool=False, profile: str=None) -> None:
     # TODO: outputResolution is used as a global variable
 
-    # Read the data model
-    db = SaveFile.openDB(inputFile)
-    edgeLength = SaveFile.getEdgeLength(db)
-    shore: ShoreModel.ShoreModel = ShoreModel.ShoreModel() # TODO: This was a global variable
-    shore.loadFromDB(db)
-    hydrology: HydrologyNetwork.HydrologyNetwork = HydrologyNetwork.HydrologyNetwork(db) # TODO: This was a global variable
-    cells: TerrainHoneycomb.TerrainHoneycomb = TerrainHoneycomb.TerrainHoneycomb()
-    cells.loadFromDB(db)
-    Ts: Terrain.Terrain = Terrain.Terrain()
-    Ts.loadFromDB(db)
-    terrainSystem = TerrainHydrology.TerrainHydrology(edgeLength) # TODO: This was a global variable
-    terrainSystem.hydrology = hydrology
-    terrainSystem.cells = cells
-
-    # TODO: These need to be passed to the child processes. Previously, they were just global variables
-    radius = edgeLength / 3
-    rwidth = edgeLength / 2
-
-    # oceanFloor is calculated ensure that all land appears as green in the output
-    # image. It should be about 25% of the way up the color ramp
-    maxq = max([q.elevation for q in cells.allQs() if q is not None])
-    # TODO: This was also a global variable
-    oceanFloor = 0 - 0.25 * maxq / 0.75
-
-    # TODO: I think this was also a global variable 
-    outputShape = (outputResolution,outputResolution) # shape of the output matrix
-    outputType = np.single # dtype of the output matrix
-
-    # Create an array that is all water by default
-    imgInit = np.full(outputShape, oceanFloor,dtype=outputType)
-
-    # create a region of shared memory for processes to write to
-    bufferString = 'HydrologyRender-sklvv482'
-    sharedBuffer = shared_memory.SharedMemory(
-        bufferString, create=True, size=imgInit.nbytes
+    # Each stage is measured, and the measurements are written with the output
+    report = Instrumentation.StageReport(
+        'render',
+        { 'outputResolution': outputResolution, 'numProcs': numProcs, 'extremeMemory': extremeMemory },
+        sys.stderr if liveMetrics else None,
+        profile
     )
 
-    # The image will be written to the shared memory as in a numpy matrix
-    imgOut = np.ndarray(outputShape, dtype=outputType, buffer=sharedBuffer.buf)
-    imgOut[:] = imgInit[:] # Load ocean floor fill
-    del imgInit # This matrix is no longer needed
-
-    if not extremeMemory:
-        counter = Value('i', 0)
-        dataQueue = Queue()
-        processes = []
-        for p in range(numProcs):
-            processes.append(Process(target=subroutine, args=(p, numProcs, outputResolution, outputShape, outputType, bufferString, radius, rwidth, oceanFloor, terrainSystem, shore, hydrology, Ts, counter)))
-            processes[p].start()
-        print('Rendering terrain...')
-        while counter.value < outputResolution:
-            for i in range(15):
-                time.sleep(1)
+    # The report is written even if a stage fails
+    try:
+        # Read the data model
+        report.startStage('load')
+        db = SaveFile.openDB(inputFile)
+        edgeLength = SaveFile.getEdgeLength(db)
+        shore: ShoreModel.ShoreModel = ColumnarCache.loadShore(inputFile, db) # TODO: This was a global variable
+        hydrology: HydrologyNetwork.HydrologyNetwork = ColumnarCache.loadHydrology(inputFile, db) # TODO: This was a global variable
+        cells: TerrainHoneycomb.TerrainHoneycomb = TerrainHoneycomb.TerrainHoneycomb()
+        cells.loadFromDB(db)
+        Ts: Terrain.Terrain = ColumnarCache.loadTerrain(inputFile, db)
+        terrainSystem = TerrainHydrology.TerrainHydrology(edgeLength) # TODO: This was a global variable
+        terrainSystem.hydrology = hydrology
+        terrainSystem.cells = cells
+
+        # TODO: These need to be passed to the child processes. Previously, they were just global variables
+        radius = edgeLength / 3
+        rwidth = edgeLength / 2
+
+        # oceanFloor is calculated ensure that all land appears as green in the output
+        # image. It should be about 25% of the way up the color ramp
+        maxq = max([q.elevation for q in cells.allQs() if q is not None])
+        # TODO: This was also a global variable
+        oceanFloor = 0 - 0.25 * maxq / 0.75
+
+        # TODO: I think this was also a global variable 
+        outputShape = (outputResolution,outputResolution) # shape of the output matrix
+        outputType = np.single # dtype of the output matrix
+
+        # Create an array that is all water by default
+        imgInit = np.full(outputShape, oceanFloor,dtype=outputType)
+
+        # create a region of shared memory for processes to write to
+        bufferString = 'HydrologyRender-sklvv482'
+        sharedBuffer = shared_memory.SharedMemory(
+            bufferString, create=True, size=imgInit.nbytes
+        )
+
+        # The image will be written to the shared memory as in a numpy matrix
+        imgOut = np.ndarray(outputShape, dtype=outputType, buffer=sharedBuffer.buf)
+        imgOut[:] = imgInit[:] # Load ocean floor fill
+        del imgInit # This matrix is no longer needed
+        report.endStage(len(Ts), 'primitives')
+
+        report.startStage('render')
+
+        if not extremeMemory:
+            counter = Value('i', 0)
+            dataQueue = Queue()
+            processes = []
+            for p in range(numProcs):
+                processes.append(Process(target=Profiling.profiledTarget(subroutine, profile, f'render-worker-{p}'), args=(p, numProcs, outputResolution, outputShape, outputType, bufferString, radius, rwidth, oceanFloor, terrainSystem, shore, hydrology, Ts, counter)))
+                processes[p].start()
+            print('Rendering terrain...')
+            # poll often, so that the stage ends as soon as the workers do,
+            # but only save a preview every 15 seconds
+            lastPreview = time.perf_counter()
+            while counter.value < outputResolution and any(p.is_alive() for p in processes):
+                time.sleep(0.1)
                 print(f'\tRendered {100.0*(counter.value)/(outputResolution)}%', end='\r')
-
-            plt.clf()
-            plt.imshow(imgOut, cmap=plt.get_cmap('terrain'))
-            plt.colorbar()
-            plt.tight_layout()                                # DEBUG
-            plt.savefig(outputDir + 'out-color.png')
-        for p in range(numProcs):
-            processes[p].join()
-    else:
-        chunk = 500
-        chunki = 0
-        processes = []
-        dataQueue = Queue()
-        persist = Value('B', 0)
-        for p in range(numProcs):
-            processes.append(Process(target=subroutineExtremeMemory, args=(chunki*chunk,(chunki+1)*chunk, dataQueue, outputResolution, outputShape, outputType, bufferString, radius, rwidth, oceanFloor, terrainSystem, shore, hydrology, Ts)))
-            processes[p].start()
-            chunki += 1
-        while chunki < math.ceil(outputResolution/chunk):
-            dataQueue.get()
-            processes.append(Process(target=subroutineExtremeMemory, args=(chunki*chunk,(chunki+1)*chunk, dataQueue, outputResolution, outputShape, outputType, bufferString, radius, rwidth, oceanFloor, terrainSystem, shore, hydrology, Ts)))
-            processes[len(processes)-1].start()
-            chunki += 1
-        persist.value = 1
-        for p in processes:
-            p.join()
-
-    print()
-
-    plt.clf()
-    plt.imshow(imgOut, cmap=plt.get_cmap('terrain'))
-    plt.colorbar()
-    plt.tight_layout()                                # DEBUG
-    plt.savefig(outputDir + 'out-color.png')
-
-
-    ## Write the GeoTIFF
-
-    imgOut[imgOut==oceanFloor] = -5000.0 # For actual heightmap output, set 'ocean' to the nodata value
-    imgOut = imgOut.transpose()
-
-    projection = f'+proj=ortho +lat_0={lat} +lon_0={lon}' # Adjust lat_0 and lon_0 for location
-    transform = Affine.translation(-shore.realShape[0]*0.5,-shore.realShape[1]*0.5) * Affine.scale(1/outputResolution) * Affine.scale(shore.realShape[0])
-    new_dataset = rasterio.open(
-        outputDir + '/out-geo.tif',
-        'w',
-        driver='GTiff',
-        height=imgOut.shape[0],
-        width=imgOut.shape[1],
-        count=1,
-        dtype=imgOut.dtype,
-        crs=projection,
-        transform=transform,
-        nodata=-5000.0
-    )
-    new_dataset.write(imgOut, 1)
-    print(new_dataset.meta)
-    new_dataset.close()
-
-    sharedBuffer.unlink()
+                if counter.value >= outputResolution or time.perf_counter() - lastPreview < 15:
+                    continue
+                lastPreview = time.perf_counter()
+
+                plt.clf()
+                plt.imshow(imgOut, cmap=plt.get_cmap('terrain'))
+                plt.colorbar()
+                plt.tight_layout()                                # DEBUG
+                plt.savefig(outputDir + 'out-color.png')
+            for p in range(numProcs):
+                processes[p].join()
+        else:
+            chunk = 500
+            chunki = 0
+            processes = []
+            dataQueue = Queue()
+            persist = Value('B', 0)
+            for p in range(numProcs):
+                processes.append(Process(target=Profiling.profiledTarget(subroutineExtremeMemory, profile, f'render-chunk-{chunki}'), args=(chunki*chunk,(chunki+1)*chunk, dataQueue, outputResolution, outputShape, outputType, bufferString, radius, rwidth, oceanFloor, terrainSystem, shore, hydrology, Ts)))
+                processes[p].start()
+                chunki += 1
+            while chunki < math.ceil(outputResolution/chunk):
+                dataQueue.get()
+                processes.append(Process(target=Profiling.profiledTarget(subroutineExtremeMemory, profile, f'render-chunk-{chunki}'), args=(chunki*chunk,(chunki+1)*chunk, dataQueue, outputResolution, outputShape, outputType, bufferString, radius, rwidth, oceanFloor, terrainSystem, shore, hydrology, Ts)))
+                processes[len(processes)-1].start()
+                chunki += 1
+            persist.value = 1
+            for p in processes:
+                p.join()
+
+        print()
+
+        plt.clf()
+        plt.imshow(imgOut, cmap=plt.get_cmap('terrain'))
+        plt.colorbar()
+        plt.tight_layout()                                # DEBUG
+        plt.savefig(outputDir + 'out-color.png')
+
+
+        report.endStage(outputResolution * outputResolution, 'pixels')
+
+        ## Write the GeoTIFF
+        report.startStage('write')
+
+        imgOut[imgOut==oceanFloor] = -5000.0 # For actual heightmap output, set 'ocean' to the nodata value
+        imgOut = imgOut.transpose()
+
+        projection = f'+proj=ortho +lat_0={lat} +lon_0={lon}' # Adjust lat_0 and lon_0 for location
+        transform = Affine.translation(-shore.realShape[0]*0.5,-shore.realShape[1]*0.5) * Affine.scale(1/outputResolution) * Affine.scale(shore.realShape[0])
+        new_dataset = rasterio.open(
+            outputDir + '/out-geo.tif',
+            'w',
+            driver='GTiff',
+            height=imgOut.shape[0],
+            width=imgOut.shape[1],
+            count=1,
+            dtype=imgOut.dtype,
+            crs=projection,
+            transform=transform,
+            nodata=-5000.0
+        )
+        new_dataset.write(imgOut, 1)
+        print(new_dataset.meta)
+        new_dataset.close()
+
+        sharedBuffer.unlink()
+        report.endStage()
+    finally:
+        report.write(os.path.join(outputDir, 'out-metrics.json'))
+        if profile is not None:
+            Profiling.mergeProfiles(profile)
+            print(f'Profiles written to {profile}')
 
 def ijToxy(ij: typing.Tuple[float,float], outputResolution: int, shore: ShoreModel) -> typing.Tuple[float,float]:
     i = ij[0]
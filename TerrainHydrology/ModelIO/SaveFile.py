@@ -1,5 +1,6 @@
 import os
 import sqlite3
+import typing
 
 from TerrainHydrology.DataModel.HydrologyNetwork import HydrologyNetwork
 from TerrainHydrology.DataModel.ShoreModel import ShoreModel
@@ -7,6 +8,11 @@ from TerrainHydrology.ModelIO.RasterData import RasterData
 
 currentVersion = 3
 
+#: The geometry columns of the schema, as (table, column)
+spatialColumns = [
+    ('Shoreline', 'loc'), ('RiverNodes', 'loc'), ('Qs', 'loc'), ('Ts', 'loc'), ('RiverPaths', 'path')
+]
+
 def createDB(dbPath: str, resolution: float, edgeLength: float, lon: float, lat: float) -> sqlite3.Connection:
     """Creates a new database file and initializes it with the necessary schema
 
@@ -42,6 +48,69 @@ def createDB(dbPath: str, resolution: float, edgeLength: float, lon: float, lat:
     
     return conn
 
+def configureForBulkLoad(db: sqlite3.Connection) -> None:
+    """Tunes a connection for writing large amounts of data
+
+    The rollback journal is kept in memory, and SQLite does not wait for
+    the data to reach the disk after each transaction. If the process or
+    the machine crashes during a write, the file may be corrupted, so this
+    is only suitable for files that can be regenerated (such as a save file
+    that is being generated).
+
+    These settings only apply to this connection.
+
+    :param db: The connection to the database
+    :type db: sqlite3.Connection
+    """
+    db.execute('PRAGMA journal_mode = MEMORY')
+    db.execute('PRAGMA synchronous = OFF')
+    db.execute('PRAGMA temp_store = MEMORY')
+    db.execute('PRAGMA cache_size = -262144') # 256 MiB
+
+def configureForCheckpoints(db: sqlite3.Connection) -> None:
+    """Tunes a connection for writing large amounts of data to a file that must survive a crash
+
+    Unlike :py:func:`configureForBulkLoad`, this keeps a write-ahead log,
+    so a crash cannot corrupt the data of transactions that were already
+    committed (such as the stages recorded by :py:func:`markStageComplete`).
+    SQLite still does not wait for the disk after every transaction, only
+    when the log is checkpointed.
+
+    The write-ahead log is kept in the file until
+    :py:func:`finishCheckpoints` is called.
+
+    :param db: The connection to the database
+    :type db: sqlite3.Connection
+    """
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute('PRAGMA synchronous = NORMAL')
+    db.execute('PRAGMA temp_store = MEMORY')
+    db.execute('PRAGMA cache_size = -262144') # 256 MiB
+
+def finishCheckpoints(db: sqlite3.Connection) -> None:
+    """Turns off the write-ahead log that :py:func:`configureForCheckpoints` turned on
+
+    The log is merged into the file, so the save file is a single file
+    again, and it can be read from read-only media.
+
+    :param db: The connection to the database
+    :type db: sqlite3.Connection
+    """
+    db.execute('PRAGMA journal_mode = DELETE')
+
+def createSpatialIndexes(db: sqlite3.Connection) -> None:
+    """Creates a spatial index on each of the geometry columns
+
+    Spatial indexes slow down inserts and deletes, so they are created
+    once, after the data has been written.
+
+    :param db: The connection to the database
+    :type db: sqlite3.Connection
+    """
+    with db:
+        for table, column in spatialColumns:
+            db.execute('SELECT CreateSpatialIndex(?, ?)', (table, column))
+
 def openDB(dbPath: str) -> sqlite3.Connection:
     """Opens an existing database file
 
@@ -102,17 +171,18 @@ def createRiverSlopeRaster(db: sqlite3.Connection, riverSlope: RasterData) -> No
 
     This method will create the necessary schema and insert the data
 
+    The raster is written as a single row. The ``slope`` column is a BLOB
+    of big-endian 32-bit floats in row-major order (see
+    :py:meth:`RasterData.toBinary`).
+
     :param db: The connection to the database
     :type db: sqlite3.Connection
     :param riverSlope: The river slope raster
     :type riverSlope: RasterData
     """
     with db:
-        db.execute('CREATE TABLE RiverSlope (x INTEGER, y INTEGER, slope REAL);')
-
-        for x in range(riverSlope.xSize):
-            for y in range(riverSlope.ySize):
-                db.execute('INSERT INTO RiverSlope (x, y, slope) VALUES (?, ?, ?)', (x, y, riverSlope[x, y]))
+        db.execute('CREATE TABLE RiverSlope (columns INTEGER, rows INTEGER, slope BLOB);')
+        db.execute('INSERT INTO RiverSlope (columns, rows, slope) VALUES (?, ?, ?)', (riverSlope.xSize, riverSlope.ySize, riverSlope.toBinary()))
 
 def dropRiverSlopeRaster(db: sqlite3.Connection) -> None:
     """Remove the data and schema that was created by createRiverSlopeRaster()
@@ -147,4 +217,106 @@ def dropMouthNodes(db: sqlite3.Connection) -> None:
     """
     with db:
         db.execute('ALTER TABLE RiverNodes DROP COLUMN priority;')
-        db.execute('DELETE FROM RiverNodes;')
\ No newline at end of file
+        db.execute('DELETE FROM RiverNodes;')
+
+def markStageComplete(db: sqlite3.Connection, stage: str) -> None:
+    """Records that a stage of generation has been completed and saved
+
+    The stages are recorded in a ``Stages`` table, which is created if it
+    does not exist. It is not part of the schema, so save files that were
+    written in one go simply do not have it.
+
+    :param db: The connection to the database
+    :type db: sqlite3.Connection
+    :param stage: The name of the stage
+    :type stage: str
+    """
+    with db:
+        db.execute('CREATE TABLE IF NOT EXISTS Stages (name TEXT PRIMARY KEY, completed TEXT);')
+        db.execute("INSERT OR REPLACE INTO Stages (name, completed) VALUES (?, datetime('now'))", (stage,))
+
+def completedStages(db: sqlite3.Connection) -> typing.List[str]:
+    """Gets the stages of generation that have been recorded by markStageComplete()
+
+    :param db: The connection to the database
+    :type db: sqlite3.Connection
+    :return: The names of the completed stages, in the order they were completed
+    :rtype: list[str]
+    """
+    if db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'Stages'").fetchone() is None:
+        return [ ]
+    return [ row[0] for row in db.execute('SELECT name FROM Stages ORDER BY rowid') ]
+
+class SaveState:
+    """Tracks which layers of the data model need to be written to a save file
+
+    A layer is any object with a ``saveToDB()`` method (:py:class:`ShoreModel`,
+    :py:class:`HydrologyNetwork`, :py:class:`TerrainHoneycomb`, or
+    :py:class:`Terrain`). :py:meth:`save` only writes a layer if it has not
+    been written yet, or if it has been marked as changed since. Layers are
+    identified by the object, so a layer that is replaced by a new object
+    is written again.
+
+    The layers cannot tell when they are modified, so the code that
+    modifies a layer must call :py:meth:`markDirty`.
+
+    :param db: The connection to the save file
+    :type db: sqlite3.Connection
+    """
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        # id(layer) -> (layer, columns). columns is None if the whole layer
+        # must be written, or the set of columns that have changed. The
+        # layer is kept so that its ID cannot be reused
+        self.layers: typing.Dict[int, typing.Tuple[typing.Any, typing.Set[str]]] = { }
+    def markDirty(self, layer: typing.Any, column: str=None) -> None:
+        """Records that a layer has changed since it was saved
+
+        :param layer: The layer
+        :param column: If only one column of the layer has changed, the name of that column. Only ``'elevation'`` of :py:class:`Terrain` is supported
+        :type column: str
+        """
+        if id(layer) not in self.layers:
+            # it has never been saved, so it will be written in full anyway
+            return
+        _, columns = self.layers[id(layer)]
+        if column is None or columns is None:
+            self.layers[id(layer)] = (layer, None)
+        else:
+            columns.add(column)
+    def markClean(self, *layers: typing.Any) -> None:
+        """Records that a layer is already in the save file as it is
+
+        This is for layers that were loaded from the save file.
+
+        :param layers: The layers
+        """
+        for layer in layers:
+            self.layers[id(layer)] = (layer, set())
+    def isDirty(self, layer: typing.Any) -> bool:
+        """Determines whether a layer needs to be saved
+
+        :param layer: The layer
+        :return: True if the layer has never been saved, or has changed since
+        :rtype: bool
+        """
+        if id(layer) not in self.layers:
+            return True
+        _, columns = self.layers[id(layer)]
+        return columns is None or len(columns) > 0
+    def save(self, *layers: typing.Any) -> None:
+        """Writes the layers that need to be written
+
+        :param layers: The layers
+        """
+        for layer in layers:
+            if not self.isDirty(layer):
+                continue
+
+            _, columns = self.layers.get(id(layer), (layer, None))
+            if columns is not None and columns == { 'elevation' } and hasattr(layer, 'saveElevationsToDB'):
+                layer.saveElevationsToDB(self.db)
+            else:
+                layer.saveToDB(self.db)
+
+            self.layers[id(layer)] = (layer, set())
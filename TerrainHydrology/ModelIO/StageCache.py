@@ -0,0 +1,120 @@
+"""An on-disk cache of the stages of generation
+
+When a stage of :py:func:`GeneratorClassic.generateClassic` completes, the
+save file contains everything that the following stages need (see
+:py:func:`SaveFile.markStageComplete`). A :class:`StageCache` keeps a copy
+of the save file at that point, under a fingerprint of everything that
+went into the stage and the stages before it. A later run whose inputs
+have the same fingerprint starts from the copy and only runs the stages
+that follow.
+
+This is what makes parameter sweeps cheap: if only a terrain parameter
+changes, the hydrology network and the honeycomb are reused.
+"""
+
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import sqlite3
+import typing
+
+from TerrainHydrology.ModelIO import ColumnarCache
+
+#: Change this when a stage changes in a way that invalidates cached stages
+stageCacheVersion = 1
+
+def fingerprint(previous: str, parameters: typing.Dict[str, typing.Any], files: typing.List[str]=None) -> str:
+    """Computes the fingerprint of the inputs of a stage
+
+    :param previous: The fingerprint of the stage before, or None for the first stage
+    :type previous: str
+    :param parameters: The parameters of the stage. They must be serializable as JSON
+    :type parameters: dict[str, Any]
+    :param files: The input files of the stage. Their contents, not their paths, are fingerprinted
+    :type files: list[str]
+    :return: The fingerprint, as a hexadecimal string
+    :rtype: str
+    """
+    inputs = {
+        'version': stageCacheVersion,
+        'previous': previous,
+        'parameters': parameters,
+        'files': [ ColumnarCache.contentHash(path) for path in (files if files is not None else [ ]) ]
+    }
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+class StageCache:
+    """A directory of save files, each saved just after a stage was completed
+
+    Several processes may use the same directory at once. Entries are
+    written to a temporary file first, so an entry is either complete or
+    absent.
+
+    :param directory: The directory that holds the cache. It is created if it does not exist
+    :type directory: str
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    def path(self, fingerprint: str) -> str:
+        """The path of the entry for a fingerprint
+
+        :param fingerprint: The fingerprint of the stage
+        :type fingerprint: str
+        :return: The path to the cached save file
+        :rtype: str
+        """
+        return os.path.join(self.directory, f'{fingerprint}.db')
+    def contains(self, fingerprint: str) -> bool:
+        """Determines whether a stage is cached
+
+        :param fingerprint: The fingerprint of the stage
+        :type fingerprint: str
+        :return: True if the stage is cached
+        :rtype: bool
+        """
+        return os.path.exists(self.path(fingerprint))
+    def store(self, fingerprint: str, db: sqlite3.Connection) -> None:
+        """Copies a save file into the cache
+
+        The copy is made with SQLite's backup API, so the connection can
+        stay open. There must be no open transaction.
+
+        :param fingerprint: The fingerprint of the stage that was just completed
+        :type fingerprint: str
+        :param db: The connection to the save file
+        :type db: sqlite3.Connection
+        """
+        temporaryPath = f'{self.path(fingerprint)}.{os.getpid()}.tmp'
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+
+        copy = sqlite3.connect(temporaryPath)
+        try:
+            db.backup(copy)
+        finally:
+            copy.close()
+
+        os.replace(temporaryPath, self.path(fingerprint))
+    def restore(self, fingerprint: str, dbPath: str) -> bool:
+        """Copies a cached save file to a given path, replacing whatever is there
+
+        Any write-ahead log left next to the old file is removed, so that it
+        is not applied to the copy.
+
+        :param fingerprint: The fingerprint of the stage
+        :type fingerprint: str
+        :param dbPath: Where to put the save file
+        :type dbPath: str
+        :return: True if the stage was cached, False if nothing was copied
+        :rtype: bool
+        """
+        if not self.contains(fingerprint):
+            return False
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(dbPath + suffix):
+                os.remove(dbPath + suffix)
+        shutil.copyfile(self.path(fingerprint), dbPath)
+        return True
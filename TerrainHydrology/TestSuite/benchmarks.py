@@ -0,0 +1,351 @@
+"""Benchmarks for the generator and the renderer
+
+These are not tests. They build synthetic inputs or models of a given size
+and time how long it takes to process them.
+
+:py:func:`benchmarkPipeline` runs the whole pipeline on a synthetic island,
+and is what ``hydrology2.py benchmark`` runs. Its results are written to a
+JSON file that can be compared with the results from another commit or
+machine. :py:func:`benchmarkSave` only times writing the save file. Run it
+with
+
+.. code-block:: bash
+
+   python -m TerrainHydrology.TestSuite.benchmarks
+"""
+
+import argparse
+import json
+import os
+import os.path
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+import numpy as np
+import shapefile
+import shapely.geometry as geom
+from PIL import Image
+
+from TerrainHydrology.DataModel.HydrologyNetwork import HydrologyNetwork
+from TerrainHydrology.DataModel.ShoreModel import ShoreModel
+from TerrainHydrology.DataModel.Terrain import Terrain
+from TerrainHydrology.DataModel import TerrainHoneycombFunctions
+from TerrainHydrology.ModelIO import SaveFile, NativeLibrary, Render
+from TerrainHydrology.GeneratorClassic import GeneratorClassic
+from TerrainHydrology.Utilities import Instrumentation
+
+#: The edge length that GeneratorClassic uses, in meters
+edgeLength = 2320.5
+
+def syntheticModel(numNodes: int, primitivesPerNode: int=10, seed: int=0) -> typing.Tuple[ShoreModel, HydrologyNetwork, Terrain]:
+    """Builds a round island with a river network and terrain primitives
+
+    The network is a tree in which each node has up to 3 children. Every
+    leaf has a river that flows to its parent. The shapes are not
+    realistic, but the amount of data is.
+
+    :param numNodes: The number of river nodes
+    :type numNodes: int
+    :param primitivesPerNode: The number of terrain primitives in each cell
+    :type primitivesPerNode: int
+    :param seed: The seed for the positions and elevations
+    :type seed: int
+    :return: The shore, the hydrology network, and the terrain primitives
+    :rtype: tuple[ShoreModel, HydrologyNetwork, Terrain]
+    """
+    rng = np.random.default_rng(seed)
+    radius = 100.0 * np.sqrt(numNodes)
+
+    angles = np.linspace(0, 2 * np.pi, 1000, endpoint=False)
+    shore = ShoreModel()
+    shore.loadFromArray(np.stack((np.cos(angles), np.sin(angles)), axis=1) * radius + radius)
+
+    parents = (np.arange(numNodes) - 1) // 3
+    nodeAngles = rng.random(numNodes) * 2 * np.pi
+    nodeRadii = np.sqrt(rng.random(numNodes)) * radius
+    positions = np.stack((np.cos(nodeAngles), np.sin(nodeAngles)), axis=1) * nodeRadii[:,np.newaxis] + radius
+    elevations = rng.random(numNodes) * 1000
+
+    hydrology = HydrologyNetwork()
+    hydrology.loadFromArrays(parents, positions, elevations, np.ones(numNodes), np.zeros(numNodes))
+    for node in hydrology.allNodes():
+        node.localWatershed = 1.0
+        node.inheritedWatershed = 1.0
+        node.flow = 1.0
+        if node.parent is not None and 3 * node.id + 1 >= numNodes:
+            node.rivers = [ geom.LineString([
+                (node.x(), node.y(), node.elevation),
+                ((node.x() + node.parent.x()) / 2, (node.y() + node.parent.y()) / 2, (node.elevation + node.parent.elevation) / 2),
+                (node.parent.x(), node.parent.y(), node.parent.elevation)
+            ]) ]
+
+    numTs = numNodes * primitivesPerNode
+    Ts = Terrain()
+    Ts.setPrimitives(
+        positions[np.arange(numTs) % numNodes] + rng.normal(0, 50, (numTs, 2)),
+        np.arange(numTs) % numNodes,
+        rng.random(numTs) * 1000
+    )
+
+    return shore, hydrology, Ts
+
+def benchmarkSave(numNodes: int=100000, bulkLoad: bool=True) -> typing.Dict[str, float]:
+    """Times how long it takes to write each layer of a synthetic model to a new save file
+
+    The terrain honeycomb is built from the synthetic model before the
+    timing starts.
+
+    :param numNodes: The number of river nodes in the model
+    :type numNodes: int
+    :param bulkLoad: Whether to use :py:func:`SaveFile.configureForBulkLoad`
+    :type bulkLoad: bool
+    :return: The number of seconds taken by each step
+    :rtype: dict[str, float]
+    """
+    shore, hydrology, Ts = syntheticModel(numNodes)
+    cells = TerrainHoneycombFunctions.initializeTerrainHoneycomb(shore, hydrology)
+
+    times = { }
+    with tempfile.TemporaryDirectory() as directory:
+        db = SaveFile.createDB(os.path.join(directory, 'benchmark.db'), 1.0, 100.0, 0.0, 0.0)
+        if bulkLoad:
+            SaveFile.configureForBulkLoad(db)
+
+        for name, save in [ ('shore', shore.saveToDB), ('hydrology', hydrology.saveToDB), ('honeycomb', cells.saveToDB), ('terrain', Ts.saveToDB), ('spatial indexes', SaveFile.createSpatialIndexes) ]:
+            start = time.perf_counter()
+            save(db)
+            times[name] = time.perf_counter() - start
+
+        db.close()
+
+    return times
+
+def syntheticInputs(directory: str, scale: float, imageSize: int=512, seed: int=0) -> typing.Dict[str, typing.Any]:
+    """Writes the inputs for a round, irregular island
+
+    The shoreline is a circle whose radius is perturbed by a few random
+    harmonics. The terrain slope rises toward the middle of the island,
+    and the river slope is uniform.
+
+    :param directory: The directory to write the inputs to
+    :type directory: str
+    :param scale: The mean radius of the island, in edge lengths
+    :type scale: float
+    :param imageSize: The width and height of the slope images, in pixels
+    :type imageSize: int
+    :param seed: The seed for the shape of the shoreline
+    :type seed: int
+    :return: The paths to the shapefile (``inputDomain``), the terrain slope (``inputTerrain``), and the river slope (``inputRiverSlope``), and the ``resolution`` of the images
+    :rtype: dict[str, Any]
+    """
+    rng = np.random.default_rng(seed)
+    radius = scale * edgeLength
+
+    # the island fills 80% of the images
+    resolution = 2.5 * radius / imageSize
+
+    angles = np.linspace(0, 2 * np.pi, max(360, int(20 * scale)), endpoint=False)
+    radii = np.full(len(angles), radius)
+    for harmonic in range(2, 7):
+        radii += radius * 0.08 / harmonic * np.cos(harmonic * angles + rng.random() * 2 * np.pi)
+    contour = np.stack((np.cos(angles) * radii, np.sin(angles) * radii), axis=1)
+
+    # pyshp expects the points in clockwise order, and the first and last
+    # points to be the same
+    contour = np.flip(contour, axis=0)
+    inputDomain = os.path.join(directory, f'island-{scale}.shp')
+    with shapefile.Writer(inputDomain, shapeType=5) as shp:
+        shp.field('name', 'C')
+        shp.poly([ np.concatenate((contour, contour[:1])).tolist() ])
+        shp.record('polygon0')
+
+    # image coordinates to distance from the center, in meters
+    pixels = (np.arange(imageSize) + 0.5 - imageSize * 0.5) * resolution
+    distance = np.hypot(pixels[np.newaxis,:], pixels[:,np.newaxis])
+
+    inputTerrain = os.path.join(directory, f'terrain-{scale}.png')
+    Image.fromarray((255 * np.clip(1 - distance / radius, 0, 1)).astype(np.uint8)).save(inputTerrain)
+    inputRiverSlope = os.path.join(directory, f'rivers-{scale}.png')
+    Image.fromarray(np.full((imageSize, imageSize), 64, dtype=np.uint8)).save(inputRiverSlope)
+
+    return { 'inputDomain': inputDomain, 'inputTerrain': inputTerrain, 'inputRiverSlope': inputRiverSlope, 'resolution': resolution }
+
+def nativeAvailable() -> bool:
+    """Determines whether the pipeline can run in native mode
+
+    :return: True if the native library or the native executables have been built
+    :rtype: bool
+    """
+    return NativeLibrary.isAvailable() or (os.path.exists(GeneratorClassic.buildRiversExe) and os.path.exists(GeneratorClassic.computePrimitivesExe))
+
+def benchmarkPipeline(scale: float, native: bool, numPoints: int=50, renderResolution: int=512, numProcs: int=4) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    """Generates and renders a synthetic island, and measures each stage
+
+    The measurements are taken from the reports that
+    :py:func:`GeneratorClassic.generateClassic` and
+    :py:func:`Render.renderDEM` write.
+
+    :param scale: The mean radius of the island, in edge lengths
+    :type scale: float
+    :param native: Whether to use the native module
+    :type native: bool
+    :param numPoints: The (rough) number of terrain primitives in each cell
+    :type numPoints: int
+    :param renderResolution: The width and height of the rendered image, in pixels
+    :type renderResolution: int
+    :param numProcs: The number of processes to use
+    :type numProcs: int
+    :return: For each stage, the number of items, their unit, the wall time, and the throughput
+    :rtype: dict[str, dict[str, Any]]
+    """
+    stages = { }
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = syntheticInputs(directory, scale)
+        outputFile = os.path.join(directory, 'benchmark.db')
+
+        GeneratorClassic.generateClassic(
+            **inputs,
+            numRivers=max(3, int(scale / 2)),
+            numProcs=numProcs,
+            numPoints=numPoints,
+            outputFile=outputFile,
+            lat=0.0,
+            lon=0.0,
+            accelerate=native
+        )
+        Render.renderDEM(outputFile, 0.0, 0.0, renderResolution, numProcs, directory + '/', False)
+
+        for reportPath in [ outputFile + '.metrics.json', os.path.join(directory, 'out-metrics.json') ]:
+            with open(reportPath, 'r') as reportFile:
+                report = json.load(reportFile)
+            for stage in report['stages']:
+                if stage['items'] is not None:
+                    stages[stage['name']] = { key: stage[key] for key in ('items', 'unit', 'wallSeconds', 'throughput') }
+
+    return stages
+
+def currentCommit() -> str:
+    """Gets the commit that the working tree is at
+
+    :return: The commit hash, or None if it cannot be determined
+    :rtype: str
+    """
+    try:
+        return subprocess.run([ 'git', 'rev-parse', 'HEAD' ], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runBenchmarks(scales: typing.List[float], modes: typing.List[str], numPoints: int=50, renderResolution: int=512, numProcs: int=4) -> typing.Dict[str, typing.Any]:
+    """Runs :py:func:`benchmarkPipeline` at several scales, in Python and/or native mode
+
+    Native mode is skipped (and recorded as skipped) if the native module
+    has not been built.
+
+    :param scales: The radii of the islands, in edge lengths
+    :type scales: list[float]
+    :param modes: ``'python'`` and/or ``'native'``
+    :type modes: list[str]
+    :param numPoints: The (rough) number of terrain primitives in each cell
+    :type numPoints: int
+    :param renderResolution: The width and height of the rendered image, in pixels
+    :type renderResolution: int
+    :param numProcs: The number of processes to use
+    :type numProcs: int
+    :return: The results, as they are written to the results file
+    :rtype: dict[str, Any]
+    """
+    results = [ ]
+    for scale in scales:
+        for mode in modes:
+            if mode == 'native' and not nativeAvailable():
+                results.append({ 'scale': scale, 'mode': mode, 'skipped': 'the native module has not been built' })
+                continue
+            print(f'Benchmarking scale {scale} in {mode} mode...')
+            results.append({ 'scale': scale, 'mode': mode, 'stages': benchmarkPipeline(scale, mode == 'native', numPoints, renderResolution, numProcs) })
+
+    return {
+        'commit': currentCommit(),
+        'machine': Instrumentation.machineDetails(),
+        'parameters': { 'numPoints': numPoints, 'renderResolution': renderResolution, 'numProcs': numProcs },
+        'results': results
+    }
+
+def compareResults(baseline: typing.Dict[str, typing.Any], results: typing.Dict[str, typing.Any]) -> typing.List[typing.Tuple[float, str, str, float, float]]:
+    """Matches the throughputs of two sets of results
+
+    :param baseline: The results to compare against
+    :type baseline: dict[str, Any]
+    :param results: The new results
+    :type results: dict[str, Any]
+    :return: A (scale, mode, stage, baseline throughput, new throughput) for every stage that is in both
+    :rtype: list[tuple[float, str, str, float, float]]
+    """
+    baselineStages = { (result['scale'], result['mode']): result.get('stages', { }) for result in baseline['results'] }
+    comparison = [ ]
+    for result in results['results']:
+        for stage, measurement in result.get('stages', { }).items():
+            old = baselineStages.get((result['scale'], result['mode']), { }).get(stage)
+            if old is not None and old['throughput'] is not None and measurement['throughput'] is not None:
+                comparison.append((result['scale'], result['mode'], stage, old['throughput'], measurement['throughput']))
+    return comparison
+
+#: The modules that each subcommand of hydrology2.py imports when it is dispatched
+subcommandModules = {
+    'generate': [ 'TerrainHydrology.GeneratorClassic.GeneratorClassic' ],
+    'export': [ 'TerrainHydrology.ModelIO.Export' ],
+    'render': [ 'TerrainHydrology.ModelIO.Render' ],
+    'img-to-shp': [ 'TerrainHydrology.Utilities.BitmapToShapefile' ],
+    'benchmark': [ 'TerrainHydrology.TestSuite.benchmarks' ],
+    'test': [ 'TerrainHydrology.TestSuite.tests' ]
+}
+
+def benchmarkStartup(repeats: int=5) -> typing.Dict[str, typing.Any]:
+    """Measures how long each subcommand of hydrology2.py takes to start
+
+    For each subcommand, two things are timed in fresh interpreters:
+    running ``hydrology2.py <subcommand> --help`` (which starts Python and
+    parses the arguments), and importing the modules that the subcommand
+    imports when it is dispatched. The median of several runs is taken.
+
+    :param repeats: The number of times to time each command
+    :type repeats: int
+    :return: The results, as they are written to the results file
+    :rtype: dict[str, Any]
+    """
+    rootDirectory = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+    def medianTime(command: typing.List[str]) -> float:
+        times = [ ]
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=rootDirectory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        return float(np.median(times))
+
+    subcommands = { }
+    for subcommand, modules in subcommandModules.items():
+        subcommands[subcommand] = {
+            'parseSeconds': medianTime([ sys.executable, 'hydrology2.py', subcommand, '--help' ]),
+            'importSeconds': medianTime([ sys.executable, '-c', '; '.join(f'import {module}' for module in modules) ])
+        }
+
+    return {
+        'commit': currentCommit(),
+        'machine': Instrumentation.machineDetails(),
+        'parameters': { 'repeats': repeats },
+        'subcommands': subcommands
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times how long it takes to save a synthetic model')
+    parser.add_argument('--num-nodes', type=int, default=100000, dest='numNodes', help='The number of river nodes in the model')
+    args = parser.parse_args()
+
+    print('step\tdefault\tbulk load')
+    default = benchmarkSave(args.numNodes, bulkLoad=False)
+    bulk = benchmarkSave(args.numNodes, bulkLoad=True)
+    for step in default:
+        print(f'{step}\t{default[step]:.3f}\t{bulk[step]:.3f}')
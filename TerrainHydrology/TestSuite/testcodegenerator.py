@@ -18,6 +18,8 @@ class RasterDataMock:
         self.value = value
     def __getitem__(self, loc: typing.Tuple[float,float]) -> float:
         return self.value
+    def sample(self, points: np.ndarray) -> np.ndarray:
+        return np.full(len(points), self.value, dtype=np.float64)
 
 def createTestImage():
     """This creates the hexagon image. It actually saves it as a file called "imageFile.png"
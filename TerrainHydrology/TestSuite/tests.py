@@ -4,8 +4,19 @@ import unittest
 from unittest.mock import Mock
 
 import io
+import multiprocessing
+import json
+import time
+import ctypes
+import sqlite3
+import struct
+import tempfile
+import numpy as np
+import scipy.spatial.distance
+from scipy.spatial import cKDTree, Voronoi
 
 import shapefile
+import shapely.geometry as geom
 from PIL import Image
 from PIL import ImageDraw
 from matplotlib.pyplot import draw
@@ -13,18 +24,25 @@ import os.path
 from typing import Dict, List
 import math
 
-from TerrainHydrology.GeneratorClassic.HydrologyFunctions import HydrologyParameters, isAcceptablePosition, selectNode, coastNormal, getLocalWatershed, getInheritedWatershed, getFlow
+from TerrainHydrology.GeneratorClassic.HydrologyFunctions import HydrologyParameters, isAcceptablePosition, selectNode, coastNormal, getLocalWatershed, getInheritedWatershed, getFlow, computeWatersheds
 from TerrainHydrology.DataModel.ShoreModel import ShoreModel
 from TerrainHydrology.DataModel.HydrologyNetwork import HydrologyNetwork, HydroPrimitive
 from TerrainHydrology.DataModel.TerrainHoneycomb import TerrainHoneycomb, Q, Edge
 from TerrainHydrology.DataModel.Terrain import Terrain, T
-from TerrainHydrology.Utilities.Math import Point, edgeIntersection, segments_intersect_tuple, polygonArea
-from TerrainHydrology.DataModel.TerrainPrimitiveFunctions import computePrimitiveElevation
+from TerrainHydrology.Utilities.Math import Point, edgeIntersection, segments_intersect_tuple, polygonArea, polygonAreas, pointInPolygon, pointsInPolygon
+from TerrainHydrology.DataModel.TerrainPrimitiveFunctions import computePrimitiveElevation, initializeTerrain
+from TerrainHydrology.DataModel.poisson import PoissonGenerator, min_dist_squared, bridson_sample
 from TerrainHydrology.DataModel.RiverInterpolationFunctions import computeRivers
-from TerrainHydrology.DataModel.TerrainHoneycombFunctions import orderVertices, orderEdges, orderCreatedEdges, hasRiver, processRidge, getVertex0, getVertex1, ridgesToPoints, findIntersectingShoreSegment, initializeTerrainHoneycomb
-from TerrainHydrology.ModelIO.SaveFile import createDB
+from TerrainHydrology.DataModel.TerrainHoneycombFunctions import orderVertices, orderEdges, orderCreatedEdges, hasRiver, processRidge, getVertex0, getVertex1, ridgesToPoints, findIntersectingShoreSegment, findIntersectingShoreSegments, initializeTerrainHoneycomb, getRidgeElevation, setRidgeElevations, precomputeShoreTests
+from TerrainHydrology.ModelIO.SaveFile import createDB, openDB, createRiverSlopeRaster, SaveState, markStageComplete, completedStages, configureForCheckpoints, finishCheckpoints
+from TerrainHydrology.ModelIO.RasterData import RasterData, cachePath
+from TerrainHydrology.ModelIO import NativeProtocol, NativeLibrary, ColumnarCache, StageCache
+from TerrainHydrology.GeneratorClassic.GeneratorClassic import sweepVariants, generateClassic
+from TerrainHydrology.Utilities.Instrumentation import StageReport
+from TerrainHydrology.Utilities import Profiling
+from TerrainHydrology.TestSuite import benchmarks
 
-from TerrainHydrology.TestSuite.testcodegenerator import getPredefinedObjects0
+from TerrainHydrology.TestSuite.testcodegenerator import getPredefinedObjects0, RasterDataMock
 
 class ShapefileShoreTests(unittest.TestCase):
     def setUp(self):
@@ -63,6 +81,83 @@ class ShapefileShoreTests(unittest.TestCase):
         os.remove('inputShape.dbf')
         os.remove('inputShape.shx')
 
+class ShoreSegmentIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        angles = np.linspace(0, 2 * np.pi, 2000, endpoint=False)
+        radii = 1000 * (1 + 0.3 * np.sin(7 * angles) + 0.05 * rng.random(len(angles)))
+        self.shore = ShoreModel()
+        self.shore.loadFromArray(np.stack((np.cos(angles), np.sin(angles)), axis=1) * radii[:,np.newaxis])
+
+        self.lines = [ ]
+        for _ in range(200):
+            p0 = rng.uniform(-1400, 1400, 2)
+            p1 = p0 + rng.normal(0, 150, 2)
+            self.lines.append(((p0[0], p0[1]), (p1[0], p1[1])))
+
+    def test_candidatesIncludeIntersections(self) -> None:
+        for p0, p1 in self.lines:
+            candidates = set(self.shore.segmentCandidates(p0, p1).tolist())
+            for index in range(len(self.shore)):
+                if edgeIntersection(self.shore[index], self.shore[(index+1) % len(self.shore)], p0, p1) is not None:
+                    self.assertIn(index, candidates)
+
+    def test_sameAsSearch(self) -> None:
+        # an object that is not a ShoreModel is searched outward from p0
+        class UnindexedShore:
+            def __init__(self, shore: ShoreModel):
+                self.shore = shore
+            def __getitem__(self, index: int):
+                return self.shore[index]
+            def __len__(self) -> int:
+                return len(self.shore)
+            def closestNPoints(self, loc, n: int):
+                return self.shore.closestNPoints(loc, n)
+
+        unindexed = UnindexedShore(self.shore)
+        p0s = np.array([ p0 for p0, p1 in self.lines ])
+        p1s = np.array([ p1 for p0, p1 in self.lines ])
+        found = findIntersectingShoreSegments(p0s, p1s, self.shore)
+        self.assertTrue(any(segment is not None for segment in found))
+        for (p0, p1), segment in zip(self.lines, found):
+            self.assertEqual(findIntersectingShoreSegment(p0, p1, unindexed), segment)
+
+    def test_candidatePairs(self) -> None:
+        p0s = np.array([ p0 for p0, p1 in self.lines ])
+        p1s = np.array([ p1 for p0, p1 in self.lines ])
+        lines, segments, skipped = self.shore.segmentIndex.candidatePairs(p0s, p1s)
+
+        self.assertFalse(skipped.any())
+        for line, (p0, p1) in enumerate(self.lines):
+            self.assertTrue(set(self.shore.segmentCandidates(p0, p1).tolist()) <= set(segments[lines == line].tolist()))
+
+    def test_batchLongLines(self) -> None:
+        p0s = np.array([ [ 0.0, 0.0 ], [ -5000.0, -3000.0 ], [ 5000.0, 5000.0 ] ])
+        p1s = np.array([ [ 5000.0, 0.0 ], [ 5000.0, 4000.0 ], [ 6000.0, 5000.0 ] ])
+
+        # the diagonal line's bounding box covers the whole grid, so it is
+        # searched on its own
+        self.assertEqual(self.shore.segmentIndex.candidatePairs(p0s, p1s)[2].tolist(), [ False, True, False ])
+        self.assertEqual(findIntersectingShoreSegments(p0s, p1s, self.shore), [ findIntersectingShoreSegment(tuple(p0), tuple(p1), self.shore) for p0, p1 in zip(p0s, p1s) ])
+
+    def test_areOnLand(self) -> None:
+        # some of the points are outside of the grid
+        points = np.random.default_rng(1).uniform(-2000, 2000, (2000, 2))
+        onLand = self.shore.areOnLand(points)
+
+        self.assertTrue(onLand.any() and not onLand.all())
+        self.assertEqual(onLand.tolist(), pointsInPolygon(points, self.shore.contour).tolist())
+        self.assertEqual(onLand.tolist(), [ self.shore.isOnLand(point) for point in points ])
+
+    def test_outsideGrid(self) -> None:
+        self.assertEqual(0, len(self.shore.segmentCandidates((5000, 5000), (6000, 5000))))
+        self.assertIsNone(findIntersectingShoreSegment((5000, 5000), (6000, 5000), self.shore))
+
+    def test_crossesWholeShore(self) -> None:
+        segment = findIntersectingShoreSegment((0, 0), (5000, 0), self.shore)
+        self.assertIsNotNone(segment)
+        self.assertTrue(segment[0] in (0, len(self.shore)-1))
+
 class HydrologyFunctionTests(unittest.TestCase):
     def setUp(self):
         #create shore
@@ -172,6 +267,27 @@ class ExtendedHydrologyFunctionTests(unittest.TestCase):
         self.assertEqual(getFlow(node.inheritedWatershed), expectedFlow)
         pass
 
+    def test_computeWatershedsTest(self) -> None:
+        expected = { }
+        for node in self.hydrology.dfsPostorderNodes():
+            node.localWatershed = getLocalWatershed(node, self.cells)
+            node.inheritedWatershed = getInheritedWatershed(node, self.hydrology)
+            node.flow = getFlow(node.inheritedWatershed)
+            expected[node.id] = (node.localWatershed, node.inheritedWatershed, node.flow)
+
+        for node in self.hydrology.allNodes():
+            node.localWatershed = 0
+            node.inheritedWatershed = 0
+            node.flow = 0
+
+        computeWatersheds(self.hydrology, self.cells)
+
+        for node in self.hydrology.allNodes():
+            localWatershed, inheritedWatershed, flow = expected[node.id]
+            self.assertAlmostEqual(node.localWatershed, localWatershed, delta=1e-6)
+            self.assertAlmostEqual(node.inheritedWatershed, inheritedWatershed, delta=1e-3)
+            self.assertAlmostEqual(node.flow, flow, delta=1e-3)
+
 class MathTests(unittest.TestCase):
     def setUp(self) -> None:
         # self.edgeLength, self.shore, self.hydrology, self.cells = getPredefinedObjects0()
@@ -205,6 +321,28 @@ class MathTests(unittest.TestCase):
 
         self.assertEqual(area, 170)
 
+    def test_polygon_areas_test_0(self) -> None:
+        square = [(0,0), (10,0), (10,10), (0,10)]
+        star = [(10,20), (0, 30), (-10, 20), (-1, 20), (-1, 10), (-10, 10), (0, 5), (10, 10), (1, 10), (1, 20)]
+        triangle = [(0,0), (0,4), (3,0)]
+
+        areas = polygonAreas(square + star + triangle, [0, 4, 14, 17])
+
+        self.assertEqual(len(areas), 3)
+        self.assertAlmostEqual(areas[0], 100)
+        self.assertAlmostEqual(areas[1], 170)
+        self.assertAlmostEqual(areas[2], 6)
+
+    def test_points_in_polygon_test_0(self) -> None:
+        star = [(10,20), (0, 30), (-10, 20), (-1, 20), (-1, 10), (-10, 10), (0, 5), (10, 10), (1, 10), (1, 20)]
+        points = np.random.default_rng(2).random((500,2)) * [24, 30] + [-12, 2]
+
+        inside = pointsInPolygon(points, star)
+
+        self.assertEqual(inside.shape, (500,))
+        for point, isInside in zip(points, inside):
+            self.assertEqual(isInside, pointInPolygon(point, star))
+
     def tearDown(self) -> None:
         # os.remove('imageFile.png')
         pass
@@ -906,6 +1044,295 @@ class HoneycombTests(unittest.TestCase):
     def tearDown(self) -> None:
         pass
 
+class BatchedHoneycombTests(unittest.TestCase):
+    def cellsSummary(self, cells: TerrainHoneycomb) -> tuple:
+        position = lambda q: (float(q.position[0]), float(q.position[1]))
+        return (
+            [ position(q) for q in cells.qs ],
+            [ sorted(q.nodes) for q in cells.qs ],
+            {
+                nodeID: [ (position(edge.Q0), position(edge.Q1), edge.hasRiver, edge.isShore, None if edge.shoreSegment is None else tuple(int(idx) for idx in edge.shoreSegment)) for edge in edges ]
+                for nodeID, edges in cells.cellsEdges.items()
+            },
+            { nodeID: (position(edge.Q0), position(edge.Q1)) for nodeID, edge in cells.cellsDownstreamRidges.items() }
+        )
+
+    def test_sameAsSequential(self) -> None:
+        _, shore, hydrology, _ = getPredefinedObjects0()
+        sequential = initializeTerrainHoneycomb(shore, hydrology, batchShoreTests=False)
+
+        _, shore, hydrology, _ = getPredefinedObjects0()
+        batched = initializeTerrainHoneycomb(shore, hydrology)
+
+        self.assertEqual(self.cellsSummary(batched), self.cellsSummary(sequential))
+
+    def test_precomputeShoreTests(self) -> None:
+        _, shore, hydrology, _ = getPredefinedObjects0()
+        corners = [ (-shore.realShape[0], -shore.realShape[1]), (-shore.realShape[0], shore.realShape[1]), (shore.realShape[0], shore.realShape[1]), (shore.realShape[0], -shore.realShape[1]) ]
+        vor = Voronoi([ node.position for node in hydrology.allNodes() ] + corners, qhull_options='Qbb Qc Qz Qx')
+
+        precomputeShoreTests(vor, shore)
+
+        self.assertEqual(list(vor.vertexOnLand), [ shore.isOnLand(vertex) for vertex in vor.vertices ])
+        self.assertGreater(len(vor.ridgeShoreSegments), 0)
+        for ridgeID, (landVertex, segment) in vor.ridgeShoreSegments.items():
+            self.assertTrue(vor.vertexOnLand[landVertex])
+            self.assertIsNotNone(segment)
+
+class RidgeElevationTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.edgeLength, self.shore, self.hydrology, self.cells = getPredefinedObjects0()
+
+    def test_setRidgeElevations0(self) -> None:
+        terrainSlope = RasterDataMock(200)
+
+        expected = [ getRidgeElevation(q, self.hydrology, terrainSlope, 0.5) for q in self.cells.allQs() ]
+
+        setRidgeElevations(self.cells, self.hydrology, terrainSlope, 0.5)
+
+        for q, elevation in zip(self.cells.allQs(), expected):
+            self.assertAlmostEqual(q.elevation, elevation, delta=1e-6)
+
+    def tearDown(self) -> None:
+        pass
+
+class RasterDataTests(unittest.TestCase):
+    def setUp(self) -> None:
+        image = Image.new('L', (40, 20))
+        drawer = ImageDraw.Draw(image)
+        drawer.rectangle([(20, 0), (39, 9)], 200)
+        drawer.rectangle([(0, 10), (19, 19)], 100)
+
+        imageFile = io.BytesIO()
+        image.save(imageFile, format='PNG')
+        imageFile.seek(0)
+
+        self.raster = RasterData(imageFile, 10.0)
+
+    def test_sample0(self) -> None:
+        points = [ (55.0, 45.0), (-55.0, -45.0), (-155.0, 45.0), (195.0, -95.0) ]
+
+        values = self.raster.sample(points)
+
+        for point, value in zip(points, values):
+            self.assertEqual(self.raster[point], value)
+        self.assertEqual(values[0], 200)
+        self.assertEqual(values[1], 100)
+
+    def test_sample_out_of_range(self) -> None:
+        with self.assertRaises(IndexError):
+            self.raster.sample([ (0.0, 0.0), (1000.0, 0.0) ])
+
+    def test_sample_edge(self) -> None:
+        # within a pixel of the left and top edges, __getitem__ truncates to the first pixel
+        points = [ (-205.0, 45.0), (55.0, 105.0) ]
+
+        values = self.raster.sample(points)
+
+        for point, value in zip(points, values):
+            self.assertEqual(self.raster[point], value)
+
+    def test_cachePath(self) -> None:
+        self.assertNotEqual(cachePath('cache', os.path.join('a', 'slope.png')), cachePath('cache', os.path.join('b', 'slope.png')))
+        self.assertEqual('cache', os.path.dirname(cachePath('cache', os.path.join('a', 'slope.png'))))
+
+    def test_sample_bilinear(self) -> None:
+        # on a pixel center, interpolation gives the pixel's value
+        self.assertAlmostEqual(self.raster.sample([ (55.0, 45.0) ], bilinear=True)[0], 200)
+        # halfway between pixels of 0 and 200
+        self.assertAlmostEqual(self.raster.sample([ (0.0, 45.0) ], bilinear=True)[0], 100)
+        # where four pixels of 0, 200, 100, and 0 meet
+        self.assertAlmostEqual(self.raster.sample([ (0.0, 0.0) ], bilinear=True)[0], 75)
+
+    def test_toBinary(self) -> None:
+        binary = self.raster.toBinary()
+
+        self.assertEqual(len(binary), 40 * 20 * 4)
+        self.assertEqual(struct.unpack('!f', binary[20*4:21*4])[0], 200.0)
+        self.assertEqual(struct.unpack('!f', binary[(10*40)*4:(10*40+1)*4])[0], 100.0)
+
+    def test_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            imagePath = os.path.join(directory, 'raster.png')
+            cachePath = os.path.join(directory, 'raster.npy')
+            Image.fromarray(np.asarray(self.raster.array)).save(imagePath)
+
+            first = RasterData(imagePath, 10.0, cacheFileName=cachePath)
+            self.assertTrue(os.path.isfile(cachePath))
+
+            second = RasterData(imagePath, 10.0, cacheFileName=cachePath)
+            self.assertIsInstance(second.array, np.memmap)
+            self.assertTrue((first.array == second.array).all())
+            del second
+
+    def test_createRiverSlopeRaster(self) -> None:
+        db = sqlite3.connect(':memory:')
+        createRiverSlopeRaster(db, self.raster)
+
+        rows = db.execute('SELECT columns, rows, slope FROM RiverSlope').fetchall()
+        db.close()
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][0], 40)
+        self.assertEqual(rows[0][1], 20)
+        self.assertEqual(rows[0][2], self.raster.toBinary())
+
+    def tearDown(self) -> None:
+        pass
+
+class SaveStateTests(unittest.TestCase):
+    class LayerMock:
+        def __init__(self):
+            self.saves = [ ]
+        def saveToDB(self, db) -> None:
+            self.saves.append('all')
+        def saveElevationsToDB(self, db) -> None:
+            self.saves.append('elevation')
+
+    def setUp(self) -> None:
+        self.state = SaveState(None)
+        self.layer = SaveStateTests.LayerMock()
+
+    def test_savedOnce(self) -> None:
+        self.state.save(self.layer)
+        self.state.save(self.layer)
+
+        self.assertEqual(self.layer.saves, [ 'all' ])
+        self.assertFalse(self.state.isDirty(self.layer))
+
+    def test_dirty(self) -> None:
+        self.state.save(self.layer)
+        self.state.markDirty(self.layer)
+        self.state.save(self.layer)
+
+        self.assertEqual(self.layer.saves, [ 'all', 'all' ])
+
+    def test_column(self) -> None:
+        self.state.save(self.layer)
+        self.state.markDirty(self.layer, 'elevation')
+        self.state.save(self.layer)
+
+        self.assertEqual(self.layer.saves, [ 'all', 'elevation' ])
+
+    def test_columnBeforeFirstSave(self) -> None:
+        self.state.markDirty(self.layer, 'elevation')
+        self.state.save(self.layer)
+
+        self.assertEqual(self.layer.saves, [ 'all' ])
+
+    def test_markClean(self) -> None:
+        self.state.markClean(self.layer)
+        self.state.save(self.layer)
+        self.state.markDirty(self.layer, 'elevation')
+        self.state.save(self.layer)
+
+        self.assertEqual(self.layer.saves, [ 'elevation' ])
+
+class StageTests(unittest.TestCase):
+    def setUp(self) -> None:
+        # the stages do not need SpatiaLite
+        self.db = sqlite3.connect(':memory:')
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+    def test_noStages(self) -> None:
+        self.assertEqual(completedStages(self.db), [ ])
+
+    def test_stages(self) -> None:
+        markStageComplete(self.db, 'rivers')
+        markStageComplete(self.db, 'honeycomb')
+        markStageComplete(self.db, 'rivers')
+
+        self.assertEqual(completedStages(self.db), [ 'honeycomb', 'rivers' ])
+
+class NativeProtocolTests(unittest.TestCase):
+    def test_writeTs(self) -> None:
+        Ts = Terrain()
+        Ts.setPrimitives(np.array([ (10.5, 5.25), (-20.0, 12.5) ]), np.array([ 0, 3 ]))
+
+        stream = io.BytesIO()
+        NativeProtocol.writeTs(stream, Ts)
+        binary = stream.getvalue()
+
+        self.assertEqual(len(binary), 8 + 2 * 16)
+        self.assertEqual(struct.unpack('!Q', binary[:8])[0], 2)
+        self.assertEqual(struct.unpack('!ffQ', binary[8:24]), (10.5, 5.25, 0))
+        self.assertEqual(struct.unpack('!ffQ', binary[24:40]), (-20.0, 12.5, 3))
+
+    def test_readTElevations(self) -> None:
+        stream = io.BytesIO(struct.pack('!fff', 1.5, 20.25, -3.0))
+
+        elevations = NativeProtocol.readTElevations(stream, 3)
+
+        self.assertEqual(list(elevations), [ 1.5, 20.25, -3.0 ])
+
+    def test_readTElevations_truncated(self) -> None:
+        stream = io.BytesIO(struct.pack('!ff', 1.5, 20.25))
+
+        with self.assertRaises(EOFError):
+            NativeProtocol.readTElevations(stream, 3)
+
+    def test_readProgress(self) -> None:
+        binary = b'\x2e' + struct.pack('!Q', 10) + b'\x2e' + struct.pack('!Q', 250) + b'\x21' + b'remaining'
+        stream = io.BytesIO(binary)
+
+        reported = [ ]
+        completed = NativeProtocol.readProgress(stream, reported.append)
+
+        self.assertEqual(completed, 250)
+        self.assertEqual(reported, [ 10, 250 ])
+        self.assertEqual(stream.read(), b'remaining')
+
+    def test_readProgress_unexpected(self) -> None:
+        with self.assertRaises(ValueError):
+            NativeProtocol.readProgress(io.BytesIO(b'\x00'))
+
+    def test_readHydrology(self) -> None:
+        binary = struct.pack('!Q', 3)
+        binary += struct.pack('!QqfffIq', 0, -1, 0.0, 0.0, 0.0, 2, 7)
+        binary += struct.pack('!QqfffIq', 1, 0, 10.0, 10.0, 10.0, 1, -1)
+        binary += struct.pack('!QqfffIq', 2, 0, 12.0, 10.0, 12.5, 1, -1)
+
+        hydrology = NativeProtocol.readHydrology(io.BytesIO(binary))
+
+        self.assertEqual(3, len(hydrology))
+        self.assertEqual([ 0 ], [ node.id for node in hydrology.allMouthNodes() ])
+        self.assertEqual(7, hydrology.node(0).contourIndex)
+        self.assertEqual(0, hydrology.node(1).parent.id)
+        self.assertEqual(0, hydrology.node(2).parent.id)
+        self.assertEqual((12.0, 10.0), hydrology.node(2).position)
+        self.assertEqual(12.5, hydrology.node(2).elevation)
+        self.assertEqual([ 2 ], hydrology.query_ball_point((12.0, 10.0), 1.0))
+
+class NativeLibraryTests(unittest.TestCase):
+    def test_isAvailable(self) -> None:
+        self.assertFalse(NativeLibrary.isAvailable('does/not/exist.so'))
+
+    def test_runWithProgress(self) -> None:
+        progress = ctypes.c_uint64(0)
+        def work():
+            for i in range(5):
+                progress.value += 1
+                time.sleep(0.01)
+            return 'done'
+
+        reported = [ ]
+        result = NativeLibrary.runWithProgress(work, progress, reported.append, interval=0.005)
+
+        self.assertEqual(result, 'done')
+        self.assertEqual(reported[-1], 5)
+        self.assertEqual(reported, sorted(reported))
+
+    def test_runWithProgressRaises(self) -> None:
+        progress = ctypes.c_uint64(0)
+        def work():
+            progress.value += 1
+            raise OSError('native call failed')
+
+        with self.assertRaisesRegex(OSError, 'native call failed'):
+            NativeLibrary.runWithProgress(work, progress, interval=0.005)
+
 class RiverTests(unittest.TestCase):
     def setUp(self) -> None:
         self.edgeLength, self.shore, self.hydrology, self.cells = getPredefinedObjects0()
@@ -947,6 +1374,336 @@ class RiverTests(unittest.TestCase):
     def tearDown(self) -> None:
         pass
 
+class PoissonGeneratorTests(unittest.TestCase):
+    def test_find_next_point(self) -> None:
+        generator = PoissonGenerator(False, False, seed=7)
+        points = np.array([[0.5,0.5]])
+
+        nextPoint = generator.find_next_point(points, 64)
+
+        # the point should be the farthest of the same candidates, evaluated one at a time
+        candidates = PoissonGenerator(False, False, seed=7).random_point(64)
+        best = max(candidates, key=lambda c: min_dist_squared(points, c))
+        self.assertTrue(np.array_equal(nextPoint, best))
+
+    def test_repeatable(self) -> None:
+        points0 = PoissonGenerator(True, False, seed=3).find_point_set(20, 2, 16, 1)
+        points1 = PoissonGenerator(True, False, seed=3).find_point_set(20, 2, 16, 1)
+
+        self.assertEqual(points0.shape, (20,2))
+        self.assertTrue(np.array_equal(points0, points1))
+
+    def test_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as cacheDir:
+            points0 = PoissonGenerator(True, False, seed=3).find_point_set(20, 2, 16, 1, cache_dir=cacheDir)
+            self.assertEqual(len(os.listdir(cacheDir)), 1)
+
+            # the cached pattern is returned, even if the generator's state differs
+            generator = PoissonGenerator(True, False, seed=3)
+            generator.random_point = None
+            points1 = generator.find_point_set(20, 2, 16, 1, cache_dir=cacheDir)
+            self.assertTrue(np.array_equal(points0, points1))
+
+            # different parameters get a different pattern
+            PoissonGenerator(True, False, seed=4).find_point_set(20, 2, 16, 1, cache_dir=cacheDir)
+            self.assertEqual(len(os.listdir(cacheDir)), 2)
+
+class BridsonSampleTests(unittest.TestCase):
+    def test_spacing(self) -> None:
+        points = bridson_sample(100, 50, 5, seed=3)
+
+        self.assertTrue(np.all(points >= 0))
+        self.assertTrue(np.all(points[:,0] < 100))
+        self.assertTrue(np.all(points[:,1] < 50))
+
+        # no two points are closer than the radius
+        self.assertGreaterEqual(np.min(scipy.spatial.distance.pdist(points)), 5)
+
+        # the sampling is maximal, so the whole rectangle is covered
+        gaps, _ = cKDTree(points).query(np.random.default_rng(0).random((1000,2)) * [100, 50])
+        self.assertLess(np.max(gaps), 10)
+
+    def test_repeatable(self) -> None:
+        self.assertTrue(np.array_equal(bridson_sample(40, 40, 3, seed=1), bridson_sample(40, 40, 3, seed=1)))
+
+class InitializeTerrainTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.edgeLength, self.shore, self.hydrology, self.cells = getPredefinedObjects0()
+
+    def test_bridson(self) -> None:
+        terrain = initializeTerrain(self.hydrology, self.cells, 20, seed=5, distribution='bridson')
+
+        self.assertGreater(len(terrain), 0)
+        for t in terrain.allTs():
+            self.assertTrue(self.cells.isInCell(t.position, t.cell))
+
+    def test_unknownDistribution(self) -> None:
+        with self.assertRaises(ValueError):
+            initializeTerrain(self.hydrology, self.cells, 20, distribution='hexagonal')
+
+class TerrainStorageTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.Ts = Terrain()
+        self.Ts.setPrimitives(
+            np.array([ (0.0, 1.0), (2.0, 3.0), (4.0, 5.0), (6.0, 7.0), (8.0, 9.0) ]),
+            np.array([ 4, 1, 4, 2, 1 ])
+        )
+
+    def test_cellSorted(self) -> None:
+        self.assertEqual(list(self.Ts.cells), [ 1, 1, 2, 4, 4 ])
+
+        # the order within a cell is preserved
+        self.assertEqual(self.Ts.cellSlice(4), slice(3, 5))
+        self.assertEqual([ t.position for t in self.Ts.cellTs(4) ], [ (0.0, 1.0), (4.0, 5.0) ])
+        self.assertEqual(self.Ts.cellSlice(3), slice(0, 0))
+
+    def test_view(self) -> None:
+        t = self.Ts.getT(2)
+
+        self.assertEqual(t.cell, 2)
+        self.assertIsNone(t.elevation)
+
+        t.elevation = 12.5
+        self.assertEqual(self.Ts.elevations[2], 12.5)
+
+    def test_query_ball_point(self) -> None:
+        ts = self.Ts.query_ball_point((4.0, 5.0), 1.0)
+
+        self.assertEqual([ t.position for t in ts ], [ (4.0, 5.0) ])
+
+class ColumnarCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.edgeLength, self.shore, self.hydrology, self.cells = getPredefinedObjects0()
+        self.hydrology.node(3).rivers = [ geom.LineString([ (0, 0, 10), (5, 5, 20), (10, 0, 30) ]) ]
+
+        self.Ts = Terrain()
+        self.Ts.setPrimitives(np.array([ (0.0, 1.0), (2.0, 3.0), (4.0, 5.0) ]), np.array([ 2, 0, 2 ]), np.array([ 1.5, np.nan, 3.5 ]))
+
+        # the cache only depends on the bytes of the save file
+        self.directory = tempfile.TemporaryDirectory()
+        self.dbPath = os.path.join(self.directory.name, 'model.db')
+        with open(self.dbPath, 'wb') as file:
+            file.write(b'save file')
+
+        ColumnarCache.writeCache(self.dbPath, self.shore, self.hydrology, self.Ts)
+
+    def test_terrain(self) -> None:
+        Ts = ColumnarCache.loadTerrain(self.dbPath, None)
+
+        # the columns are read-only memory maps
+        self.assertFalse(Ts.positions.flags.writeable)
+        self.assertTrue(np.array_equal(Ts.positions, self.Ts.positions))
+        self.assertEqual(list(Ts.cells), [ 0, 2, 2 ])
+        self.assertEqual(Ts.cellSlice(2), slice(1, 3))
+        self.assertIsNone(Ts.getT(0).elevation)
+        self.assertEqual(Ts.getT(2).elevation, 3.5)
+
+    def test_hydrology(self) -> None:
+        hydrology = ColumnarCache.loadHydrology(self.dbPath, None)
+
+        self.assertEqual(len(hydrology), len(self.hydrology))
+        for node in self.hydrology.allNodes():
+            loaded = hydrology.node(node.id)
+            self.assertEqual(loaded.position, node.position)
+            self.assertEqual(loaded.elevation, node.elevation)
+            self.assertEqual(loaded.parent.id if loaded.parent is not None else None, node.parent.id if node.parent is not None else None)
+            self.assertEqual(len(loaded.rivers), len(node.rivers))
+        self.assertEqual(list(hydrology.node(3).rivers[0].coords), [ (0, 0, 10), (5, 5, 20), (10, 0, 30) ])
+
+    def test_shore(self) -> None:
+        shore = ColumnarCache.loadShore(self.dbPath, None)
+
+        self.assertTrue(np.array_equal(shore.contour, self.shore.contour))
+        self.assertEqual(shore.realShape, self.shore.realShape)
+
+    def test_invalidated(self) -> None:
+        self.assertTrue(ColumnarCache.isValid(self.dbPath, 'terrain'))
+
+        with open(self.dbPath, 'ab') as file:
+            file.write(b' that has changed')
+
+        self.assertFalse(ColumnarCache.isValid(self.dbPath, 'terrain'))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+class StageCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.inputPath = os.path.join(self.directory.name, 'input.png')
+        with open(self.inputPath, 'wb') as file:
+            file.write(b'input')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_fingerprint(self) -> None:
+        fingerprint = StageCache.fingerprint(None, { 'a': 1, 'b': 2.0 }, [ self.inputPath ])
+
+        self.assertEqual(fingerprint, StageCache.fingerprint(None, { 'b': 2.0, 'a': 1 }, [ self.inputPath ]))
+        self.assertNotEqual(fingerprint, StageCache.fingerprint(None, { 'a': 1, 'b': 3.0 }, [ self.inputPath ]))
+        self.assertNotEqual(fingerprint, StageCache.fingerprint('previous', { 'a': 1, 'b': 2.0 }, [ self.inputPath ]))
+
+    def test_fingerprintFileContents(self) -> None:
+        fingerprint = StageCache.fingerprint(None, { }, [ self.inputPath ])
+
+        with open(self.inputPath, 'wb') as file:
+            file.write(b'changed')
+
+        self.assertNotEqual(fingerprint, StageCache.fingerprint(None, { }, [ self.inputPath ]))
+
+    def test_storeRestore(self) -> None:
+        cache = StageCache.StageCache(os.path.join(self.directory.name, 'cache'))
+        db = sqlite3.connect(os.path.join(self.directory.name, 'model.db'))
+        with db:
+            db.execute('CREATE TABLE Numbers (value INTEGER)')
+            db.execute('INSERT INTO Numbers (value) VALUES (42)')
+
+        self.assertFalse(cache.restore('abc', os.path.join(self.directory.name, 'restored.db')))
+        cache.store('abc', db)
+        db.close()
+        self.assertTrue(cache.restore('abc', os.path.join(self.directory.name, 'restored.db')))
+
+        restored = sqlite3.connect(os.path.join(self.directory.name, 'restored.db'))
+        self.assertEqual(restored.execute('SELECT value FROM Numbers').fetchall(), [ (42,) ])
+        restored.close()
+
+    def test_restoreWithCheckpoints(self) -> None:
+        cache = StageCache.StageCache(os.path.join(self.directory.name, 'cache'))
+        db = sqlite3.connect(os.path.join(self.directory.name, 'model.db'))
+        configureForCheckpoints(db)
+        self.assertEqual(db.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        with db:
+            db.execute('CREATE TABLE Numbers (value INTEGER)')
+            db.execute('INSERT INTO Numbers (value) VALUES (42)')
+        cache.store('abc', db)
+        finishCheckpoints(db)
+        self.assertEqual(db.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+        db.close()
+
+        # a log left by a run that crashed belongs to the old file
+        restoredPath = os.path.join(self.directory.name, 'restored.db')
+        with open(restoredPath + '-wal', 'wb') as log:
+            log.write(b'stale')
+        self.assertTrue(cache.restore('abc', restoredPath))
+        self.assertFalse(os.path.exists(restoredPath + '-wal'))
+
+        restored = sqlite3.connect(restoredPath)
+        self.assertEqual(restored.execute('SELECT value FROM Numbers').fetchall(), [ (42,) ])
+        restored.close()
+
+class StageReportTests(unittest.TestCase):
+    def test_stages(self) -> None:
+        liveLog = io.StringIO()
+        report = StageReport('test', { 'numPoints': 50 }, liveLog)
+
+        report.startStage('first')
+        sum(range(100000))
+        report.endStage(1000, 'nodes', reused=False)
+        report.startStage('second')
+
+        with tempfile.TemporaryDirectory() as directory:
+            report.write(os.path.join(directory, 'metrics.json'))
+            with open(os.path.join(directory, 'metrics.json'), 'r') as reportFile:
+                written = json.load(reportFile)
+
+        self.assertEqual(written['parameters'], { 'numPoints': 50 })
+        self.assertEqual([ stage['name'] for stage in written['stages'] ], [ 'first', 'second' ])
+        first = written['stages'][0]
+        self.assertGreater(first['wallSeconds'], 0)
+        self.assertGreater(first['peakRSSSoFarBytes'], 0)
+        self.assertGreaterEqual(first['peakRSSGrowthBytes'], 0)
+        self.assertLessEqual(first['peakRSSGrowthBytes'], first['peakRSSSoFarBytes'])
+        self.assertAlmostEqual(first['throughput'], 1000 / first['wallSeconds'])
+        self.assertFalse(first['reused'])
+        self.assertIsNone(written['stages'][1]['throughput'])
+        self.assertNotIn('incomplete', first)
+        self.assertTrue(written['stages'][1]['incomplete'])
+        self.assertIn('first', liveLog.getvalue())
+        self.assertIn('1000 nodes', liveLog.getvalue())
+
+class BenchmarkTests(unittest.TestCase):
+    def test_syntheticInputs(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            inputs = benchmarks.syntheticInputs(directory, 10)
+            shore = ShoreModel(inputs['inputDomain'])
+            terrainSlope = RasterData(inputs['inputTerrain'], inputs['resolution'])
+            riverSlope = RasterData(inputs['inputRiverSlope'], inputs['resolution'])
+
+            # the island is about 20 edge lengths across, and inside the images
+            self.assertAlmostEqual(shore.realShape[0] / benchmarks.edgeLength, 20, delta=3)
+            self.assertLess(np.abs(shore.contour).max(), terrainSlope.xSize * terrainSlope.resolution / 2)
+            # the signed (shoelace) area is positive if the contour is counterclockwise
+            x, y = shore.contour[:,0], shore.contour[:,1]
+            self.assertGreater(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y) / 2, 0)
+            self.assertGreater(terrainSlope[(0, 0)], terrainSlope[tuple(shore.contour[0] * 0.9)])
+            self.assertEqual(riverSlope[(0, 0)], riverSlope[tuple(shore.contour[0] * 0.9)])
+
+    def test_compareResults(self) -> None:
+        baseline = { 'results': [
+            { 'scale': 10, 'mode': 'python', 'stages': { 'rivers': { 'throughput': 100.0 }, 'render': { 'throughput': 5.0 } } },
+            { 'scale': 10, 'mode': 'native', 'skipped': 'the native module has not been built' }
+        ] }
+        results = { 'results': [
+            { 'scale': 10, 'mode': 'python', 'stages': { 'rivers': { 'throughput': 150.0 } } },
+            { 'scale': 20, 'mode': 'python', 'stages': { 'rivers': { 'throughput': 90.0 } } }
+        ] }
+
+        self.assertEqual(benchmarks.compareResults(baseline, results), [ (10, 'python', 'rivers', 100.0, 150.0) ])
+
+class ProfilingTests(unittest.TestCase):
+    def test_stagesAndWorkers(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            report = StageReport('test', profileDirectory=directory)
+            report.startStage('stage')
+            worker = multiprocessing.Process(target=Profiling.profiledTarget(sorted, directory, 'worker-0'), args=([ 3, 1, 2 ],))
+            worker.start()
+            worker.join()
+            report.endStage()
+
+            combined = Profiling.mergeProfiles(directory)
+
+            self.assertEqual(sorted(os.listdir(directory)), [ 'combined.pstats', 'profile.txt', 'stage.pstats', 'worker-0.pstats' ])
+            with open(os.path.join(directory, 'profile.txt'), 'r') as summary:
+                self.assertIn('==== worker-0.pstats ====', summary.read())
+            self.assertGreater(combined.total_calls, 0)
+
+    def test_notProfiled(self) -> None:
+        self.assertIs(Profiling.profiledTarget(sorted, None, 'worker-0'), sorted)
+
+class SweepTests(unittest.TestCase):
+    def test_variants(self) -> None:
+        variants = sweepVariants({ 'numPoints': [ 50, 100 ], 'terrainSlopeRate': [ 0.5, 1.0 ] })
+
+        self.assertEqual(len(variants), 4)
+        self.assertIn({ 'numPoints': 100, 'terrainSlopeRate': 0.5 }, variants)
+
+    def test_unknownParameter(self) -> None:
+        with self.assertRaises(ValueError):
+            sweepVariants({ 'edgeLength': [ 100.0 ] })
+
+class SaveFileStageReuseTests(unittest.TestCase):
+    def test_cachedHoneycomb(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            inputs = benchmarks.syntheticInputs(directory, 6)
+            arguments = { **inputs, 'numRivers': 3, 'numProcs': 2, 'lat': 0.0, 'lon': 0.0, 'accelerate': False }
+            stageCache = os.path.join(directory, 'stage-cache')
+
+            # the second run loads the honeycomb that the first one cached,
+            # like the variants of a sweep over numPoints
+            generateClassic(**arguments, numPoints=20, outputFile=os.path.join(directory, 'first.db'), stageCache=stageCache)
+            generateClassic(**arguments, numPoints=40, outputFile=os.path.join(directory, 'cached.db'), stageCache=stageCache)
+            generateClassic(**arguments, numPoints=40, outputFile=os.path.join(directory, 'fresh.db'))
+
+            cached = openDB(os.path.join(directory, 'cached.db'))
+            fresh = openDB(os.path.join(directory, 'fresh.db'))
+            self.assertEqual(completedStages(cached), completedStages(fresh))
+            # the IDs of the Qs differ from run to run, but not their positions
+            for query in [ 'SELECT rivernode, polygonOrder, X(loc), Y(loc), elevation FROM Cells JOIN Qs ON Qs.id = Cells.q ORDER BY rivernode, polygonOrder', 'SELECT id, rivercell, elevation FROM Ts ORDER BY id' ]:
+                self.assertEqual(cached.execute(query).fetchall(), fresh.execute(query).fetchall())
+            cached.close()
+            fresh.close()
+
 class TerrainTests(unittest.TestCase):
     def setUp(self) -> None:
         self.edgeLength, self.shore, self.hydrology, self.cells = getPredefinedObjects0()
@@ -1177,6 +1934,37 @@ class SaveFileHoneycombSaveTests(unittest.TestCase):
     def tearDown(self) -> None:
         self.db.close()
 
+class SaveFileHoneycombRoundTripTests(unittest.TestCase):
+    def setUp(self) -> None:
+        _, self.shore, self.hydrology, self.cells = getPredefinedObjects0()
+
+        self.db = createDB(':memory:', 93.6, 2320.5, 0, 0)
+        self.hydrology.saveToDB(self.db)
+        self.cells.saveToDB(self.db)
+
+        self.loaded = TerrainHoneycomb()
+        self.loaded.loadFromDB(self.db)
+
+    def test_cellShapes(self) -> None:
+        # the edges come out of the database in no particular order, but
+        # the cells must have the same shapes as before
+        for cellID in self.cells.cellsEdges:
+            original = [ (float(x), float(y)) for x, y in self.cells.cellVertices(cellID) ]
+            loaded = [ (float(x), float(y)) for x, y in self.loaded.cellVertices(cellID) ]
+            self.assertEqual(original, loaded)
+            self.assertAlmostEqual(self.cells.cellArea(cellID), self.loaded.cellArea(cellID), places=3)
+
+    def test_primitiveCounts(self) -> None:
+        original = initializeTerrain(self.hydrology, self.cells, 50, seed=4314)
+        loaded = initializeTerrain(self.hydrology, self.loaded, 50, seed=4314)
+
+        self.assertEqual(len(original), len(loaded))
+        for cellID in self.cells.cellsEdges:
+            self.assertEqual(len(original.cellTs(cellID)), len(loaded.cellTs(cellID)))
+
+    def tearDown(self) -> None:
+        self.db.close()
+
 class SaveFileTerrainLoadTests(unittest.TestCase):
     def setUp(self) -> None:
         self.db = createDB(':memory:', 2000, 2000, 0, 0)
@@ -0,0 +1,191 @@
+"""Measures the time and memory taken by each stage of a pipeline
+
+A :class:`StageReport` records, for each stage, the wall time, the CPU
+time (of this process and of any worker processes that finished during the
+stage), the peak resident set size, and optionally a count of the items
+that the stage processed, from which the throughput is computed. The
+report is written as JSON, so that runs can be compared across machines
+and commits.
+
+The operating system only reports the peak resident set size since the
+process started, so ``peakRSSSoFarBytes`` is the peak up to the end of a
+stage, not the peak during it. ``peakRSSGrowthBytes`` is how much the stage
+raised that peak; a stage that used less memory than an earlier one shows
+no growth.
+
+.. code-block:: python
+
+   report = StageReport('generate')
+   try:
+       report.startStage('rivers')
+       ...
+       report.endStage(len(hydrology), 'nodes')
+   finally:
+       report.write(outputFile + '.metrics.json')
+"""
+
+import cProfile
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import typing
+
+try:
+    import resource
+except ImportError: # resource is not available on Windows
+    resource = None
+
+def peakRSS() -> typing.Tuple[int,int]:
+    """Gets the peak resident set size of this process and of its largest finished child process
+
+    :return: The peak RSS of this process and of its children, in bytes. They are 0 if they cannot be measured
+    :rtype: tuple[int,int]
+    """
+    if resource is None:
+        return 0, 0
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+
+def cpuTime() -> float:
+    """Gets the CPU time used so far by this process and by its finished child processes
+
+    :return: The user and system time, in seconds
+    :rtype: float
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def machineDetails() -> typing.Dict[str, typing.Any]:
+    """Describes the machine, so that measurements from different machines can be told apart
+
+    :return: The host name, platform, processor, number of CPUs, and Python version
+    :rtype: dict[str, Any]
+    """
+    return {
+        'node': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpuCount': os.cpu_count(),
+        'python': platform.python_version()
+    }
+
+class StageReport:
+    """Collects the measurements of the stages of a pipeline
+
+    Stages are run one after another. Each stage is begun with
+    :py:meth:`startStage` and ended with :py:meth:`endStage`.
+
+    :param pipeline: The name of the pipeline (such as ``'generate'``)
+    :type pipeline: str
+    :param parameters: The parameters of the run, which are copied into the report. They must be serializable as JSON
+    :type parameters: dict[str, Any]
+    :param liveLog: If this is not None, a line is written to it as each stage ends
+    :type liveLog: typing.IO
+    :param profileDirectory: If this is not None, each stage is profiled, and its profile is written to ``<stage>.pstats`` in this directory (see :py:mod:`Profiling`)
+    :type profileDirectory: str
+    """
+    def __init__(self, pipeline: str, parameters: typing.Dict[str, typing.Any]=None, liveLog: typing.IO=None, profileDirectory: str=None):
+        self.pipeline = pipeline
+        self.profileDirectory = profileDirectory
+        if profileDirectory is not None:
+            os.makedirs(profileDirectory, exist_ok=True)
+        self.profiler = None
+        self.parameters = parameters if parameters is not None else { }
+        self.liveLog = liveLog
+        self.started = datetime.datetime.now().isoformat()
+        self.startTime = time.perf_counter()
+        self.stages: typing.List[typing.Dict[str, typing.Any]] = [ ]
+        self.current = None
+    def startStage(self, name: str) -> None:
+        """Begins measuring a stage
+
+        If another stage is being measured, it is ended first (without an
+        item count).
+
+        :param name: The name of the stage
+        :type name: str
+        """
+        if self.current is not None:
+            self.endStage()
+        self.current = { 'name': name, 'wall': time.perf_counter(), 'cpu': cpuTime(), 'peak': peakRSS() }
+        if self.profileDirectory is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+    def endStage(self, items: int=None, unit: str=None, **details: typing.Any) -> typing.Dict[str, typing.Any]:
+        """Finishes measuring the current stage
+
+        :param items: The number of items that the stage processed, if that is meaningful
+        :type items: int
+        :param unit: What the items are (such as ``'nodes'``)
+        :type unit: str
+        :param details: Anything else to record about the stage. The values must be serializable as JSON
+        :return: The measurements of the stage
+        :rtype: dict[str, Any]
+        """
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(os.path.join(self.profileDirectory, f'{self.current["name"]}.pstats'))
+            self.profiler = None
+
+        wall = time.perf_counter() - self.current['wall']
+        cpu = cpuTime() - self.current['cpu']
+        peak, childPeak = peakRSS()
+        startPeak, startChildPeak = self.current['peak']
+
+        stage = {
+            'name': self.current['name'],
+            'wallSeconds': wall,
+            'cpuSeconds': cpu,
+            'peakRSSSoFarBytes': peak,
+            'peakRSSGrowthBytes': peak - startPeak,
+            'childPeakRSSSoFarBytes': childPeak,
+            'childPeakRSSGrowthBytes': childPeak - startChildPeak,
+            'items': items,
+            'unit': unit,
+            'throughput': items / wall if items is not None and wall > 0 else None,
+            **details
+        }
+        self.stages.append(stage)
+        self.current = None
+
+        if self.liveLog is not None:
+            line = f'[{self.pipeline}] {stage["name"]}: {wall:.2f} s wall, {cpu:.2f} s CPU, {peak / 2**20:.0f} MiB peak RSS so far (+{(peak - startPeak) / 2**20:.0f} MiB)'
+            if items is not None:
+                line += f', {items} {unit if unit is not None else "items"}'
+                if stage['throughput'] is not None:
+                    line += f' ({stage["throughput"]:.1f}/s)'
+            print(line, file=self.liveLog, flush=True)
+
+        return stage
+    def toDict(self) -> typing.Dict[str, typing.Any]:
+        """The whole report, as it is written by :py:meth:`write`
+
+        :return: The report
+        :rtype: dict[str, Any]
+        """
+        return {
+            'pipeline': self.pipeline,
+            'started': self.started,
+            'totalWallSeconds': time.perf_counter() - self.startTime,
+            'machine': machineDetails(),
+            'parameters': self.parameters,
+            'stages': self.stages
+        }
+    def write(self, path: str) -> None:
+        """Writes the report as JSON
+
+        If a stage is still being measured (because it raised an
+        exception, for instance), it is ended first, and marked as
+        incomplete.
+
+        :param path: The path to the report
+        :type path: str
+        """
+        if self.current is not None:
+            self.endStage(incomplete=True)
+        with open(path, 'w') as reportFile:
+            json.dump(self.toDict(), reportFile, indent=2)
@@ -1,6 +1,5 @@
 import numpy as np
 import math
-import skspatial.measurement as skm
 import shapely as shp
 
 import typing
@@ -54,6 +53,42 @@ def pointInPolygon(point: typing.Tuple[float,float], vertices: np.ndarray) -> bo
   point = shp.geometry.Point(point)
   return shp.contains(polygon, point)
 
+def pointsInPolygon(points: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+  """Determine which of many points are within a polygon
+
+  This uses the crossing-number rule: a ray is cast from each point in the
+  +x direction, and the point is inside if the ray crosses an odd number of
+  the polygon's edges. All points are tested against all edges at once. The
+  result matches :func:`pointInPolygon` except for points that lie exactly
+  on the boundary.
+
+  :param points: The points to test
+  :type points: numpy.ndarray(m,2)
+  :param vertices: The polygon to test. It need not be closed
+  :type vertices: numpy.ndarray(n,2)
+  :return: True for each point that is within the polygon
+  :rtype: numpy.ndarray(m)
+  """
+  points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+  vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+  if len(vertices) < 3:
+    return np.zeros(len(points), dtype=bool)
+
+  x0, y0 = vertices[:,0], vertices[:,1]
+  x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+  px, py = points[:,0,np.newaxis], points[:,1,np.newaxis]
+
+  # the edges that straddle the horizontal line through each point
+  straddles = (y0 > py) != (y1 > py)
+
+  # where that line crosses each edge (horizontal edges never straddle, so
+  # their results are discarded)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    crossingX = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+
+  crossings = np.count_nonzero(straddles & (px < crossingX), axis=1)
+  return crossings % 2 == 1
+
 def polygonArea(vertices: np.ndarray) -> float:
   """Determine the area of a polygon
 
@@ -62,7 +97,38 @@ def polygonArea(vertices: np.ndarray) -> float:
   :return: The area of the polygon
   :rtype: float
   """
-  return abs(skm.area_signed(vertices))
+  return float(polygonAreas(vertices, [ 0, len(vertices) ])[0])
+
+def polygonAreas(vertices: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+  """Determine the areas of many polygons at once
+
+  The polygons are packed end-to-end in ``vertices``. Polygon ``i``
+  consists of the vertices ``vertices[offsets[i]:offsets[i+1]]``. The
+  polygons need not be closed, and each must have at least one vertex.
+
+  The areas are computed with the shoelace formula, so the result for
+  each polygon is the same as :func:`polygonArea`.
+
+  :param vertices: The vertices of all the polygons, packed together
+  :type vertices: numpy.ndarray(n,2)
+  :param offsets: The index of the first vertex of each polygon, followed by the total number of vertices
+  :type offsets: numpy.ndarray(m+1)
+  :return: The area of each polygon
+  :rtype: numpy.ndarray(m)
+  """
+  vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+  offsets = np.asarray(offsets, dtype=np.int64)
+  if len(offsets) < 2:
+    return np.zeros(0)
+
+  # the index of the next vertex in each polygon, wrapping around to the first one
+  nextIdx = np.arange(1, len(vertices) + 1)
+  nextIdx[offsets[1:] - 1] = offsets[:-1]
+
+  x, y = vertices[:,0], vertices[:,1]
+  cross = x * y[nextIdx] - x[nextIdx] * y
+
+  return np.abs(np.add.reduceat(cross, offsets[:-1])) / 2
 
 # Borrowed , all of it
 def segments_distance(a: typing.Tuple[float,float], b: typing.Tuple[float,float], c: typing.Tuple[float,float], d: typing.Tuple[float,float]) -> float:
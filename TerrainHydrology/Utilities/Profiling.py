@@ -0,0 +1,115 @@
+"""Profiles the stages of a pipeline and its worker processes separately
+
+Profiling the whole command with ``python -m cProfile`` mixes the stages
+together, and does not see into worker processes at all. Instead, with
+profiling turned on, :class:`Instrumentation.StageReport` profiles each
+stage into its own ``<stage>.pstats`` file, and worker processes are
+started with :py:func:`profiledTarget` so that each one writes its own
+``<worker>.pstats`` file. :py:func:`mergeProfiles` combines the files into
+one, and writes a text summary.
+
+The ``.pstats`` files can be opened with :py:mod:`pstats`, or with tools
+such as snakeviz.
+"""
+
+import cProfile
+import glob
+import io
+import os
+import os.path
+import pstats
+import sys
+import typing
+
+class ProfiledTarget:
+    """Runs a function under the profiler and saves the profile
+
+    This is picklable (as long as the function is), so it can be the target
+    of a :py:class:`multiprocessing.Process`. A forked process inherits the
+    profiler of the stage that started it, so in another process, that
+    profiler is released first.
+
+    :param target: The function to run
+    :type target: Callable
+    :param path: Where to write the ``.pstats`` file
+    :type path: str
+    """
+    def __init__(self, target: typing.Callable, path: str):
+        self.target = target
+        self.path = path
+        self.parentPID = os.getpid()
+    def __call__(self, *args, **kwargs) -> typing.Any:
+        if os.getpid() != self.parentPID:
+            releaseInheritedProfiler()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return self.target(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(self.path)
+
+def releaseInheritedProfiler() -> None:
+    """Stops a profiler that was running in the parent when this process was forked
+
+    Before Python 3.12, the profiler is a profile function. Since Python
+    3.12, it holds the profiler tool ID of :py:mod:`sys.monitoring`, and
+    another profiler cannot be enabled until the ID is freed. This must
+    only be called in a child process, since the profiler's own process
+    loses it too.
+    """
+    sys.setprofile(None)
+    monitoring = getattr(sys, 'monitoring', None)
+    if monitoring is not None and monitoring.get_tool(monitoring.PROFILER_ID) is not None:
+        monitoring.set_events(monitoring.PROFILER_ID, 0)
+        monitoring.free_tool_id(monitoring.PROFILER_ID)
+
+def profiledTarget(target: typing.Callable, profileDirectory: str, name: str) -> typing.Callable:
+    """Wraps the target of a worker process so that the worker is profiled
+
+    :param target: The function that the worker runs
+    :type target: Callable
+    :param profileDirectory: The directory to write the profile to. If this is None, the target is returned as it is
+    :type profileDirectory: str
+    :param name: The name of the worker. The profile is written to ``<name>.pstats``
+    :type name: str
+    :return: The function to give to the worker
+    :rtype: Callable
+    """
+    if profileDirectory is None:
+        return target
+    return ProfiledTarget(target, os.path.join(profileDirectory, f'{name}.pstats'))
+
+def mergeProfiles(profileDirectory: str, numLines: int=40) -> pstats.Stats:
+    """Combines the profiles in a directory
+
+    The combined profile is written to ``combined.pstats``, and a summary
+    of each profile, and of the combination, is written to
+    ``profile.txt``. Profiles are summarized by cumulative time.
+
+    :param profileDirectory: The directory that holds the ``.pstats`` files
+    :type profileDirectory: str
+    :param numLines: The number of functions to list for each profile
+    :type numLines: int
+    :return: The combined profile, or None if there are no profiles
+    :rtype: pstats.Stats
+    """
+    combinedPath = os.path.join(profileDirectory, 'combined.pstats')
+    paths = sorted(path for path in glob.glob(os.path.join(profileDirectory, '*.pstats')) if path != combinedPath)
+    if len(paths) == 0:
+        return None
+
+    summary = io.StringIO()
+    for path in paths:
+        summary.write(f'==== {os.path.basename(path)} ====\n')
+        pstats.Stats(path, stream=summary).sort_stats('cumulative').print_stats(numLines)
+
+    combined = pstats.Stats(*paths, stream=summary)
+    combined.dump_stats(combinedPath)
+    summary.write(f'==== combined ({len(paths)} profiles) ====\n')
+    combined.sort_stats('cumulative').print_stats(numLines)
+
+    with open(os.path.join(profileDirectory, 'profile.txt'), 'w') as summaryFile:
+        summaryFile.write(summary.getvalue())
+
+    return combined
@@ -1,29 +1,56 @@
 #!/bin/python3
 
 import argparse
+import json
 import unittest
 import sys
 
-from TerrainHydrology.ModelIO import Export, Render
-from TerrainHydrology.Utilities import BitmapToShapefile
-from TerrainHydrology.GeneratorClassic import GeneratorClassic
+# Each subcommand imports what it needs when it is dispatched, so that
+# small jobs (and --help) do not pay for importing the whole package
 
 def generateClassic(args: argparse.Namespace) -> None:
-    GeneratorClassic.generateClassic(
-        args.inputDomain,
-        args.inputTerrain,
-        args.inputRiverSlope,
-        args.resolution,
-        args.numRivers,
-        args.num_procs,
-        args.num_points,
-        args.outputFile,
-        args.latitude,
-        args.longitude,
-        args.accelerate
-    )
+    from TerrainHydrology.GeneratorClassic import GeneratorClassic
+
+    arguments = {
+        'inputDomain': args.inputDomain,
+        'inputTerrain': args.inputTerrain,
+        'inputRiverSlope': args.inputRiverSlope,
+        'resolution': args.resolution,
+        'numRivers': args.numRivers,
+        'numProcs': args.num_procs,
+        'numPoints': args.num_points,
+        'lat': args.latitude,
+        'lon': args.longitude,
+        'accelerate': args.accelerate,
+        'patternCache': args.patternCache,
+        'primitiveDistribution': args.primitiveDistribution,
+        'columnarCache': args.columnarCache,
+        'terrainSlopeRate': args.terrainSlopeRate,
+        'liveMetrics': args.liveMetrics,
+        'profile': args.profile,
+        'rasterCache': args.rasterCache,
+        'interpolateRasters': args.interpolateRasters
+    }
+    if args.grid is None:
+        GeneratorClassic.generateClassic(**arguments, outputFile=args.outputFile, resume=args.resume, stageCache=args.stageCache)
+    else:
+        GeneratorClassic.sweep(arguments, parseGrid(args.grid), args.outputFile, int(args.parallelVariants), args.stageCache)
+
+def parseGrid(values: list) -> dict:
+    from TerrainHydrology.GeneratorClassic import GeneratorClassic
+
+    # each value is NAME=VALUE,VALUE,...
+    grid = { }
+    for value in values:
+        name, _, options = value.partition('=')
+        if name not in GeneratorClassic.sweepParameters:
+            parser.error(f'{name} cannot be varied. Use one of: {", ".join(GeneratorClassic.sweepParameters)}')
+        grid[name] = [ GeneratorClassic.sweepParameters[name](option) for option in options.split(',') ]
+    return grid
 
 def export(args: argparse.Namespace) -> None:
+    from TerrainHydrology.ModelIO import Export
+
     if args.nodeOutput is not None:
         Export.writeNodeShapefile(args.inputFile, args.latitude, args.longitude, args.nodeOutput)
     if args.terrainOutput is not None:
@@ -38,11 +65,38 @@ def export(args: argparse.Namespace) -> None:
         Export.writeRidgePrimitiveShapefile(args.inputFile, args.latitude, args.longitude, args.ridgePrimitiveOutput)
 
 def render(args: argparse.Namespace) -> None:
-    Render.renderDEM(args.inputFile, args.latitude, args.longitude, args.outputResolution, args.num_procs, args.outputDir, args.extremeMemory)
+    from TerrainHydrology.ModelIO import Render
+
+    Render.renderDEM(args.inputFile, args.latitude, args.longitude, args.outputResolution, args.num_procs, args.outputDir, args.extremeMemory, liveMetrics=args.liveMetrics, profile=args.profile)
 
 def img_to_shp(args: argparse.Namespace) -> None:
+    from TerrainHydrology.Utilities import BitmapToShapefile
+
     BitmapToShapefile.img_to_shp(args.inputImage, args.latitude, args.longitude, args.resolution, args.outputFile)
 
+def benchmark(args: argparse.Namespace) -> None:
+    from TerrainHydrology.TestSuite import benchmarks
+
+    if args.startup:
+        results = benchmarks.benchmarkStartup()
+        with open(args.outputFile, 'w') as resultsFile:
+            json.dump(results, resultsFile, indent=2)
+        print('subcommand\tparse (s)\timports (s)')
+        for subcommand, times in results['subcommands'].items():
+            print(f'{subcommand}\t{times["parseSeconds"]:.3f}\t{times["importSeconds"]:.3f}')
+        return
+
+    results = benchmarks.runBenchmarks(args.scales, args.modes, args.num_points, args.renderResolution, args.num_procs)
+    with open(args.outputFile, 'w') as resultsFile:
+        json.dump(results, resultsFile, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as baselineFile:
+            baseline = json.load(baselineFile)
+        print('scale\tmode\tstage\tbaseline/s\tcurrent/s\tchange')
+        for scale, mode, stage, old, new in benchmarks.compareResults(baseline, results):
+            print(f'{scale}\t{mode}\t{stage}\t{old:.1f}\t{new:.1f}\t{100.0 * (new - old) / old:+.1f}%')
+
 def test(test: argparse.Namespace) -> None:
     # TODO: This isn't the right way to do this. We'll have to refactor this later
     unittest.main(module='TerrainHydrology.TestSuite.tests', argv=sys.argv[:1])
@@ -127,6 +181,100 @@ parser_generatorClassic.add_argument(
     dest='accelerate',
     required=False
 )
+parser_generatorClassic.add_argument(
+    '--pattern-cache',
+    help='A directory in which to cache the Poisson pattern that terrain primitives are placed in. Runs with the same number of points reuse the cached pattern',
+    dest='patternCache',
+    metavar='cache/',
+    default=None,
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--primitive-distribution',
+    help='How terrain primitives are distributed. "tiled" fits a Poisson pattern into each cell; "bridson" samples the whole land at once, which is faster for many points and has no seams between cells',
+    dest='primitiveDistribution',
+    choices=['tiled', 'bridson'],
+    default='tiled',
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--columnar-cache',
+    help='Also write the shore, rivers, and terrain primitives as memory-mapped arrays next to the output file, so that rendering and exporting start faster',
+    action='store_true',
+    dest='columnarCache',
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--resume',
+    help='If the output file was left by a run that failed, skip the stages it completed and continue from there. The other arguments should be the same as in the run that failed',
+    action='store_true',
+    dest='resume',
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--terrain-slope-rate',
+    help='The maximum rate at which ridges climb, in vertical meters per horizontal meter',
+    dest='terrainSlopeRate',
+    metavar='1.0',
+    type=float,
+    default=1.0,
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--stage-cache',
+    help='A directory in which to keep the output of each stage of generation. Stages whose inputs and parameters have not changed since an earlier run are taken from the cache instead of being computed again',
+    dest='stageCache',
+    metavar='cache/',
+    default=None,
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--vary',
+    help='Generate a variant for every combination of the given values (a parameter sweep). May be given more than once. NAME is numRivers, numPoints, terrainSlopeRate, or primitiveDistribution. The output is then a directory, and the variants share a stage cache',
+    dest='grid',
+    metavar='NAME=VALUE,VALUE',
+    action='append',
+    default=None,
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--parallel-variants',
+    help='In a parameter sweep, the number of variants to generate at once',
+    dest='parallelVariants',
+    metavar='2',
+    default=2,
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--live-metrics',
+    help='Print the time and memory taken by each stage as it finishes. They are always written to <output>.metrics.json',
+    action='store_true',
+    dest='liveMetrics',
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--profile',
+    help='Profile each stage and each worker process separately, and write the profiles (.pstats files), a combined profile, and a summary (profile.txt) to this directory',
+    dest='profile',
+    metavar='profile/',
+    default=None,
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--raster-cache',
+    help='A directory in which to cache the decoded terrain and river slope images. Later runs memory-map the cached arrays instead of decoding the images again',
+    dest='rasterCache',
+    metavar='cache/',
+    default=None,
+    required=False
+)
+parser_generatorClassic.add_argument(
+    '--interpolate-rasters',
+    help='Interpolate the terrain and river slope images bilinearly instead of taking the nearest pixel. The native module (--accelerate) always takes the nearest pixel when it grows rivers',
+    action='store_true',
+    dest='interpolateRasters',
+    required=False
+)
 parser_generatorClassic.add_argument(
     '--num-procs',
     help='The number of processes/threads to use for calculating terrain primitives. This should be the number of cores you have on your system.',
@@ -285,6 +433,21 @@ parser_render.add_argument(
     action='store_true',
     required=False
 )
+parser_render.add_argument(
+    '--live-metrics',
+    help='Print the time and memory taken by each stage as it finishes. They are always written to out-metrics.json in the output directory',
+    action='store_true',
+    dest='liveMetrics',
+    required=False
+)
+parser_render.add_argument(
+    '--profile',
+    help='Profile each stage and each worker process separately, and write the profiles (.pstats files), a combined profile, and a summary (profile.txt) to this directory',
+    dest='profile',
+    metavar='profile/',
+    default=None,
+    required=False
+)
 parser_render.set_defaults(func=render)
 
 parser_img_to_shp = subparsers.add_parser('img-to-shp', help='img-to-shp help')
@@ -331,6 +494,79 @@ parser_img_to_shp.add_argument(
 )
 parser_img_to_shp.set_defaults(func=img_to_shp)
 
+parser_benchmark = subparsers.add_parser('benchmark', help='benchmark help')
+parser_benchmark.add_argument(
+    '--scales',
+    help='The radii of the synthetic islands, in edge lengths',
+    dest='scales',
+    metavar='10',
+    nargs='+',
+    type=float,
+    default=[ 10.0, 20.0, 40.0 ],
+    required=False
+)
+parser_benchmark.add_argument(
+    '--modes',
+    help='Whether to benchmark the Python implementation, the native module, or both. Native mode is skipped if the native module has not been built',
+    dest='modes',
+    nargs='+',
+    choices=[ 'python', 'native' ],
+    default=[ 'python', 'native' ],
+    required=False
+)
+parser_benchmark.add_argument(
+    '-p',
+    '--num-points',
+    help='The (rough) number of terrain primitives for each cell',
+    dest='num_points',
+    metavar='50',
+    type=int,
+    default=50,
+    required=False
+)
+parser_benchmark.add_argument(
+    '--render-resolution',
+    help='The width and height of the rendered DEM, in pixels',
+    dest='renderResolution',
+    metavar='512',
+    type=int,
+    default=512,
+    required=False
+)
+parser_benchmark.add_argument(
+    '--num-procs',
+    help='The number of processes to use',
+    dest='num_procs',
+    metavar='4',
+    type=int,
+    default=4,
+    required=False
+)
+parser_benchmark.add_argument(
+    '--startup',
+    help='Instead of running the pipeline, measure how long each subcommand takes to start: parsing its arguments, and importing what it needs',
+    action='store_true',
+    dest='startup',
+    required=False
+)
+parser_benchmark.add_argument(
+    '--baseline',
+    help='The results file of an earlier run (from another commit, for example) to compare with',
+    dest='baseline',
+    metavar='baseline.json',
+    default=None,
+    required=False
+)
+parser_benchmark.add_argument(
+    '-o',
+    '--output',
+    help='The file to write the results to',
+    dest='outputFile',
+    metavar='results.json',
+    required=True
+)
+parser_benchmark.set_defaults(func=benchmark)
+
 parser_test = subparsers.add_parser('test', help='test help')
 parser_test.set_defaults(func=test)
 
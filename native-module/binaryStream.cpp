@@ -0,0 +1,64 @@
+#include "binaryStream.hpp"
+
+#include <stdlib.h>
+#include <string.h>
+#include <endian.h>
+
+#include "floatEndian.hpp"
+
+static void readBytes(FILE *stream, void *buffer, size_t size)
+{
+  if (fread(buffer, 1, size, stream) != size)
+  {
+    fprintf(stderr, "Unexpected end of input stream\n");
+    exit(1);
+  }
+}
+
+static void writeBytes(FILE *stream, const void *buffer, size_t size)
+{
+  if (fwrite(buffer, 1, size, stream) != size)
+  {
+    fprintf(stderr, "Unable to write to output stream\n");
+    exit(1);
+  }
+}
+
+uint64_t readUint64(FILE *stream)
+{
+  uint64_t value;
+  readBytes(stream, &value, sizeof(uint64_t));
+  return be64toh(value);
+}
+
+float readFloat(FILE *stream)
+{
+  float value;
+  readBytes(stream, &value, sizeof(float));
+  return float_swap_betoh(value);
+}
+
+void writeUint32(FILE *stream, uint32_t value)
+{
+  value = htobe32(value);
+  writeBytes(stream, &value, sizeof(uint32_t));
+}
+
+void writeUint64(FILE *stream, uint64_t value)
+{
+  value = htobe64(value);
+  writeBytes(stream, &value, sizeof(uint64_t));
+}
+
+void writeInt64(FILE *stream, int64_t value)
+{
+  uint64_t bits;
+  memcpy(&bits, &value, sizeof(uint64_t));
+  writeUint64(stream, bits);
+}
+
+void writeFloat(FILE *stream, float value)
+{
+  value = float_tobe(value);
+  writeBytes(stream, &value, sizeof(float));
+}
@@ -0,0 +1,47 @@
+#ifndef BINARY_STREAM_H
+#define BINARY_STREAM_H
+
+#include <stdio.h>
+#include <stdint.h>
+
+/*
+  These functions read and write the binary protocol that the native
+  module uses to exchange data with the Python module over its standard
+  input and output. All values are in network (big-endian) order. See
+  TerrainHydrology/ModelIO/NativeProtocol.py for the record layouts.
+
+  If a value cannot be read or written, an error is printed to stderr and
+  the program exits.
+*/
+
+/**
+ * @brief Reads an unsigned 64-bit integer from a stream
+ */
+uint64_t readUint64(FILE *stream);
+
+/**
+ * @brief Reads a 32-bit float from a stream
+ */
+float readFloat(FILE *stream);
+
+/**
+ * @brief Writes an unsigned 32-bit integer to a stream
+ */
+void writeUint32(FILE *stream, uint32_t value);
+
+/**
+ * @brief Writes an unsigned 64-bit integer to a stream
+ */
+void writeUint64(FILE *stream, uint64_t value);
+
+/**
+ * @brief Writes a signed 64-bit integer to a stream
+ */
+void writeInt64(FILE *stream, int64_t value);
+
+/**
+ * @brief Writes a 32-bit float to a stream
+ */
+void writeFloat(FILE *stream, float value);
+
+#endif
@@ -4,6 +4,7 @@
 
 #include "hydrologyParameters.hpp"
 #include "hydrologyFunctions.hpp"
+#include "progressReporter.hpp"
 
 /*
 A list of data structures that will be used:
@@ -40,38 +41,22 @@ int main(int argc, char* argv[])
 
 
   // perform computatons
-  const uint8_t anotherNode = 0x2e, allDone = 0x21;
-  #pragma omp parallel
-  {
-  // printf("Thread ID: %d\n", omp_get_thread_num());
-  while (params.candidates.size() > 0)
-  {
-    params.lockCandidateVector();
-    Primitive selectedCandidate = selectNode(params);
-    params.unlockCandidateVector();
-
-    alpha(selectedCandidate, params);
-
-    #pragma omp critical
-    {
-    // write a byte to the calling program, signalling
-    // that a candidate has been processed
-    fwrite(&anotherNode, sizeof(uint8_t), 1, stdout);
-    fflush(stdout);
-    }
-  }
-  }
-
-  //export outputs
-  params.writeToDatabase(db);
+  // progress is reported periodically, rather than once per candidate,
+  // so that the threads don't contend over stdout
+  ProgressReporter progress(stdout);
+  growNetwork(params, progress.getCounter());
 
   //free resources
   sqlite3_close(db);
 
   // signal to the calling program that processing
   // is complete
-  fwrite(&allDone, sizeof(uint8_t), 1, stdout);
-  fflush(stdout);
+  progress.finish();
+
+  //export outputs
+  // the network is streamed back over stdout, rather than being
+  // written to the database for the calling program to read again
+  params.writeToStream(stdout);
 
   return 0;
 }
\ No newline at end of file
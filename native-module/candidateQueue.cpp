@@ -0,0 +1,284 @@
+#include "candidateQueue.hpp"
+
+#include <algorithm>
+#include <limits>
+
+class ComparePrimitives
+{
+  public:
+  bool operator() (Primitive *a, Primitive *b) {
+    return (a->getPriority() > b->getPriority());
+  }
+};
+
+CandidateQueue::CandidateQueue(size_t numShards)
+: numShards(numShards), count(0)
+{
+  allocate();
+}
+
+CandidateQueue::~CandidateQueue()
+{
+  deallocate();
+}
+
+CandidateQueue::CandidateQueue(const CandidateQueue& other)
+: numShards(other.numShards), count(other.count.load())
+{
+  allocate();
+  for (size_t i = 0; i < numShards; i++)
+  {
+    shards[i] = other.shards[i];
+    shardMinima[i] = other.shardMinima[i].load();
+  }
+}
+
+CandidateQueue::CandidateQueue(CandidateQueue&& other) noexcept
+: numShards(other.numShards), shards(other.shards),
+  shardLocks(other.shardLocks), shardMinima(other.shardMinima), count(other.count.load())
+{
+  other.shards = NULL;
+  other.shardLocks = NULL;
+  other.shardMinima = NULL;
+  other.count = 0;
+}
+
+CandidateQueue& CandidateQueue::operator=(const CandidateQueue& other)
+{
+  if (this == &other)
+  {
+    return *this;
+  }
+
+  deallocate();
+  numShards = other.numShards;
+  allocate();
+  for (size_t i = 0; i < numShards; i++)
+  {
+    shards[i] = other.shards[i];
+    shardMinima[i] = other.shardMinima[i].load();
+  }
+  count = other.count.load();
+
+  return *this;
+}
+
+CandidateQueue& CandidateQueue::operator=(CandidateQueue&& other) noexcept
+{
+  if (this == &other)
+  {
+    return *this;
+  }
+
+  deallocate();
+  numShards = other.numShards;
+  shards = other.shards;
+  shardLocks = other.shardLocks;
+  shardMinima = other.shardMinima;
+  count = other.count.load();
+
+  other.shards = NULL;
+  other.shardLocks = NULL;
+  other.shardMinima = NULL;
+  other.count = 0;
+
+  return *this;
+}
+
+void CandidateQueue::allocate()
+{
+  shards = new std::vector<Primitive*>[numShards];
+  shardLocks = new omp_lock_t[numShards];
+  shardMinima = new std::atomic<float>[numShards];
+  for (size_t i = 0; i < numShards; i++)
+  {
+    omp_init_lock(shardLocks + i);
+    shardMinima[i] = std::numeric_limits<float>::infinity();
+  }
+}
+
+void CandidateQueue::deallocate()
+{
+  if (shards != NULL)
+  {
+    delete[] shards;
+    shards = NULL;
+  }
+  if (shardLocks != NULL)
+  {
+    for (size_t i = 0; i < numShards; i++)
+    {
+      omp_destroy_lock(shardLocks + i);
+    }
+    delete[] shardLocks;
+    shardLocks = NULL;
+  }
+  if (shardMinima != NULL)
+  {
+    delete[] shardMinima;
+    shardMinima = NULL;
+  }
+}
+
+void CandidateQueue::updateMinimum(size_t shard)
+{
+  // the shard must be locked by the caller
+  float minimum = std::numeric_limits<float>::infinity();
+  for (Primitive *candidate : shards[shard])
+  {
+    minimum = std::min(minimum, candidate->getElevation());
+  }
+  shardMinima[shard] = minimum;
+}
+
+void CandidateQueue::push(Primitive *node, size_t tile)
+{
+  size_t shard = tile % numShards;
+  omp_set_lock(shardLocks + shard);
+  shards[shard].push_back(node);
+  if (node->getElevation() < shardMinima[shard])
+  {
+    shardMinima[shard] = node->getElevation();
+  }
+  count++;
+  omp_unset_lock(shardLocks + shard);
+}
+
+void CandidateQueue::remove(Primitive node, size_t tile)
+{
+  size_t shard = tile % numShards;
+  omp_set_lock(shardLocks + shard);
+  std::vector<Primitive*>& candidates = shards[shard];
+  for (size_t i = 0; i < candidates.size(); i++)
+  {
+    if (candidates[i]->getID() == node.getID())
+    {
+      // order within a shard doesn't matter, so swap with the last
+      // candidate instead of shifting the rest of the vector down
+      candidates[i] = candidates.back();
+      candidates.pop_back();
+      count--;
+      updateMinimum(shard);
+      break;
+    }
+  }
+  omp_unset_lock(shardLocks + shard);
+}
+
+size_t CandidateQueue::size()
+{
+  return count.load();
+}
+
+std::vector<Primitive*> CandidateQueue::all()
+{
+  std::vector<Primitive*> candidates;
+  for (size_t i = 0; i < numShards; i++)
+  {
+    candidates.insert(candidates.end(), shards[i].begin(), shards[i].end());
+  }
+  return candidates;
+}
+
+bool CandidateQueue::selectGlobal(float zeta, Primitive& selected)
+{
+  // the shards are always locked in the same order, so this cannot
+  // deadlock with another call
+  for (size_t i = 0; i < numShards; i++)
+  {
+    omp_set_lock(shardLocks + i);
+  }
+
+  std::vector<Primitive*> candidates = all();
+  bool found = candidates.size() > 0;
+  if (found)
+  {
+    selected = *select(candidates, zeta);
+  }
+
+  for (size_t i = 0; i < numShards; i++)
+  {
+    omp_unset_lock(shardLocks + i);
+  }
+
+  return found;
+}
+
+bool CandidateQueue::selectFromLowestShard(float zeta, Primitive& selected)
+{
+  while (true)
+  {
+    size_t lowest = 0;
+    for (size_t i = 1; i < numShards; i++)
+    {
+      if (shardMinima[i] < shardMinima[lowest])
+      {
+        lowest = i;
+      }
+    }
+    if (shardMinima[lowest] == std::numeric_limits<float>::infinity())
+    {
+      return false;
+    }
+
+    omp_set_lock(shardLocks + lowest);
+    // another thread may have emptied the shard in the meantime
+    if (shards[lowest].size() > 0)
+    {
+      selected = *select(shards[lowest], zeta);
+      omp_unset_lock(shardLocks + lowest);
+      return true;
+    }
+    omp_unset_lock(shardLocks + lowest);
+  }
+}
+
+Primitive* CandidateQueue::select(std::vector<Primitive*>& candidates, float zeta)
+{
+  // "find the elevation of the lowest candidate"
+  float lowestCandidateZ = candidates[0]->getElevation();
+  for (size_t i = 0; i < candidates.size(); i++)
+  {
+    if (candidates[i]->getElevation() < lowestCandidateZ)
+    {
+      lowestCandidateZ = candidates[i]->getElevation();
+    }
+  }
+
+  // consider the subset of admissible nodes made of nodes
+  // whose elevations are between that of the lowest candidate,
+  // and that elevation plus zeta
+  std::vector<Primitive*> subselection;
+  for (size_t i = 0; i < candidates.size(); i++)
+  {
+    if (candidates[i]->getElevation() < (lowestCandidateZ + zeta))
+    {
+      subselection.push_back(candidates[i]);
+    }
+  }
+
+  // sort by priority
+  std::sort(
+    subselection.begin(),
+    subselection.end(),
+    ComparePrimitives()
+  );
+
+  // pick the node with the highest priority and lowest elevation
+  size_t idx = 0;
+  Primitive *lowestElevation = subselection[idx];
+  while
+  (
+    idx < subselection.size() &&
+    subselection[idx]->getPriority() == subselection[0]->getPriority()
+  )
+  {
+    if (subselection[idx]->getElevation() < lowestElevation->getElevation())
+    {
+      lowestElevation = subselection[idx];
+    }
+    idx++;
+  }
+
+  return lowestElevation;
+}
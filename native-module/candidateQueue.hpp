@@ -0,0 +1,114 @@
+#ifndef CANDIDATEQUEUE_H
+#define CANDIDATEQUEUE_H
+
+#include <vector>
+#include <atomic>
+
+#include <omp.h>
+
+#include "hydrology.hpp"
+
+/**
+ * @brief The set of candidate nodes, partitioned into independently-locked shards
+ *
+ * Each candidate is stored in the shard of the Forest tile that it falls
+ * into, so threads that work in different parts of the map select and
+ * retire candidates without contending for a single lock. The elevation of
+ * the lowest candidate in each shard is kept up to date, so that the shard
+ * that holds the lowest candidate of all can be found without locking.
+ */
+class CandidateQueue
+{
+  private:
+  size_t numShards;
+  std::vector<Primitive*> *shards;
+  omp_lock_t *shardLocks;
+  std::atomic<float> *shardMinima;
+  std::atomic<size_t> count;
+
+  void updateMinimum(size_t shard);
+
+  void allocate();
+  void deallocate();
+
+  public:
+  /**
+   * @brief Construct a new, empty Candidate Queue
+   *
+   * @param numShards The number of shards. Forest tiles are assigned to shards round-robin
+   */
+  CandidateQueue(size_t numShards = 64);
+  ~CandidateQueue();
+  CandidateQueue(const CandidateQueue& other);
+  CandidateQueue(CandidateQueue&& other) noexcept;
+
+  CandidateQueue& operator=(const CandidateQueue& other);
+  CandidateQueue& operator=(CandidateQueue&& other) noexcept;
+
+  /**
+   * @brief Adds a candidate
+   *
+   * @param node The candidate
+   * @param tile The Forest tile that the candidate falls into (see Hydrology::getTile())
+   */
+  void push(Primitive *node, size_t tile);
+  /**
+   * @brief Removes a candidate, if it is present
+   *
+   * @param node The candidate to remove
+   * @param tile The Forest tile that the candidate falls into
+   */
+  void remove(Primitive node, size_t tile);
+  /**
+   * @brief The total number of candidates in all shards
+   *
+   * @return size_t
+   */
+  size_t size();
+  /**
+   * @brief Returns a copy of every candidate, from all shards
+   *
+   * This does not lock the shards, so it should not be called while
+   * other threads modify the queue.
+   *
+   * @return std::vector<Primitive*>
+   */
+  std::vector<Primitive*> all();
+
+  /**
+   * @brief Selects a candidate from all of the shards
+   *
+   * Every shard is locked while the candidate is picked by the rule in
+   * select(), so the result is the same as selectNode()'s.
+   *
+   * @param zeta The zeta parameter
+   * @param selected The selected candidate is copied here
+   * @return true A candidate was selected
+   * @return false The queue is empty
+   */
+  bool selectGlobal(float zeta, Primitive& selected);
+  /**
+   * @brief Selects a candidate from the shard that holds the lowest candidate
+   *
+   * Only that shard is locked, and the candidate is picked from it by the
+   * rule in select(). The candidates within zeta of the lowest one that
+   * are in other shards are not considered.
+   *
+   * @param zeta The zeta parameter
+   * @param selected The selected candidate is copied here
+   * @return true A candidate was selected
+   * @return false The queue is empty
+   */
+  bool selectFromLowestShard(float zeta, Primitive& selected);
+
+  /**
+   * @brief Applies the selection rule of Genevaux et al §4.2.1 to a list of candidates
+   *
+   * @param candidates The candidates. This must not be empty
+   * @param zeta The zeta parameter
+   * @return Primitive* The candidate with the highest priority and lowest elevation
+   */
+  static Primitive* select(std::vector<Primitive*>& candidates, float zeta);
+};
+
+#endif
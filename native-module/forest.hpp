@@ -3,6 +3,48 @@
 
 #include "kdtree.hpp"
 #include <omp.h>
+#include <math.h>
+
+/**
+ * @brief Counters that describe how much time threads spend waiting for tiles
+ * 
+ */
+struct LockStatistics
+{
+    uint64_t acquisitions = 0; // the number of tile locks acquired
+    uint64_t contended = 0;    // the number of those that another thread was holding
+    double waitSeconds = 0.0;  // the total time spent waiting for contended locks
+};
+
+/**
+ * @brief Chooses a tile size for a forest
+ * 
+ * An area lock of a node's neighborhood (a square 4 edge lengths wide)
+ * should not need more than 4 tiles, so tiles are never smaller than that.
+ * Otherwise, the tiles are made small enough that there are at least 16
+ * tiles per thread, so that threads rarely wait for each other, but no
+ * larger than 10 edge lengths.
+ * 
+ * @param lowerLeft The lower left corner of the area
+ * @param upperRight The upper right corner of the area
+ * @param edgeLength The edge length parameter of the simulation
+ * @param numThreads The number of threads that will use the forest
+ * @return float The size (in meters) of a tile
+ */
+inline float chooseTileDimension(Point lowerLeft, Point upperRight, float edgeLength, int numThreads)
+{
+  float area = (upperRight.x() - lowerLeft.x()) * (upperRight.y() - lowerLeft.y());
+  float dimension = sqrtf(area / (16 * numThreads));
+  if (dimension > 10 * edgeLength)
+  {
+    dimension = 10 * edgeLength;
+  }
+  if (dimension < 4 * edgeLength)
+  {
+    dimension = 4 * edgeLength;
+  }
+  return dimension;
+}
 
 /**
  * @brief The lock on a certain area. Don't forget to release it when you're done with it!
@@ -21,15 +63,32 @@ class AreaLock
      * WARNING: The locks MUST be in the correct order: row by row, starting at the lowest column. See the comments in Forest::lockArea()
      * 
      * @param locks The locks for all the area's tiles.
+     * @param stats If not NULL, the time spent waiting for the locks is recorded here
      */
-    AreaLock(std::vector<omp_lock_t*> locks)
+    AreaLock(std::vector<omp_lock_t*> locks, LockStatistics *stats = NULL)
     : locks(locks)
     {
       for (omp_lock_t *lock : locks)
       {
-        omp_set_lock(lock);
+        if (stats == NULL)
+        {
+          omp_set_lock(lock);
+          continue;
+        }
+
+        if (!omp_test_lock(lock))
+        { // another thread has this tile, so time how long it takes to get it
+          double start = omp_get_wtime();
+          omp_set_lock(lock);
+          double waited = omp_get_wtime() - start;
+          #pragma omp atomic
+          stats->contended++;
+          #pragma omp atomic
+          stats->waitSeconds += waited;
+        }
+        #pragma omp atomic
+        stats->acquisitions++;
       }
-      
     }
     /**
      * @brief Releases the area
@@ -65,6 +124,9 @@ class Forest
   KDTree<T>*  *forest;
   omp_lock_t*  forestLocks;
 
+  bool collectStatistics = false;
+  LockStatistics lockStatistics;
+
   /**
    * @brief Get the horizontal tile that the x coordinate falls into
    * 
@@ -115,6 +177,30 @@ class Forest
    * @param idx The data of the location
    */
   void insert(Point loc, T idx);
+  /**
+   * @brief Add a point of data without placing it in its tree's structure
+   * 
+   * See KDTree::append(). The data can't be found until reconstruct() is called.
+   * 
+   * @param loc The location of the data
+   * @param idx The data of the location
+   */
+  void append(Point loc, T idx);
+  /**
+   * @brief Rebuild every tree in the forest to be balanced
+   * 
+   * The trees are rebuilt in parallel.
+   */
+  void reconstruct();
+  /**
+   * @brief Get statistics for all the trees in the forest
+   * 
+   * The size and number of rebuilds are totals, and the depth is the
+   * maximum depth of any tree.
+   * 
+   * @return KDTreeStatistics 
+   */
+  KDTreeStatistics getTreeStatistics();
   /**
    * @brief Lock an area
    * 
@@ -133,6 +219,33 @@ class Forest
    * @return std::vector<T> All the data within the area
    */
   std::vector<T> searchRange(Point loc, float radius);
+  /**
+   * @brief Get the tile that a location falls into
+   * 
+   * @param loc The location
+   * @return size_t The index of the tile
+   */
+  size_t getTile(Point loc);
+  /**
+   * @brief Get the size of a tile
+   * 
+   * @return float The size (in meters) of a tile
+   */
+  float getTileDimension();
+  /**
+   * @brief Starts or stops recording how long lockArea() waits for tiles
+   * 
+   * This is off by default, because the counters are shared by all threads.
+   * 
+   * @param collect Whether or not to record statistics
+   */
+  void collectLockStatistics(bool collect);
+  /**
+   * @brief Get the lock statistics that have been recorded
+   * 
+   * @return LockStatistics 
+   */
+  LockStatistics getLockStatistics();
 };
 
 template <typename T>
@@ -325,6 +438,31 @@ size_t Forest<T>::getIndex(size_t x, size_t y)
   return y * xDimension + x;
 }
 
+template <typename T>
+size_t Forest<T>::getTile(Point loc)
+{
+  return getIndex(getTileX(loc.x()), getTileY(loc.y()));
+}
+
+template <typename T>
+float Forest<T>::getTileDimension()
+{
+  return dimensionLength;
+}
+
+template <typename T>
+void Forest<T>::collectLockStatistics(bool collect)
+{
+  collectStatistics = collect;
+  lockStatistics = LockStatistics();
+}
+
+template <typename T>
+LockStatistics Forest<T>::getLockStatistics()
+{
+  return lockStatistics;
+}
+
 template <typename T>
 void Forest<T>::insert(Point loc, T idx)
 {
@@ -336,6 +474,39 @@ void Forest<T>::insert(Point loc, T idx)
   ]->insert(loc, idx);
 }
 
+template <typename T>
+void Forest<T>::append(Point loc, T idx)
+{
+  forest[getTile(loc)]->append(loc, idx);
+}
+
+template <typename T>
+void Forest<T>::reconstruct()
+{
+  #pragma omp parallel for
+  for (size_t i = 0; i < xDimension * yDimension; i++)
+  {
+    forest[i]->reconstruct();
+  }
+}
+
+template <typename T>
+KDTreeStatistics Forest<T>::getTreeStatistics()
+{
+  KDTreeStatistics stats;
+  for (size_t i = 0; i < xDimension * yDimension; i++)
+  {
+    KDTreeStatistics treeStats = forest[i]->getStatistics();
+    stats.size += treeStats.size;
+    stats.rebuilds += treeStats.rebuilds;
+    if (treeStats.depth > stats.depth)
+    {
+      stats.depth = treeStats.depth;
+    }
+  }
+  return stats;
+}
+
 template <typename T>
 AreaLock Forest<T>::lockArea(Point loc, float radius)
 {
@@ -357,7 +528,7 @@ AreaLock Forest<T>::lockArea(Point loc, float radius)
     }
   }
 
-  return AreaLock(locks);
+  return AreaLock(locks, collectStatistics ? &lockStatistics : NULL);
 }
 
 template <typename T>
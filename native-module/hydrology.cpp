@@ -163,9 +163,13 @@ Edge::Edge(Primitive *node0, Primitive *node1)
 {
 }
 
-Hydrology::Hydrology(Point lowerLeft, Point upperRight, float edgeLength)
+Hydrology::Hydrology(Point lowerLeft, Point upperRight, float edgeLength, float tileDimension)
 {
-  trees = Forest<Primitive*>(lowerLeft, upperRight, edgeLength * 10);
+  if (tileDimension <= 0.0f)
+  {
+    tileDimension = chooseTileDimension(lowerLeft, upperRight, edgeLength, omp_get_max_threads());
+  }
+  trees = Forest<Primitive*>(lowerLeft, upperRight, tileDimension);
 }
 
 Hydrology::~Hydrology()
@@ -299,6 +303,36 @@ AreaLock Hydrology::lockArea(Point loc, float radius)
   return trees.lockArea(loc, radius);
 }
 
+size_t Hydrology::getTile(Point loc)
+{
+  return trees.getTile(loc);
+}
+
+float Hydrology::getTileDimension()
+{
+  return trees.getTileDimension();
+}
+
+void Hydrology::collectLockStatistics(bool collect)
+{
+  trees.collectLockStatistics(collect);
+}
+
+LockStatistics Hydrology::getLockStatistics()
+{
+  return trees.getLockStatistics();
+}
+
+void Hydrology::buildIndex()
+{
+  trees.reconstruct();
+}
+
+KDTreeStatistics Hydrology::getIndexStatistics()
+{
+  return trees.getTreeStatistics();
+}
+
 Primitive* Hydrology::dumpMouthNode
 (
   Point loc, float elevation, int priority, int contourIndex,
@@ -311,7 +345,7 @@ Primitive* Hydrology::dumpMouthNode
     localWatershed, inheritedWatershed, flow
   );
 
-  trees.insert(loc, node);
+  trees.append(loc, node); // indexed by buildIndex()
   indexedNodes.push_back(node);
 
   return node;
@@ -329,7 +363,7 @@ Primitive* Hydrology::dumpRegularNode
     rivers, localWatershed, inheritedWatershed, flow
   );
 
-  trees.insert(loc, node);
+  trees.append(loc, node); // indexed by buildIndex()
   indexedNodes.push_back(node);
 
   node->getParent()->children.push_back(node);
@@ -216,8 +216,9 @@ class Hydrology
    * @param lowerLeft The lower left corner of the area for the hydrology network
    * @param upperRight The upper right corner of the area for the hydrology network
    * @param edgeLength The edge length parameter of the simulation
+   * @param tileDimension The size (in meters) of a tile of the spatial index. If this is 0, a size is chosen from the edge length and the number of threads (see chooseTileDimension())
    */
-  Hydrology(Point lowerLeft, Point upperRight, float edgeLength);
+  Hydrology(Point lowerLeft, Point upperRight, float edgeLength, float tileDimension = 0.0f);
   ~Hydrology();
   Hydrology(const Hydrology& other);
   Hydrology(Hydrology&& other);
@@ -304,6 +305,46 @@ class Hydrology
    * @return AreaLock
    */
   AreaLock lockArea(Point loc, float radius);
+  /**
+   * @brief Get the tile of the spatial index that a location falls into
+   * 
+   * @param loc The location
+   * @return size_t The index of the tile
+   */
+  size_t getTile(Point loc);
+  /**
+   * @brief Get the size of a tile of the spatial index
+   * 
+   * @return float The size (in meters) of a tile
+   */
+  float getTileDimension();
+  /**
+   * @brief Starts or stops recording how long lockArea() waits for tiles
+   * 
+   * @param collect Whether or not to record statistics
+   */
+  void collectLockStatistics(bool collect);
+  /**
+   * @brief Get the lock statistics that have been recorded
+   * 
+   * @return LockStatistics 
+   */
+  LockStatistics getLockStatistics();
+  /**
+   * @brief Builds the spatial index for nodes that were added with the dump methods
+   * 
+   * dumpMouthNode() and dumpRegularNode() don't index each node as it is
+   * added. Instead, the index is built all at once when this is called,
+   * which is faster and produces balanced trees. queryArea() will not find
+   * those nodes until this is called.
+   */
+  void buildIndex();
+  /**
+   * @brief Get statistics for the trees of the spatial index
+   * 
+   * @return KDTreeStatistics 
+   */
+  KDTreeStatistics getIndexStatistics();
   /**
    * @brief Returns all edges with one or both nodes within the specified area
    * 
@@ -7,83 +7,9 @@
 
 #define FLOAT_THRESH 0.1f
 
-class ComparePrimitives
-{
-  private:
-  HydrologyParameters& params;
-
-  public:
-  ComparePrimitives(HydrologyParameters& params)
-  : params(params)
-  {}
-  ~ComparePrimitives() {}
-  bool operator() (Primitive *a, Primitive *b) {
-    return (a->getPriority() > b->getPriority());
-  }
-};
-
 Primitive selectNode(HydrologyParameters& params) {
-  // "find the elevation of the lowest candidate"
-  float lowestCandidateZ = params.candidates[0]->getElevation();
-  for (size_t i = 0; i < params.candidates.size(); i++)
-  {
-    if
-    (
-      params.candidates[i]->getElevation()
-      <
-      lowestCandidateZ
-    )
-    {
-      lowestCandidateZ = params.candidates[i]->getElevation();
-    }
-  }
-
-  // consider the subset of admissible nodes made of nodes
-  // whose elevations are between that of the lowest candidate,
-  // and that elevation plus zeta
-  std::vector<Primitive*> subselection;
-  for (size_t i = 0; i < params.candidates.size(); i++)
-  {
-    if
-    (
-      params.candidates[i]->getElevation()
-      <
-      (lowestCandidateZ + params.zeta)
-    )
-    {
-      subselection.push_back(params.candidates[i]);
-    }
-  }
-
-  // sort by priority
-  std::sort(
-    subselection.begin(),
-    subselection.end(),
-    ComparePrimitives(params)
-  );
-
-  // pick the node with the highest priority and lowest elevation
-  size_t idx = 0;
-  Primitive lowestElevation = *subselection[idx];
-  while
-  (
-    idx < subselection.size() &&
-    subselection[idx]->getPriority() == subselection[0]->getPriority()
-  )
-  {
-    if
-    (
-      subselection[idx]->getElevation()
-      <
-      lowestElevation.getElevation()
-    )
-    {
-      lowestElevation = *subselection[idx];
-    }
-    idx++;
-  }
-
-  return lowestElevation;
+  std::vector<Primitive*> candidates = params.candidates.all();
+  return *CandidateQueue::select(candidates, params.zeta);
 }
 
 float point_segment_distance(float px, float py, float x1, float y1, float x2, float y2) {
@@ -212,18 +138,7 @@ LockedPoint pickNewNodeLoc(Primitive candidate, HydrologyParameters& params) {
 
 // remove this node from the candidate vector
 void tao(Primitive node, HydrologyParameters& params) {
-  params.lockCandidateVector();
-  size_t candidateIdx = 0;
-  for (size_t i = 0; i < params.candidates.size(); i++)
-  {
-    if (params.candidates[i]->getID() == node.getID())
-    {
-      candidateIdx = i;
-      params.candidates.erase(params.candidates.begin() + candidateIdx);
-      break;
-    }
-  }
-  params.unlockCandidateVector();
+  params.removeCandidate(node);
 }
 
 void beta
@@ -238,13 +153,11 @@ void beta
       params.riverSlope.get(node.getLoc().x(), node.getLoc().y()) / 255
     ;
     float newZ = node.getElevation() + slope * params.edgeLength;
-    params.lockCandidateVector();
-      params.candidates.push_back( // add the new node to the candidate vector
-        params.hydrology.addRegularNode( // and the hydrology
-          newLoc, newZ, priority, node.getID()
-        )
-      );
-    params.unlockCandidateVector();
+    params.addCandidate( // add the new node to the candidates
+      params.hydrology.addRegularNode( // and the hydrology
+        newLoc, newZ, priority, node.getID()
+      )
+    );
     lockedPoint.release();
   }
   else
@@ -296,4 +209,34 @@ void alpha(Primitive candidate, HydrologyParameters& params) {
       ps(candidate, params);
     }
   }
-}
\ No newline at end of file
+}
+
+void growNetwork(HydrologyParameters& params, uint64_t *progress) {
+  #pragma omp parallel
+  {
+  // a single thread selects from every candidate, as selectNode() does, so
+  // the network is the same as the serial one. Several threads each take
+  // the shard with the lowest candidate, so that they do not all wait for
+  // every shard's lock
+  bool selectGlobally = omp_get_num_threads() == 1;
+  Primitive selectedCandidate;
+  while (params.candidates.size() > 0)
+  {
+    bool selected = selectGlobally
+      ? params.candidates.selectGlobal(params.zeta, selectedCandidate)
+      : params.candidates.selectFromLowestShard(params.zeta, selectedCandidate);
+    if (!selected)
+    {
+      continue; // another thread emptied the queue, but may be about to add to it
+    }
+
+    alpha(selectedCandidate, params);
+
+    if (progress != NULL)
+    {
+      #pragma omp atomic
+      (*progress)++;
+    }
+  }
+  }
+}
@@ -38,7 +38,10 @@ class LockedPoint
 /**
  * @brief Given a list of candidate nodes, this function selects the next node to expand
  * 
- * The selection is based on Genevaux et al §4.2.1
+ * The selection is based on Genevaux et al §4.2.1, and considers every
+ * candidate. growNetwork() does the same when it runs on one thread. On
+ * more, it selects from the shard that holds the lowest candidate (see
+ * CandidateQueue::selectFromLowestShard()).
  * 
  * @param params All the information needed to select a node
  * @return Primitive 
@@ -135,4 +138,14 @@ void ps(Primitive candidate, HydrologyParameters& params);
  */
 void alpha(Primitive candidate, HydrologyParameters& params);
 
+/**
+ * @brief Expands the network until there are no more candidates
+ * 
+ * This runs in parallel, on all of the threads that OpenMP makes available.
+ * 
+ * @param params The parameter struct
+ * @param progress If not NULL, this is incremented atomically each time a candidate is expanded
+ */
+void growNetwork(HydrologyParameters& params, uint64_t *progress);
+
 #endif
\ No newline at end of file
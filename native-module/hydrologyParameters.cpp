@@ -1,8 +1,12 @@
 #include "hydrologyParameters.hpp"
 
 #include <stdio.h>
+#include <string.h>
 #include <endian.h>
 
+#include "floatEndian.hpp"
+#include "binaryStream.hpp"
+
 HydrologyParameters::HydrologyParameters(Point lowerLeft, Point upperRight)
 {
   float dimension;
@@ -15,7 +19,7 @@ HydrologyParameters::HydrologyParameters(Point lowerLeft, Point upperRight)
   {
     dimension = (upperRight.y() - lowerLeft.y()) / 10;
   }
-  hydrology = Hydrology(lowerLeft, upperRight, dimension);
+  hydrology = Hydrology(lowerLeft, upperRight, dimension, dimension * 10);
 }
 
 HydrologyParameters::HydrologyParameters(sqlite3 *db, char* paIn, char* pcIn, char* sigmaIn, char* etaIn, char* zetaIn, char* slopeRateIn, char* maxTriesIn, char* riverAngleDevIn)
@@ -75,26 +79,33 @@ HydrologyParameters::HydrologyParameters(sqlite3 *db, char* paIn, char* pcIn, ch
   hydrology = Hydrology(Point(minX,minY), Point(maxX,maxY), edgeLength);
 
   /* Read in the raster data */
-  //first, figure out the size of the raster by querying the database
-  // find max x and y
-  sqlite3_prepare_v2(db, "SELECT MAX(x) FROM RiverSlope", -1, &stmt, NULL);
-  sqlite3_step(stmt);
-  size_t rasterXsize = sqlite3_column_int(stmt, 0) + 1;
-  sqlite3_finalize(stmt);
-
-  sqlite3_prepare_v2(db, "SELECT MAX(y) FROM RiverSlope", -1, &stmt, NULL);
-  sqlite3_step(stmt);
-  size_t rasterYsize = sqlite3_column_int(stmt, 0) + 1;
-  sqlite3_finalize(stmt);
+  // the raster is stored as a single row: its dimensions, and a BLOB of
+  // big-endian floats in row-major order
+  sqlite3_prepare_v2(db, "SELECT columns, rows, slope FROM RiverSlope", -1, &stmt, NULL);
+  if (sqlite3_step(stmt) != SQLITE_ROW)
+  {
+    std::cerr << "Unable to read the river slope raster: " << sqlite3_errmsg(db) << std::endl;
+    exit(1);
+  }
+  size_t rasterXsize = sqlite3_column_int64(stmt, 0);
+  size_t rasterYsize = sqlite3_column_int64(stmt, 1);
+  const uint8_t *slopeBlob = (const uint8_t *) sqlite3_column_blob(stmt, 2);
+  size_t slopeBlobSize = sqlite3_column_bytes(stmt, 2);
+  if (slopeBlobSize != rasterXsize * rasterYsize * sizeof(float))
+  {
+    std::cerr << "The river slope raster has " << slopeBlobSize << " bytes, but it should have " << rasterXsize * rasterYsize * sizeof(float) << std::endl;
+    exit(1);
+  }
 
   riverSlope = Raster<float>(rasterYsize, rasterXsize, resolution);
-  sqlite3_prepare_v2(db, "SELECT x, y, slope FROM RiverSlope", -1, &stmt, NULL);
-  while (sqlite3_step(stmt) == SQLITE_ROW)
+  for (size_t y = 0; y < rasterYsize; y++)
   {
-    size_t x = sqlite3_column_int(stmt, 0);
-    size_t y = sqlite3_column_int(stmt, 1);
-    float slope = sqlite3_column_double(stmt, 2);
-    riverSlope.set(x, y, slope);
+    for (size_t x = 0; x < rasterXsize; x++)
+    {
+      float slope;
+      memcpy(&slope, slopeBlob + (y * rasterXsize + x) * sizeof(float), sizeof(float));
+      riverSlope.set(x, y, float_swap_betoh(slope));
+    }
   }
   sqlite3_finalize(stmt);
 
@@ -106,7 +117,7 @@ HydrologyParameters::HydrologyParameters(sqlite3 *db, char* paIn, char* pcIn, ch
     uint64_t contourIndex = sqlite3_column_int64(stmt, 2);
     float x = sqlite3_column_double(stmt, 3);
     float y = sqlite3_column_double(stmt, 4);
-    candidates.push_back(
+    addCandidate(
       hydrology.addMouthNode(
         Point(x,y), 0.0f, priority, contourIndex
       )
@@ -130,19 +141,13 @@ HydrologyParameters::HydrologyParameters(sqlite3 *db, char* paIn, char* pcIn, ch
   shore = Shore(contour);
 
   distribution = std::normal_distribution<float>(0.0, riverAngleDev);
-
-  omp_init_lock(&candidateVectorLock);
 }
 
 HydrologyParameters::HydrologyParameters()
-{
-  omp_init_lock(&candidateVectorLock);
-}
+{}
 
 HydrologyParameters::~HydrologyParameters()
-{
-  omp_destroy_lock(&candidateVectorLock);
-}
+{}
 
 HydrologyParameters::HydrologyParameters(const HydrologyParameters& other)
 : Pa(other.Pa), Pc(other.Pc), maxTries(other.maxTries), riverAngleDev(other.riverAngleDev),
@@ -150,7 +155,6 @@ HydrologyParameters::HydrologyParameters(const HydrologyParameters& other)
   slopeRate(other.slopeRate), resolution(other.resolution), riverSlope(other.riverSlope),
   shore(other.shore), candidates(other.candidates)
 {
-  omp_init_lock(&candidateVectorLock);
   distribution = std::normal_distribution<float>(0.0, riverAngleDev);
 }
 
@@ -162,7 +166,6 @@ HydrologyParameters::HydrologyParameters(HydrologyParameters&& other)
   riverSlope(std::move(other.riverSlope)), shore(std::move(other.shore)),
   candidates(std::move(other.candidates))
 {
-  omp_init_lock(&candidateVectorLock);
   distribution = std::normal_distribution<float>(0.0, riverAngleDev);
 }
 
@@ -187,7 +190,6 @@ HydrologyParameters& HydrologyParameters::operator=(const HydrologyParameters& o
   shore = other.shore;
   candidates = other.candidates;
 
-  omp_init_lock(&candidateVectorLock);
   distribution = std::normal_distribution<float>(0.0, riverAngleDev);
 
   return *this;
@@ -214,20 +216,19 @@ HydrologyParameters& HydrologyParameters::operator=(HydrologyParameters&& other)
   shore = std::move(other.shore);
   candidates = std::move(other.candidates);
 
-  omp_init_lock(&candidateVectorLock);
   distribution = std::normal_distribution<float>(0.0, riverAngleDev);
 
   return *this;
 }
 
-void HydrologyParameters::lockCandidateVector()
+void HydrologyParameters::addCandidate(Primitive *node)
 {
-  omp_set_lock(&candidateVectorLock);
+  candidates.push(node, hydrology.getTile(node->getLoc()));
 }
 
-void HydrologyParameters::unlockCandidateVector()
+void HydrologyParameters::removeCandidate(Primitive node)
 {
-  omp_unset_lock(&candidateVectorLock);
+  candidates.remove(node, hydrology.getTile(node.getLoc()));
 }
 
 void HydrologyParameters::writeToDatabase(sqlite3 *db) {
@@ -275,4 +276,23 @@ void HydrologyParameters::writeToDatabase(sqlite3 *db) {
   }
 
   sqlite3_finalize(stmt);
-}
\ No newline at end of file
+}
+
+void HydrologyParameters::writeToStream(FILE *stream) {
+  std::vector<Primitive*> nodes = hydrology.allNodes();
+
+  writeUint64(stream, nodes.size());
+
+  for (Primitive *node : nodes) {
+    writeUint64(stream, node->getID());
+    // mouth nodes have no parent, which is written as -1
+    writeInt64(stream, node->getParent() == NULL ? -1 : (int64_t) node->getParent()->getID());
+    writeFloat(stream, node->getLoc().x());
+    writeFloat(stream, node->getLoc().y());
+    writeFloat(stream, node->getElevation());
+    writeUint32(stream, node->getPriority());
+    writeInt64(stream, node->getParent() == NULL ? (int64_t) node->getContourIndex() : -1);
+  }
+
+  fflush(stream);
+}
@@ -10,6 +10,7 @@
 #include "raster.hpp"
 #include "hydrology.hpp"
 #include "shore.hpp"
+#include "candidateQueue.hpp"
 
 /**
  * @brief A struct that holds all the necessary parameters to generate the river network
@@ -17,9 +18,6 @@
  */
 class HydrologyParameters
 {
-    private:
-    omp_lock_t candidateVectorLock;
-
     public:
     HydrologyParameters();
     /**
@@ -66,14 +64,21 @@ class HydrologyParameters
     Shore shore;
 
     /**
-     * @brief Acquires a lock on the vector of candidate nodes
+     * @brief Adds a node to the set of candidates
+     * 
+     * The node is stored in the shard that corresponds to its tile in the
+     * hydrology network, so the hydrology must be set up first.
+     * 
+     * @param node The node to add
      */
-    void lockCandidateVector();
-    std::vector<Primitive*> candidates;
+    void addCandidate(Primitive *node);
     /**
-     * @brief Releases the lock on the vector of candidate nodes
+     * @brief Removes a node from the set of candidates
+     * 
+     * @param node The node to remove
      */
-    void unlockCandidateVector();
+    void removeCandidate(Primitive node);
+    CandidateQueue candidates;
     Hydrology hydrology;
 
     /**
@@ -83,6 +88,16 @@ class HydrologyParameters
      */
     void writeToDatabase(sqlite3 *db);
 
+    /**
+     * @brief Writes the nodes that have been generated to a stream
+     * 
+     * The node count is written first, followed by one record for each
+     * node, in order of ID. See TerrainHydrology/ModelIO/NativeProtocol.py
+     * 
+     * @param stream The stream to write to
+     */
+    void writeToStream(FILE *stream);
+
     std::default_random_engine generator;
     std::normal_distribution<float> distribution;
 };
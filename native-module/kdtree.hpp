@@ -98,9 +98,26 @@ struct Node
     }
 };
 
+/**
+ * @brief Statistics that describe the shape of a 2DTree (or a forest of them)
+ * 
+ */
+struct KDTreeStatistics
+{
+    size_t size = 0;     // the number of points
+    size_t depth = 0;    // the maximum depth
+    size_t rebuilds = 0; // the number of times a subtree has been rebalanced
+};
+
 /**
  * @brief A binary tree for storing 2D points and associated data
  * 
+ * When an insertion makes the tree more than twice as deep as a balanced
+ * tree, the smallest enclosing subtree that is too deep for its size is
+ * rebuilt (as in a scapegoat tree). This keeps points that are inserted
+ * in an unlucky order (such as along a river) from degrading searches to
+ * a linear scan, without rebuilding the whole tree every few insertions.
+ * 
  * @tparam T The data to store
  */
 template <typename T>
@@ -109,6 +126,7 @@ class KDTree
     private:
     Node<T>* root = NULL;
     std::vector<Node<T>*> allNodes;
+    size_t rebuilds = 0;
 
     private:
     /**
@@ -129,16 +147,17 @@ class KDTree
     /**
      * @brief Returns the node that should be the root node of a range
      * 
-     * Used to reconstruct the tree. The user specifies a range within the
-     * vector of all nodes, from [begin,end), and constructs a balanced
+     * Used to reconstruct the tree. The user specifies a range within a
+     * vector of nodes, from [begin,end), and constructs a balanced
      * 2DTree that includes all of those nodes.
      * 
-     * @param begin The start index of the allNodes vector
-     * @param end The end index (not inclusive) of the allNodes vector
+     * @param nodes The nodes (allNodes, or the nodes of a subtree)
+     * @param begin The start index of the vector
+     * @param end The end index (not inclusive) of the vector
      * @param isXlayer Should the first layer of this tree sort by X value
      * @return Node<T>* Returns the root node of the new tree
      */
-    Node<T>* makeRoot(size_t begin, size_t end, bool isXlayer);
+    Node<T>* makeRoot(std::vector<Node<T>*>& nodes, size_t begin, size_t end, bool isXlayer);
     /**
      * @brief Gets the maximum depth of the tree
      * 
@@ -155,6 +174,27 @@ class KDTree
      * @return Node<T>* The root node of a copy of the subtree
      */
     Node<T>* copySubTree(Node<T> *node);
+    /**
+     * @brief Adds every node in the subtree rooted at `node` to a vector
+     * 
+     * @param node The root of the subtree
+     * @param nodes The vector to add the nodes to
+     */
+    void collectNodes(Node<T> *node, std::vector<Node<T>*>& nodes);
+    /**
+     * @brief Counts the nodes in the subtree rooted at `node`
+     * 
+     * @param node The root of the subtree
+     * @return size_t 
+     */
+    size_t countNodes(Node<T> *node);
+    /**
+     * @brief Rebuilds the subtree that has become too deep after an insertion
+     * 
+     * @param path The nodes from the root to the parent of `newNode`
+     * @param newNode The node that was just inserted
+     */
+    void rebalance(std::vector<Node<T>*>& path, Node<T> *newNode);
 
     public:
     KDTree();
@@ -172,6 +212,17 @@ class KDTree
      * @param idx The data of the location
      */
     void insert(Point loc, T idx);
+    /**
+     * @brief Adds a point to the tree without placing it in the tree's structure
+     * 
+     * This is for building a tree when all the points are known up front.
+     * Points that are added this way can't be found until reconstruct()
+     * is called, which builds a balanced tree from all of them at once.
+     * 
+     * @param loc The location of the data
+     * @param idx The data of the location
+     */
+    void append(Point loc, T idx);
     /**
      * @brief Get all data within an area
      * 
@@ -180,9 +231,10 @@ class KDTree
      * 
      * @param loc The center of the area to search
      * @param radius The width and height of the area to search
+     * @param visited If not NULL, the number of tree nodes that were examined is added to this
      * @return std::vector<T> All the data situated in that area
      */
-    std::vector<T> searchRange(Point loc, float radius);
+    std::vector<T> searchRange(Point loc, float radius, size_t *visited = NULL);
     /**
      * @brief Gets all data in the tree in BFS order
      * 
@@ -204,6 +256,14 @@ class KDTree
      * 
      */
     void reconstruct();
+    /**
+     * @brief Get the size, depth, and number of rebuilds of the tree
+     * 
+     * Finding the depth requires visiting every node.
+     * 
+     * @return KDTreeStatistics 
+     */
+    KDTreeStatistics getStatistics();
 };
 
 template <typename T>
@@ -222,14 +282,17 @@ KDTree<T>::~KDTree()
 
 template <typename T>
 KDTree<T>::KDTree(const KDTree<T>& other)
+: rebuilds(other.rebuilds)
 {
     root = copySubTree(other.root);
-    allNodes = other.allNodes;
+    // allNodes must point to this tree's copies, not the other tree's nodes
+    collectNodes(root, allNodes);
 }
 
 template <typename T>
 KDTree<T>::KDTree(KDTree<T>&& other) noexcept
-: root(std::move(other.root)), allNodes(std::move(allNodes))
+: root(std::move(other.root)), allNodes(std::move(other.allNodes)),
+  rebuilds(other.rebuilds)
 {
     other.root = NULL;
 }
@@ -241,17 +304,58 @@ KDTree<T>& KDTree<T>::operator=(const KDTree<T>& other)
     {
         return *this;
     }
+    if (root != NULL)
+    {
+        delete root;
+    }
     root = copySubTree(other.root);
-    allNodes = other.allNodes;
+    allNodes.clear();
+    collectNodes(root, allNodes);
+    rebuilds = other.rebuilds;
+
+    return *this;
 }
 
 template <typename T>
 KDTree<T>& KDTree<T>::operator=(KDTree<T>&& other) noexcept
 {
+    if (this == &other)
+    {
+        return *this;
+    }
+    if (root != NULL)
+    {
+        delete root;
+    }
     root = std::move(other.root);
-    allNodes = std::move(allNodes);
+    allNodes = std::move(other.allNodes);
+    rebuilds = other.rebuilds;
 
     other.root = NULL;
+
+    return *this;
+}
+
+template <typename T>
+void KDTree<T>::collectNodes(Node<T> *node, std::vector<Node<T>*>& nodes)
+{
+    if (node == NULL)
+    {
+        return;
+    }
+    nodes.push_back(node);
+    collectNodes(node->left, nodes);
+    collectNodes(node->right, nodes);
+}
+
+template <typename T>
+size_t KDTree<T>::countNodes(Node<T> *node)
+{
+    if (node == NULL)
+    {
+        return 0;
+    }
+    return 1 + countNodes(node->left) + countNodes(node->right);
 }
 
 template <typename T>
@@ -295,9 +399,23 @@ size_t KDTree<T>::maxDepth(Node<T>* node)
 template <typename T>
 size_t KDTree<T>::getDepth()
 {
+    if (root == NULL)
+    {
+        return 0;
+    }
     return maxDepth(root);
 }
 
+template <typename T>
+KDTreeStatistics KDTree<T>::getStatistics()
+{
+    KDTreeStatistics stats;
+    stats.size = allNodes.size();
+    stats.depth = getDepth();
+    stats.rebuilds = rebuilds;
+    return stats;
+}
+
 template <typename T>
 Node<T>* KDTree<T>::tryInsert(Node<T>* finalNode, bool isXlevel, Node<T>* toIns)
 {
@@ -344,18 +462,6 @@ Node<T>* KDTree<T>::tryInsert(Node<T>* finalNode, bool isXlevel, Node<T>* toIns)
 template <typename T>
 void KDTree<T>::insert(Point loc, T idx)
 {
-    // if the tree is unbalanced, then reconstruct the tree
-    if (allNodes.size() > 50)
-    {
-        float inefficiency =
-            getDepth() / (log(allNodes.size()) / log(2))
-        ;
-        if (inefficiency > 2)
-        {
-            reconstruct();
-        }
-    }
-
     Node<T>* newNode = new Node<T>(loc, idx);
     allNodes.push_back(newNode);
 
@@ -370,6 +476,9 @@ void KDTree<T>::insert(Point loc, T idx)
     Node<T>* finalNode = root;
     Node<T>* nextNode = NULL;
     bool isXlevel = true;
+    // the nodes that the new node is inserted beneath, from the root down
+    std::vector<Node<T>*> path;
+    path.push_back(root);
     //tryInsert() will return a pointer to the node at the next level. If there
     //wasn't a node there before, then it will insert newNode and return a
     //pointer to it, since it is now the node at the next level. This loop will run
@@ -378,9 +487,66 @@ void KDTree<T>::insert(Point loc, T idx)
     {
         finalNode = nextNode;
         isXlevel = !isXlevel;
+        path.push_back(finalNode);
     }
     //loop invariant: finalNode points to the node that the new node will be
     //inserted under (unless the next iteration finds another level)
+
+    // if the tree is unbalanced, then rebuild part of it
+    // (the new node's depth is the length of the path, plus itself)
+    if (allNodes.size() > 50 && path.size() + 1 > 2 * log2(allNodes.size()))
+    {
+        rebalance(path, newNode);
+    }
+}
+
+template <typename T>
+void KDTree<T>::rebalance(std::vector<Node<T>*>& path, Node<T> *newNode)
+{
+    // walk up from the new node until we find a subtree that is more than
+    // twice as deep as a balanced tree of its size would be. The root is
+    // always such a subtree, so this will find one
+    Node<T> *child = newNode;
+    size_t size = 1;
+    for (size_t i = path.size(); i-- > 0; )
+    {
+        Node<T> *ancestor = path[i];
+        Node<T> *sibling = (ancestor->left == child) ? ancestor->right : ancestor->left;
+        size += 1 + countNodes(sibling);
+        size_t height = path.size() + 1 - i;
+
+        if (height > 2 * log2(size))
+        {
+            // rebuild this subtree, and put it where the old one was
+            std::vector<Node<T>*> nodes;
+            collectNodes(ancestor, nodes);
+            Node<T> *newSubtree = makeRoot(nodes, 0, nodes.size(), ancestor->isXlevel);
+            if (i == 0)
+            {
+                root = newSubtree;
+            }
+            else if (path[i-1]->left == ancestor)
+            {
+                path[i-1]->left = newSubtree;
+            }
+            else
+            {
+                path[i-1]->right = newSubtree;
+            }
+            rebuilds++;
+            return;
+        }
+
+        child = ancestor;
+    }
+}
+
+template <typename T>
+void KDTree<T>::append(Point loc, T idx)
+{
+    Node<T>* newNode = new Node<T>(loc, idx);
+    newNode->isXlevel = true;
+    allNodes.push_back(newNode);
 }
 
 template <typename T>
@@ -390,7 +556,7 @@ struct rangeSearchStruct
     bool isXlevel;
 };
 template <typename T>
-std::vector<T> KDTree<T>::searchRange(Point loc, float radius)
+std::vector<T> KDTree<T>::searchRange(Point loc, float radius, size_t *visited)
 {
     std::vector<T> foundIdxes;
 
@@ -414,6 +580,10 @@ std::vector<T> KDTree<T>::searchRange(Point loc, float radius)
         if (v == NULL) {
             continue;
         }
+        if (visited != NULL)
+        {
+            (*visited)++;
+        }
 
         //figure out which values to compate
         float nodeCompValue, otherNodeCompValue;
@@ -512,10 +682,10 @@ class CompareNodesY
 };
 
 template <typename T>
-Node<T>* KDTree<T>::makeRoot(size_t begin, size_t end, bool isXlevel)
+Node<T>* KDTree<T>::makeRoot(std::vector<Node<T>*>& nodes, size_t begin, size_t end, bool isXlevel)
 {
     /* This method will sort a subtree, as delineated by 'begin'
-     * and 'end', which are indices within the 'allNodes' vector.
+     * and 'end', which are indices within the 'nodes' vector.
      */
 
     if (begin == end)
@@ -526,37 +696,40 @@ Node<T>* KDTree<T>::makeRoot(size_t begin, size_t end, bool isXlevel)
     if (end-begin == 1)
     { // if there is only one node within this tree, then this
       //node is the root, and it has no children
-        allNodes[begin]->left = NULL;
-        allNodes[begin]->right = NULL;
-        allNodes[begin]->isXlevel = isXlevel; // this is SUPER DUPER POOPER SCOOPER important
-        return allNodes[begin];
+        nodes[begin]->left = NULL;
+        nodes[begin]->right = NULL;
+        nodes[begin]->isXlevel = isXlevel; // this is SUPER DUPER POOPER SCOOPER important
+        return nodes[begin];
     }
     
-    //sort this subtree by the appropriate dimension
+    //partition this subtree around the median of the appropriate dimension
+    //(a full sort isn't necessary, and it makes reconstruction O(n log^2 n))
     if (isXlevel)
     {
-        std::sort(
-            allNodes.begin() + begin,
-            allNodes.begin() + end,
+        std::nth_element(
+            nodes.begin() + begin,
+            nodes.begin() + begin + (end-begin)/2,
+            nodes.begin() + end,
             CompareNodesX<T>()
         );
     }
     else
     {
-        std::sort(
-            allNodes.begin() + begin,
-            allNodes.begin() + end,
+        std::nth_element(
+            nodes.begin() + begin,
+            nodes.begin() + begin + (end-begin)/2,
+            nodes.begin() + end,
             CompareNodesY<T>()
         );
     }
     
     //the root of this subtree is the median of nodes, along the appropriate dimension
-    Node<T>* newRoot =  allNodes[begin + (int)(end-begin)/2];
+    Node<T>* newRoot =  nodes[begin + (int)(end-begin)/2];
     newRoot->isXlevel = isXlevel; // this is SUPER important
 
     //the child nodes should be adequately-constructed subtrees
-    newRoot->left =  makeRoot(begin, begin + (end-begin)/2, !isXlevel);
-    newRoot->right = makeRoot((int) begin + (end-begin)/2 + 1, end, !isXlevel);
+    newRoot->left =  makeRoot(nodes, begin, begin + (end-begin)/2, !isXlevel);
+    newRoot->right = makeRoot(nodes, (int) begin + (end-begin)/2 + 1, end, !isXlevel);
 
     return newRoot;
 }
@@ -564,17 +737,10 @@ Node<T>* KDTree<T>::makeRoot(size_t begin, size_t end, bool isXlevel)
 template <typename T>
 void KDTree<T>::reconstruct()
 {
-    //sort all nodes by the appropriate dimension, which, for the root
-    //level, is X
-    std::sort(allNodes.begin(), allNodes.end(), CompareNodesX<T>());
-
-    //the root of this tree should be the median of nodes
-    root = allNodes[(int)allNodes.size()/2];
-    root->isXlevel = true; // this is also SUPER important
-
-    //the two subtrees should be adequately constructed subtrees
-    root->left = makeRoot(0, (int) allNodes.size()/2, false);
-    root->right = makeRoot((int) allNodes.size()/2 + 1, allNodes.size(), false);
+    //the root level is sorted by X, and the root of the tree
+    //is the median of all nodes
+    root = makeRoot(allNodes, 0, allNodes.size(), true);
+    rebuilds++;
 }
 
 #endif
\ No newline at end of file
@@ -0,0 +1,154 @@
+#include "nativeLibrary.hpp"
+
+#include <stdio.h>
+#include <vector>
+
+#include <sqlite3.h>
+#include <omp.h>
+
+#include "hydrologyParameters.hpp"
+#include "hydrologyFunctions.hpp"
+#include "terrainPrimitives.hpp"
+#include "terrainElevation.hpp"
+
+void* th_buildRivers(
+  float minX, float minY, float maxX, float maxY, float edgeLength, float resolution,
+  const float *contour, uint64_t contourSize,
+  const float *mouthLocs, const uint32_t *mouthPriorities, const uint64_t *mouthContourIndices, uint64_t numMouths,
+  const float *riverSlope, uint64_t rasterColumns, uint64_t rasterRows,
+  float Pa, float Pc, float sigma, float eta, float zeta, float slopeRate, uint32_t maxTries, float riverAngleDev,
+  uint64_t *progress
+)
+{
+  HydrologyParameters *params = new HydrologyParameters();
+
+  params->Pa = Pa;
+  params->Pc = Pc;
+  params->sigma = sigma;
+  params->eta = eta;
+  params->zeta = zeta;
+  params->slopeRate = slopeRate;
+  params->maxTries = maxTries;
+  params->riverAngleDev = riverAngleDev;
+  params->edgeLength = edgeLength;
+  params->resolution = resolution;
+  params->distribution = std::normal_distribution<float>(0.0, riverAngleDev);
+
+  params->hydrology = Hydrology(Point(minX,minY), Point(maxX,maxY), edgeLength);
+
+  params->riverSlope = Raster<float>(rasterRows, rasterColumns, resolution);
+  for (size_t row = 0; row < rasterRows; row++)
+  {
+    for (size_t col = 0; col < rasterColumns; col++)
+    {
+      params->riverSlope.set(col, row, riverSlope[row * rasterColumns + col]);
+    }
+  }
+
+  std::vector<Point> shoreContour;
+  for (size_t i = 0; i < contourSize; i++)
+  {
+    shoreContour.push_back(Point(contour[i*2], contour[i*2+1]));
+  }
+  params->shore = Shore(shoreContour);
+
+  for (size_t i = 0; i < numMouths; i++)
+  {
+    params->addCandidate(
+      params->hydrology.addMouthNode(
+        Point(mouthLocs[i*2], mouthLocs[i*2+1]), 0.0f, mouthPriorities[i], mouthContourIndices[i]
+      )
+    );
+  }
+
+  growNetwork(*params, progress);
+
+  return params;
+}
+
+uint64_t th_numNodes(void *rivers)
+{
+  return ((HydrologyParameters*) rivers)->hydrology.numNodes();
+}
+
+void th_getNodes(
+  void *rivers, int64_t *parents, float *locs, float *elevations,
+  uint32_t *priorities, int64_t *contourIndices
+)
+{
+  HydrologyParameters *params = (HydrologyParameters*) rivers;
+
+  for (Primitive *node : params->hydrology.allNodes())
+  {
+    size_t id = node->getID();
+    parents[id] = node->getParent() == NULL ? -1 : (int64_t) node->getParent()->getID();
+    locs[id*2] = node->getLoc().x();
+    locs[id*2+1] = node->getLoc().y();
+    elevations[id] = node->getElevation();
+    priorities[id] = node->getPriority();
+    contourIndices[id] = node->getParent() == NULL ? (int64_t) node->getContourIndex() : -1;
+  }
+}
+
+void th_freeRivers(void *rivers)
+{
+  delete (HydrologyParameters*) rivers;
+}
+
+int th_computePrimitiveElevations(
+  const char *dbPath, const float *locs, const uint64_t *cells, uint64_t numTs,
+  float *elevations, uint64_t *progress
+)
+{
+  //initialize the GEOS library
+  std::vector<GEOSContextHandle_t> geosContexts;
+  for (int i = 0; i < omp_get_max_threads(); i++)
+  {
+    geosContexts.push_back(GEOS_init_r());
+  }
+
+  sqlite3 *db;
+  if (sqlite3_open_v2(dbPath, &db, SQLITE_OPEN_READONLY, NULL) != SQLITE_OK)
+  {
+    fprintf(stderr, "Unable to open the file\n");
+    for (GEOSContextHandle_t geosContext : geosContexts)
+    {
+      GEOS_finish_r(geosContext);
+    }
+    return 1;
+  }
+  // load SpatiaLite as an extension
+  sqlite3_enable_load_extension(db, 1);
+  sqlite3_load_extension(db, "mod_spatialite", NULL, NULL);
+
+  PrimitiveParameters params(db, geosContexts[0], false);
+  sqlite3_close(db);
+
+  for (size_t i = 0; i < numTs; i++)
+  {
+    params.ts.dumpT(Point(locs[i*2], locs[i*2+1]), cells[i]);
+  }
+
+  #pragma omp parallel for
+  for (size_t i = 0; i < numTs; i++)
+  {
+    T& t = params.ts.getT(i);
+    elevations[i] = computePrimitiveElevation(
+      t, params.hydrology, params.cells, params.ts, params.shore,
+      params.resolution, geosContexts[omp_get_thread_num()]
+    );
+
+    if (progress != NULL)
+    {
+      #pragma omp atomic
+      (*progress)++;
+    }
+  }
+
+  for (GEOSContextHandle_t geosContext : geosContexts)
+  {
+    GEOS_finish_r(geosContext);
+  }
+
+  return 0;
+}
@@ -0,0 +1,103 @@
+#ifndef NATIVE_LIBRARY_H
+#define NATIVE_LIBRARY_H
+
+#include <stdint.h>
+
+/*
+  This is the C interface of libterrainhydrology.so, which lets the Python
+  module call the native code in-process (through ctypes) instead of
+  spawning the buildRivers and terrainPrimitives executables.
+
+  All arrays are owned by the caller. Locations are interleaved x,y pairs.
+
+  Each computation takes a pointer to a progress counter, which may be
+  NULL. The counter is incremented atomically as work is completed, so the
+  caller can poll it from another thread. ctypes releases the GIL for the
+  duration of each call.
+
+  See TerrainHydrology/ModelIO/NativeLibrary.py
+*/
+
+extern "C"
+{
+  /**
+   * @brief Grows a river network from its mouth nodes
+   * 
+   * @param minX The lower bound of the area on the x axis
+   * @param minY The lower bound of the area on the y axis
+   * @param maxX The upper bound of the area on the x axis
+   * @param maxY The upper bound of the area on the y axis
+   * @param edgeLength The edge length
+   * @param resolution The number of meters per pixel of the river slope raster
+   * @param contour The points of the shoreline, in counterclockwise order
+   * @param contourSize The number of points in the shoreline
+   * @param mouthLocs The location of each mouth node
+   * @param mouthPriorities The priority of each mouth node
+   * @param mouthContourIndices The index of each mouth node in the contour
+   * @param numMouths The number of mouth nodes
+   * @param riverSlope The river slope raster, in row-major order
+   * @param rasterColumns The number of columns in the raster
+   * @param rasterRows The number of rows in the raster
+   * @param Pa The Pa parameter
+   * @param Pc The Pc parameter
+   * @param sigma The sigma parameter
+   * @param eta The eta parameter
+   * @param zeta The zeta parameter
+   * @param slopeRate The slope rate parameter
+   * @param maxTries The maximum number of tries parameter
+   * @param riverAngleDev The river angle standard deviation parameter
+   * @param progress Incremented for each candidate that is expanded
+   * @return void* A handle to the network. It must be released with th_freeRivers()
+   */
+  void* th_buildRivers(
+    float minX, float minY, float maxX, float maxY, float edgeLength, float resolution,
+    const float *contour, uint64_t contourSize,
+    const float *mouthLocs, const uint32_t *mouthPriorities, const uint64_t *mouthContourIndices, uint64_t numMouths,
+    const float *riverSlope, uint64_t rasterColumns, uint64_t rasterRows,
+    float Pa, float Pc, float sigma, float eta, float zeta, float slopeRate, uint32_t maxTries, float riverAngleDev,
+    uint64_t *progress
+  );
+
+  /**
+   * @brief Gets the number of nodes in a network created by th_buildRivers()
+   */
+  uint64_t th_numNodes(void *rivers);
+
+  /**
+   * @brief Copies the nodes of a network created by th_buildRivers()
+   * 
+   * Each array must have room for th_numNodes() entries (two for each entry
+   * in locs). Nodes are written in order of ID. Mouth nodes have a parent
+   * of -1, and other nodes have a contour index of -1.
+   */
+  void th_getNodes(
+    void *rivers, int64_t *parents, float *locs, float *elevations,
+    uint32_t *priorities, int64_t *contourIndices
+  );
+
+  /**
+   * @brief Releases a network created by th_buildRivers()
+   */
+  void th_freeRivers(void *rivers);
+
+  /**
+   * @brief Computes the elevations of terrain primitives
+   * 
+   * The hydrology network, terrain honeycomb, and shore are read from the
+   * save file.
+   * 
+   * @param dbPath The path to the save file
+   * @param locs The location of each primitive
+   * @param cells The cell of each primitive
+   * @param numTs The number of primitives
+   * @param elevations Receives the elevation of each primitive
+   * @param progress Incremented for each primitive that is computed
+   * @return int 0 on success, or nonzero if the save file could not be opened
+   */
+  int th_computePrimitiveElevations(
+    const char *dbPath, const float *locs, const uint64_t *cells, uint64_t numTs,
+    float *elevations, uint64_t *progress
+  );
+}
+
+#endif
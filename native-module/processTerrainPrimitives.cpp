@@ -6,6 +6,7 @@
 #include "terrainPrimitives.hpp"
 #include "terrainElevation.hpp"
 #include "floatEndian.hpp"
+#include "progressReporter.hpp"
 
 int main(int argc, char* argv[])
 {
@@ -35,11 +36,17 @@ int main(int argc, char* argv[])
   sqlite3_enable_load_extension(db, 1);
   sqlite3_load_extension(db, "mod_spatialite", NULL, NULL);
 
-  PrimitiveParameters params(db, geosContexts[0]);
+  // the context is read from the database, but the terrain primitives
+  // themselves are streamed in over stdin
+  PrimitiveParameters params(db, geosContexts[0], false);
+  params.readTs(stdin);
 
 
   //perform computations
-  const uint8_t anotherNode = 0x2e, allDone = 0x21;
+  // progress is reported periodically, rather than once per primitive,
+  // so that the threads don't contend over stdout
+  ProgressReporter progress(stdout);
+  uint64_t *computed = progress.getCounter();
   #pragma omp parallel for
   for (size_t i = 0; i < params.ts.numTs(); i++)
   {
@@ -48,14 +55,13 @@ int main(int argc, char* argv[])
       t, params.hydrology, params.cells, params.ts, params.shore,
       params.resolution, geosContexts[omp_get_thread_num()]
     ));
-    fwrite(&anotherNode, sizeof(uint8_t), 1, stdout);
-    fflush(stdout);
+    #pragma omp atomic
+    (*computed)++;
   }
-  fwrite(&allDone, sizeof(uint8_t), 1, stdout);
-  fflush(stdout);
+  progress.finish();
 
   //export outputs
-  params.writeToDatabase(db);
+  params.writeElevations(stdout);
 
   //free resources
   sqlite3_close(db);
@@ -0,0 +1,59 @@
+#include "progressReporter.hpp"
+
+#include <chrono>
+
+#include "binaryStream.hpp"
+
+ProgressReporter::ProgressReporter(FILE *stream, unsigned int intervalMs)
+: stream(stream), intervalMs(intervalMs), counter(0), done(false)
+{
+  reporter = std::thread(&ProgressReporter::report, this);
+}
+
+ProgressReporter::~ProgressReporter()
+{
+  if (reporter.joinable())
+  {
+    finish();
+  }
+}
+
+uint64_t* ProgressReporter::getCounter()
+{
+  return &counter;
+}
+
+void ProgressReporter::writeCount(uint64_t count)
+{
+  const uint8_t anotherUpdate = 0x2e;
+  fwrite(&anotherUpdate, sizeof(uint8_t), 1, stream);
+  writeUint64(stream, count);
+  fflush(stream);
+}
+
+void ProgressReporter::report()
+{
+  uint64_t lastCount = 0;
+  while (!done.load())
+  {
+    std::this_thread::sleep_for(std::chrono::milliseconds(intervalMs));
+
+    uint64_t count = __atomic_load_n(&counter, __ATOMIC_RELAXED);
+    if (count != lastCount)
+    {
+      writeCount(count);
+      lastCount = count;
+    }
+  }
+}
+
+void ProgressReporter::finish()
+{
+  done.store(true);
+  reporter.join();
+
+  const uint8_t allDone = 0x21;
+  writeCount(__atomic_load_n(&counter, __ATOMIC_RELAXED));
+  fwrite(&allDone, sizeof(uint8_t), 1, stream);
+  fflush(stream);
+}
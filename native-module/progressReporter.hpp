@@ -0,0 +1,58 @@
+#ifndef PROGRESS_REPORTER_H
+#define PROGRESS_REPORTER_H
+
+#include <stdio.h>
+#include <stdint.h>
+
+#include <atomic>
+#include <thread>
+
+/**
+ * @brief Periodically reports the progress of a computation to the calling program
+ * 
+ * Worker threads increment the counter returned by getCounter() with
+ * `#pragma omp atomic`. A separate thread wakes up at a fixed interval and
+ * writes the counter's value to the stream, so the workers never contend
+ * over the stream, and the calling program receives a bounded number of
+ * messages regardless of how many items are processed.
+ * 
+ * Each message is the byte 0x2e followed by the total count as a big-endian
+ * unsigned 64-bit integer. When finish() is called, a final count is
+ * written, followed by the byte 0x21.
+ */
+class ProgressReporter
+{
+private:
+  FILE *stream;
+  unsigned int intervalMs;
+  uint64_t counter;
+  std::atomic<bool> done;
+  std::thread reporter;
+
+  void report();
+  void writeCount(uint64_t count);
+
+public:
+  /**
+   * @brief Starts reporting progress
+   * 
+   * @param stream The stream to write the messages to
+   * @param intervalMs The number of milliseconds between messages
+   */
+  ProgressReporter(FILE *stream, unsigned int intervalMs = 100);
+  ~ProgressReporter();
+
+  /**
+   * @brief Gets the counter that worker threads should increment
+   * 
+   * @return uint64_t* The counter
+   */
+  uint64_t* getCounter();
+
+  /**
+   * @brief Stops reporting, and signals that the computation is complete
+   */
+  void finish();
+};
+
+#endif
@@ -3,8 +3,9 @@
 #include <geos_c.h>
 
 #include "floatEndian.hpp"
+#include "binaryStream.hpp"
 
-PrimitiveParameters::PrimitiveParameters(sqlite3 *db, GEOSContextHandle_t geosContext)
+PrimitiveParameters::PrimitiveParameters(sqlite3 *db, GEOSContextHandle_t geosContext, bool loadTs)
 {
   /*
   //TODO: Update this commment after changing it to use the new save file
@@ -190,6 +191,9 @@ PrimitiveParameters::PrimitiveParameters(sqlite3 *db, GEOSContextHandle_t geosCo
   sqlite3_finalize(riverRecords);
   sqlite3_finalize(stmt);
 
+  // the nodes are all known now, so build balanced trees for them at once
+  hydrology.buildIndex();
+
   /*
     Read the ridge primitives
   */
@@ -258,6 +262,10 @@ PrimitiveParameters::PrimitiveParameters(sqlite3 *db, GEOSContextHandle_t geosCo
   /*
     Read in the terrain primitives
   */
+  if (!loadTs)
+  {
+    return;
+  }
   // read these in from the Ts table
   sqlite3_prepare_v2(db, "SELECT rivercell, X(loc) AS locX, Y(loc) AS locY FROM Ts", -1, &stmt, NULL);
   while (sqlite3_step(stmt) == SQLITE_ROW)
@@ -270,6 +278,30 @@ PrimitiveParameters::PrimitiveParameters(sqlite3 *db, GEOSContextHandle_t geosCo
   }
 }
 
+void PrimitiveParameters::readTs(FILE *stream)
+{
+  uint64_t numTs = readUint64(stream);
+
+  for (uint64_t i = 0; i < numTs; i++)
+  {
+    float x = readFloat(stream);
+    float y = readFloat(stream);
+    uint64_t riverCell = readUint64(stream);
+
+    ts.dumpT(Point(x,y), riverCell);
+  }
+}
+
+void PrimitiveParameters::writeElevations(FILE *stream)
+{
+  for (size_t i = 0; i < ts.numTs(); i++)
+  {
+    writeFloat(stream, ts.getT(i).getElevation());
+  }
+
+  fflush(stream);
+}
+
 void PrimitiveParameters::writeToDatabase(sqlite3 *db) {
   sqlite3_stmt *stmt;
 
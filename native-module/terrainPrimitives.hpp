@@ -30,8 +30,9 @@ public:
    * 
    * @param db The database to read the context from
    * @param geosContext A GEOSContextHandle will be needed to re-encode the rivers
+   * @param loadTs If false, the terrain primitives are not read from the database. Use readTs() instead
    */
-  PrimitiveParameters(sqlite3 *db, GEOSContextHandle_t geosContext);
+  PrimitiveParameters(sqlite3 *db, GEOSContextHandle_t geosContext, bool loadTs = true);
   ~PrimitiveParameters() = default;
 
   /**
@@ -40,6 +41,26 @@ public:
    * @param db The database to write to
    */
   void writeToDatabase(sqlite3 *db);
+
+  /**
+   * @brief Reads the terrain primitives from a stream
+   * 
+   * The number of primitives is read first, followed by the location and
+   * cell of each one. See TerrainHydrology/ModelIO/NativeProtocol.py
+   * 
+   * @param stream The stream to read from
+   */
+  void readTs(FILE *stream);
+
+  /**
+   * @brief Writes the terrain primitive elevations to a stream
+   * 
+   * The elevations are written in the same order that the primitives were
+   * read.
+   * 
+   * @param stream The stream to write to
+   */
+  void writeElevations(FILE *stream);
 };
 
 #endif
\ No newline at end of file
@@ -0,0 +1,68 @@
+#include <stdio.h>
+#include <stdlib.h>
+
+#include <omp.h>
+
+#include "../hydrologyParameters.hpp"
+#include "../hydrologyFunctions.hpp"
+#include "syntheticIsland.hpp"
+
+/*
+Measures how the tile size of the hydrology's spatial index affects
+growNetwork().
+
+The network is grown on a round island (see syntheticIsland.hpp) for
+every combination of tile size and thread count. For each run, this
+reports the throughput in nodes per second, the number of tile locks
+that were acquired, how many of those had to wait for another thread,
+and the total time spent waiting. A tile size of "auto" is the size that
+chooseTileDimension() picks. The island's radius (in edge lengths) can be
+given as the first argument.
+*/
+
+namespace
+{
+  const float edgeLength = 100.0f;
+
+  // tile sizes, in edge lengths; 0 is chosen automatically
+  const float tileSizes[] = { 0.0f, 2.0f, 4.0f, 6.0f, 10.0f, 20.0f, 40.0f };
+}
+
+int main(int argc, char* argv[])
+{
+  float radius = 100 * edgeLength;
+  if (argc > 1)
+  {
+    radius = strtof(argv[1], NULL) * edgeLength;
+  }
+
+  printf("tile\tthreads\tnodes\tnodes/s\tlocks\tcontended\twait(s)\n");
+  for (float tileSize : tileSizes)
+  {
+    for (int threads = 1; threads <= 32; threads *= 2)
+    {
+      omp_set_num_threads(threads);
+
+      srand(0);
+      HydrologyParameters params;
+      setUpIsland(params, radius, edgeLength, tileSize * edgeLength);
+      params.hydrology.collectLockStatistics(true);
+
+      double start = omp_get_wtime();
+      growNetwork(params, NULL);
+      double elapsed = omp_get_wtime() - start;
+
+      LockStatistics stats = params.hydrology.getLockStatistics();
+      printf(
+        "%s%.1f\t%d\t%lu\t%.0f\t%lu\t%lu\t%.3f\n",
+        tileSize == 0.0f ? "auto " : "",
+        params.hydrology.getTileDimension() / edgeLength,
+        threads, params.hydrology.numNodes(),
+        params.hydrology.numNodes() / elapsed,
+        stats.acquisitions, stats.contended, stats.waitSeconds
+      );
+    }
+  }
+
+  return 0;
+}
@@ -0,0 +1,88 @@
+#include <stdio.h>
+#include <stdlib.h>
+
+#include <omp.h>
+
+#include "../kdtree.hpp"
+
+/*
+Compares building a KDTree one point at a time with building it all at
+once (see KDTree::append()), for points that arrive in random order and
+for points that arrive in order along a line, which is how the nodes of a
+river tend to arrive.
+
+For each case, this reports the time to build the tree, its depth, how
+many times it was rebalanced, and the mean time and number of tree nodes
+visited for a range search. The number of points can be given as the
+first argument.
+*/
+
+namespace
+{
+  const size_t numQueries = 10000;
+  const float queryRadius = 2.0f;
+
+  void runCase(const char *name, std::vector<Point>& points, bool bulk)
+  {
+    KDTree<size_t> tree;
+
+    double start = omp_get_wtime();
+    for (size_t i = 0; i < points.size(); i++)
+    {
+      if (bulk)
+      {
+        tree.append(points[i], i);
+      }
+      else
+      {
+        tree.insert(points[i], i);
+      }
+    }
+    if (bulk)
+    {
+      tree.reconstruct();
+    }
+    double buildTime = omp_get_wtime() - start;
+
+    size_t visited = 0;
+    start = omp_get_wtime();
+    for (size_t i = 0; i < numQueries; i++)
+    {
+      tree.searchRange(points[rand() % points.size()], queryRadius, &visited);
+    }
+    double queryTime = omp_get_wtime() - start;
+
+    KDTreeStatistics stats = tree.getStatistics();
+    printf(
+      "%s\t%s\t%.3f\t%lu\t%lu\t%.2f\t%.1f\n",
+      name, bulk ? "bulk" : "insert", buildTime, stats.depth, stats.rebuilds,
+      queryTime / numQueries * 1e6, (double) visited / numQueries
+    );
+  }
+}
+
+int main(int argc, char* argv[])
+{
+  size_t numPoints = 100000;
+  if (argc > 1)
+  {
+    numPoints = strtoul(argv[1], NULL, 10);
+  }
+
+  srand(0);
+  std::vector<Point> randomPoints;
+  std::vector<Point> linePoints;
+  for (size_t i = 0; i < numPoints; i++)
+  {
+    randomPoints.push_back(Point(rand() % 100000 / 100.0f, rand() % 100000 / 100.0f));
+    linePoints.push_back(Point(i * 0.01f, i * 0.01f + rand() % 100 / 100.0f));
+  }
+
+  printf("order\tbuild\tbuild(s)\tdepth\trebuilds\tquery(us)\tvisited\n");
+  runCase("random", randomPoints, false);
+  runCase("random", randomPoints, true);
+  runCase("line", linePoints, false);
+  runCase("line", linePoints, true);
+
+  return 0;
+}
@@ -0,0 +1,57 @@
+#include <stdio.h>
+#include <stdlib.h>
+
+#include <omp.h>
+
+#include "../hydrologyParameters.hpp"
+#include "../hydrologyFunctions.hpp"
+#include "syntheticIsland.hpp"
+
+/*
+Measures how growNetwork() scales with the number of threads.
+
+A round island is generated with mouth nodes spaced evenly along its
+coast, and the network is grown from scratch with 1, 2, 4, 8, 16, and 32
+threads. The island's radius (in edge lengths) can be given as the first
+argument.
+*/
+
+namespace
+{
+  const float edgeLength = 100.0f;
+}
+
+int main(int argc, char* argv[])
+{
+  float radius = 100 * edgeLength;
+  if (argc > 1)
+  {
+    radius = strtof(argv[1], NULL) * edgeLength;
+  }
+
+  printf("threads\tnodes\tseconds\tspeedup\n");
+  double serialTime = 0.0;
+  for (int threads = 1; threads <= 32; threads *= 2)
+  {
+    omp_set_num_threads(threads);
+
+    srand(0);
+    HydrologyParameters params;
+    setUpIsland(params, radius, edgeLength, 0.0f);
+
+    double start = omp_get_wtime();
+    growNetwork(params, NULL);
+    double elapsed = omp_get_wtime() - start;
+
+    if (threads == 1)
+    {
+      serialTime = elapsed;
+    }
+    printf(
+      "%d\t%lu\t%.3f\t%.2f\n",
+      threads, params.hydrology.numNodes(), elapsed, serialTime / elapsed
+    );
+  }
+
+  return 0;
+}
@@ -11,9 +11,26 @@
 #include "../forest.hpp"
 #include "../terrainElevation.hpp"
 #include "../terrainPrimitives.hpp"
+#include "../floatEndian.hpp"
 
 namespace
 {
+    // creates the river slope raster the same way that SaveFile.createRiverSlopeRaster() does
+    void createRiverSlope(sqlite3 *db, size_t columns, size_t rows, float value)
+    {
+        sqlite3_exec(db, "CREATE TABLE RiverSlope (columns INTEGER, rows INTEGER, slope BLOB);", NULL, NULL, NULL);
+
+        std::vector<float> slope(columns * rows, float_tobe(value));
+
+        sqlite3_stmt *stmt;
+        sqlite3_prepare_v2(db, "INSERT INTO RiverSlope (columns, rows, slope) VALUES (?, ?, ?)", -1, &stmt, NULL);
+        sqlite3_bind_int64(stmt, 1, columns);
+        sqlite3_bind_int64(stmt, 2, rows);
+        sqlite3_bind_blob(stmt, 3, slope.data(), slope.size() * sizeof(float), SQLITE_TRANSIENT);
+        sqlite3_step(stmt);
+        sqlite3_finalize(stmt);
+    }
+
     TEST(HydrologyParametersTest, LoadTest) {
         sqlite3 *db;
         sqlite3_open_v2(":memory:", &db, SQLITE_OPEN_READWRITE, NULL);
@@ -50,11 +67,7 @@ namespace
         sqlite3_exec(db, "INSERT INTO Parameters (key, value) VALUES ('resolution', 100)", NULL, NULL, NULL);
 
         // create the table for the river slope raster
-        sqlite3_exec(db, "CREATE TABLE RiverSlope (x INTEGER, y INTEGER, slope REAL);", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (0, 0, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (0, 1, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (1, 0, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (1, 1, 0.23)", NULL, NULL, NULL);
+        createRiverSlope(db, 2, 2, 0.23);
 
         sqlite3_exec(db, "INSERT INTO Shoreline VALUES (0, MakePoint(0, -437, 347895))", NULL, NULL, NULL);
         sqlite3_exec(db, "INSERT INTO Shoreline VALUES (1, MakePoint(35, -113, 347895))", NULL, NULL, NULL);
@@ -119,11 +132,7 @@ namespace
         sqlite3_exec(db, "INSERT INTO Parameters (key, value) VALUES ('resolution', 100)", NULL, NULL, NULL);
 
         // create the table for the river slope raster
-        sqlite3_exec(db, "CREATE TABLE RiverSlope (x INTEGER, y INTEGER, slope REAL);", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (0, 0, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (0, 1, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (1, 0, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (1, 1, 0.23)", NULL, NULL, NULL);
+        createRiverSlope(db, 2, 2, 0.23);
 
         sqlite3_exec(db, "INSERT INTO Shoreline VALUES (0, MakePoint(0, -437, 347895))", NULL, NULL, NULL);
         sqlite3_exec(db, "INSERT INTO Shoreline VALUES (1, MakePoint(35, -113, 347895))", NULL, NULL, NULL);
@@ -197,11 +206,7 @@ namespace
         sqlite3_exec(db, "INSERT INTO Parameters (key, value) VALUES ('resolution', 100)", NULL, NULL, NULL);
 
         // create the table for the river slope raster
-        sqlite3_exec(db, "CREATE TABLE RiverSlope (x INTEGER, y INTEGER, slope REAL);", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (0, 0, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (0, 1, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (1, 0, 0.23)", NULL, NULL, NULL);
-        sqlite3_exec(db, "INSERT INTO RiverSlope (x, y, slope) VALUES (1, 1, 0.23)", NULL, NULL, NULL);
+        createRiverSlope(db, 2, 2, 0.23);
 
         sqlite3_exec(db, "INSERT INTO Shoreline VALUES (0, MakePoint(0, -437, 347895))", NULL, NULL, NULL);
         sqlite3_exec(db, "INSERT INTO Shoreline VALUES (1, MakePoint(35, -113, 347895))", NULL, NULL, NULL);
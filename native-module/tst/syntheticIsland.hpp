@@ -0,0 +1,73 @@
+#ifndef SYNTHETICISLAND_H
+#define SYNTHETICISLAND_H
+
+#include <stdlib.h>
+#include <math.h>
+
+#include "../hydrologyParameters.hpp"
+
+/**
+ * @brief Sets up the parameters to grow a river network on a round island
+ * 
+ * The island is centered on the origin, because Raster::get() takes
+ * coordinates relative to the center of the raster. Mouth nodes are spaced
+ * evenly along the island's coast. This is used by the benchmarks, so call
+ * srand() first to make the setup repeatable.
+ * 
+ * @param params The parameters to set up (they should be default-constructed)
+ * @param radius The radius of the island, in meters
+ * @param edgeLength The edge length parameter of the simulation
+ * @param tileDimension The tile size of the hydrology's spatial index, or 0 to choose one automatically
+ */
+inline void setUpIsland(HydrologyParameters& params, float radius, float edgeLength, float tileDimension)
+{
+  const float size = 2 * radius + 4 * edgeLength;
+  const Point center(0, 0);
+
+  params.Pa = 0.0f;
+  params.Pc = 0.8f;
+  params.sigma = 0.75f;
+  params.eta = 0.75f;
+  params.zeta = 100.0f;
+  params.slopeRate = 0.1f;
+  params.maxTries = 15;
+  params.riverAngleDev = 1.7f;
+  params.edgeLength = edgeLength;
+  params.resolution = edgeLength;
+  params.distribution = std::normal_distribution<float>(0.0, params.riverAngleDev);
+
+  params.hydrology = Hydrology(Point(-size / 2, -size / 2), Point(size / 2, size / 2), edgeLength, tileDimension);
+
+  // a pixel of margin on each side, so that the edges of the area are
+  // still inside the raster
+  size_t rasterSize = ceilf(size / params.resolution) + 2;
+  params.riverSlope = Raster<float>(rasterSize, rasterSize, params.resolution);
+  params.riverSlope.set(128.0f);
+
+  // one vertex every half edge length around the coast
+  size_t numVertices = 4 * M_PI * radius / edgeLength;
+  std::vector<Point> contour;
+  for (size_t i = 0; i < numVertices; i++)
+  {
+    float theta = 2 * M_PI * i / numVertices;
+    contour.push_back(Point(
+      center.x() + radius * cosf(theta), center.y() + radius * sinf(theta)
+    ));
+  }
+  params.shore = Shore(contour);
+
+  // a mouth node every 4 edge lengths, just inside the coast
+  for (size_t i = 1; i + 1 < numVertices; i += 8)
+  {
+    float theta = 2 * M_PI * i / numVertices;
+    params.addCandidate(params.hydrology.addMouthNode(
+      Point(
+        center.x() + (radius - edgeLength) * cosf(theta),
+        center.y() + (radius - edgeLength) * sinf(theta)
+      ),
+      0.0f, 1 + rand() % 5, i
+    ));
+  }
+}
+
+#endif
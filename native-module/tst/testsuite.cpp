@@ -10,6 +10,7 @@
 #include "../hydrology.hpp"
 #include "../forest.hpp"
 #include "../terrainElevation.hpp"
+#include "syntheticIsland.hpp"
 
 namespace
 {
@@ -140,6 +141,58 @@ namespace
         ASSERT_TRUE((searchResults[0] == 10) || (searchResults[1] == 10) || (searchResults[2] == 10));
         ASSERT_TRUE((searchResults[0] == 15) || (searchResults[1] == 15) || (searchResults[2] == 15));
     }
+    TEST(KDTreeTest, BulkConstructionTest) {
+        KDTree<size_t> tree;
+
+        tree.append(Point(7,5),0);
+        tree.append(Point(7,3),1);
+        tree.append(Point(2,3),2);
+        tree.append(Point(7,10),3);
+        tree.append(Point(9,8),4);
+        tree.append(Point(4,8),5);
+        tree.append(Point(5,3),6);
+        tree.append(Point(8,3),7);
+        tree.append(Point(3,1),8);
+        tree.append(Point(7,9),9);
+        tree.append(Point(3,6),10);
+        tree.append(Point(2,5),11);
+        tree.append(Point(3,10),12);
+        tree.append(Point(0,4),13);
+        tree.append(Point(5,6),14);
+        tree.append(Point(1,6),15);
+        tree.append(Point(10,5),16);
+        tree.append(Point(0,2),17);
+
+        tree.reconstruct();
+
+        ASSERT_EQ(tree.getDepth(), 5);
+
+        std::vector<size_t> searchResults = tree.searchRange(Point(2,5), 1.5);
+
+        ASSERT_EQ(searchResults.size(), 3);
+        ASSERT_TRUE((searchResults[0] == 11) || (searchResults[1] == 11) || (searchResults[2] == 11));
+        ASSERT_TRUE((searchResults[0] == 10) || (searchResults[1] == 10) || (searchResults[2] == 10));
+        ASSERT_TRUE((searchResults[0] == 15) || (searchResults[1] == 15) || (searchResults[2] == 15));
+    }
+    TEST(KDTreeTest, RebalanceTest) {
+        KDTree<size_t> tree;
+
+        // points inserted in order would make a linked list
+        for (size_t i = 0; i < 1000; i++)
+        {
+            tree.insert(Point(i, i), i);
+        }
+
+        KDTreeStatistics stats = tree.getStatistics();
+        ASSERT_EQ(stats.size, 1000);
+        ASSERT_GT(stats.rebuilds, 0);
+        ASSERT_LE(stats.depth, 2 * log2(1000) + 1);
+
+        size_t visited = 0;
+        std::vector<size_t> searchResults = tree.searchRange(Point(500, 500), 0.5, &visited);
+        ASSERT_EQ(searchResults.size(), 1);
+        ASSERT_LT(visited, 100);
+    }
     TEST(ForestTest, CreationTest)
     {
         Forest<size_t> trees(Point(-2.0,-2.0), Point(4.0, 7.0), 2.0);
@@ -213,6 +266,27 @@ namespace
 
         ASSERT_EQ(searchResults.size(), 4);
     }
+    TEST(ForestTest, TileDimensionTest)
+    {
+        // a large area is limited to 10 edge lengths
+        ASSERT_FLOAT_EQ(chooseTileDimension(Point(0,0), Point(1000,1000), 1.0f, 1), 10.0f);
+        // more threads get smaller tiles
+        ASSERT_FLOAT_EQ(chooseTileDimension(Point(0,0), Point(160,160), 4.0f, 4), 20.0f);
+        // but never smaller than the area around a node
+        ASSERT_FLOAT_EQ(chooseTileDimension(Point(0,0), Point(160,160), 4.0f, 32), 16.0f);
+    }
+    TEST(ForestTest, LockStatisticsTest)
+    {
+        Forest<size_t> trees(Point(0,0), Point(10,10), 5);
+        trees.collectLockStatistics(true);
+
+        AreaLock lock = trees.lockArea(Point(5,5), 1);
+        lock.release();
+
+        LockStatistics stats = trees.getLockStatistics();
+        ASSERT_EQ(stats.acquisitions, (uint64_t)4);
+        ASSERT_EQ(stats.contended, (uint64_t)0);
+    }
     TEST(HydrologyTest, IDTest)
     {
         Hydrology hydrology(Point(0,0), Point(15,20), 1.0);
@@ -334,32 +408,32 @@ namespace
     {
         HydrologyParameters testParams(Point(-1,-1), Point(1,1));
         testParams.zeta = 14.0f;
-        testParams.candidates.push_back(
+        testParams.addCandidate(
             testParams.hydrology.addMouthNode(
                 Point(0,0), 4.0, 1, 0
             )
         );
-        testParams.candidates.push_back(
+        testParams.addCandidate(
             testParams.hydrology.addMouthNode(
                 Point(0,0), 6.0, 2, 0
             )
         );
-        testParams.candidates.push_back(
+        testParams.addCandidate(
             testParams.hydrology.addMouthNode(
                 Point(0,0), 14.0, 3, 0
             )
         );
-        testParams.candidates.push_back(
+        testParams.addCandidate(
             testParams.hydrology.addMouthNode(
                 Point(0,0), 8.0, 3, 0
             )
         );
-        testParams.candidates.push_back(
+        testParams.addCandidate(
             testParams.hydrology.addMouthNode(
                 Point(0,0), 24.0, 1, 0
             )
         );
-        testParams.candidates.push_back(
+        testParams.addCandidate(
             testParams.hydrology.addMouthNode(
                 Point(0,0), 23.0, 4, 0
             )
@@ -369,6 +443,81 @@ namespace
 
         ASSERT_EQ(selected.getID(), (size_t)3);
     }
+    TEST(CandidateQueueTests, ShardTest)
+    {
+        Hydrology hydrology(Point(0,0), Point(100,100), 1.0f);
+        CandidateQueue queue(4);
+
+        Primitive *node0 = hydrology.addMouthNode(Point(5,5), 4.0, 1, 0);
+        Primitive *node1 = hydrology.addMouthNode(Point(95,5), 6.0, 2, 0);
+        Primitive *node2 = hydrology.addMouthNode(Point(95,95), 2.0, 2, 0);
+        queue.push(node0, hydrology.getTile(node0->getLoc()));
+        queue.push(node1, hydrology.getTile(node1->getLoc()));
+        queue.push(node2, hydrology.getTile(node2->getLoc()));
+
+        ASSERT_EQ(queue.size(), (size_t)3);
+
+        // removing a node that isn't in its shard does nothing
+        queue.remove(*node0, hydrology.getTile(node0->getLoc()) + 1);
+        ASSERT_EQ(queue.size(), (size_t)3);
+
+        queue.remove(*node0, hydrology.getTile(node0->getLoc()));
+        ASSERT_EQ(queue.size(), (size_t)2);
+
+        // the lowest remaining candidate is in node2's shard
+        Primitive selected;
+        ASSERT_TRUE(queue.selectFromLowestShard(10.0f, selected));
+        ASSERT_EQ(selected.getID(), node2->getID());
+        ASSERT_TRUE(queue.selectGlobal(10.0f, selected));
+        ASSERT_EQ(selected.getID(), node2->getID());
+
+        // once it is removed, its shard's minimum is updated
+        queue.remove(*node2, hydrology.getTile(node2->getLoc()));
+        ASSERT_TRUE(queue.selectFromLowestShard(10.0f, selected));
+        ASSERT_EQ(selected.getID(), node1->getID());
+
+        queue.remove(*node1, hydrology.getTile(node1->getLoc()));
+        ASSERT_EQ(queue.size(), (size_t)0);
+        ASSERT_FALSE(queue.selectFromLowestShard(10.0f, selected));
+        ASSERT_FALSE(queue.selectGlobal(10.0f, selected));
+    }
+    TEST(HydrologyFunctionsTests, GrowNetworkSerialOrderTest)
+    {
+        // on one thread, growNetwork() expands the candidates in the order
+        // that selectNode() picks them, so it grows the same network
+        srand(0);
+        HydrologyParameters reference;
+        setUpIsland(reference, 1000.0f, 100.0f, 0.0f);
+        srand(0);
+        HydrologyParameters grown;
+        setUpIsland(grown, 1000.0f, 100.0f, 0.0f);
+
+        srand(1);
+        while (reference.candidates.size() > 0)
+        {
+            alpha(selectNode(reference), reference);
+        }
+        srand(1);
+        omp_set_num_threads(1);
+        growNetwork(grown, NULL);
+
+        ASSERT_GT(grown.hydrology.numNodes(), (size_t)0);
+        ASSERT_EQ(grown.hydrology.numNodes(), reference.hydrology.numNodes());
+        for (size_t i = 0; i < reference.hydrology.numNodes(); i++)
+        {
+            Primitive expected = reference.hydrology.getNode(i);
+            Primitive node = grown.hydrology.getNode(i);
+            ASSERT_EQ(node.getLoc().x(), expected.getLoc().x());
+            ASSERT_EQ(node.getLoc().y(), expected.getLoc().y());
+            ASSERT_EQ(node.getElevation(), expected.getElevation());
+            ASSERT_EQ(node.getPriority(), expected.getPriority());
+            ASSERT_EQ(node.hasParent(), expected.hasParent());
+            if (expected.hasParent())
+            {
+                ASSERT_EQ(node.getParent()->getID(), expected.getParent()->getID());
+            }
+        }
+    }
     TEST(HydrologyTest, NodeAdditionTest)
     {
         const float resolution = 13.5;